@@ -0,0 +1,24 @@
+# langchain
+from langchain_core.messages import BaseMessage
+
+# langgraph
+from langgraph.graph.message import add_messages
+
+# utility
+from typing import Annotated, NotRequired, TypedDict
+
+
+class AgentState(TypedDict):
+    # deepagents Todo dicts ({"content", "status"}), kept as plain dicts so importing this module stays cheap
+    todos: NotRequired[list[dict]]
+    messages: Annotated[list[BaseMessage],add_messages]
+    current_state: str
+    # page the planner was on, a resumed run goes back there before the pending tool calls run
+    url: NotRequired[str]
+
+
+class TaskExecutor(TypedDict):
+    current_task: str
+    last_task: str
+    message: BaseMessage
+    current_state: str
@@ -0,0 +1,64 @@
+# langchain
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# pydantic
+from pydantic import PrivateAttr
+
+# utility
+from typing import Any, Optional
+import asyncio
+import time
+import uuid
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Stand-in for the Azure chat model: answers with the scripted messages in order (wrapping around),
+    after `latency` seconds. Tool call ids are made unique per answer so the graph treats them as new calls.
+
+    usage:
+        ScriptedChatModel(responses=[AIMessage(content='', tool_calls=[{...}]), AIMessage(content='done')])
+    """
+
+    responses: list[AIMessage]
+    latency: float = 0.0
+    _position: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        # the script already decides which tool is called
+        return self
+
+    def _next_message(self) -> AIMessage:
+        message = self.responses[self._position % len(self.responses)]
+        self._position += 1
+        tool_calls = [{**call, "id": f'call_{uuid.uuid4().hex[:12]}'} for call in message.tool_calls]
+        return AIMessage(content=message.content, tool_calls=tool_calls)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message())])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message())])
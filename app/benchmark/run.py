@@ -0,0 +1,273 @@
+# app
+from app.agent_state import AgentState
+from app.benchmark.fake_llm import ScriptedChatModel
+from app.benchmark.site import LocalSuccessFactors
+from app.config import settings
+from app.metrics import TOOL_ERROR_PREFIXES
+from app.page_timing import percentile
+from app.request_blocking import RequestBlockingProfile
+from app.sap_config_hub import SapConfigHub, login_succeeded
+from app.session_store import SessionStateStore
+from app.trajectory import TrajectoryStore
+
+# langchain
+from langchain_core.messages import AIMessage, HumanMessage
+
+# utility
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+
+BENCH_COMPANY_ID = 'BENCHCO'
+BENCH_USERNAME = 'bench.admin'
+BENCH_PASSWORD = 'bench-password'
+
+PLANNER_SCRIPT = [
+    AIMessage(content='', tool_calls=[{
+        "name": "write_todos",
+        "args": {"todos": [
+            {"content": "Open the home drop down", "status": "pending"},
+            {"content": "Open Admin Centre", "status": "pending"},
+        ]},
+        "id": "call_0",
+    }]),
+    # the graph loops back to the planner after the tools, a plain answer ends the run
+    AIMessage(content='Admin Centre is open.'),
+]
+
+
+def _failed(result: Any) -> bool:
+    return isinstance(result, Exception) or (isinstance(result, str) and result.startswith(TOOL_ERROR_PREFIXES))
+
+
+async def measure(
+    name: str,
+    action: Callable[[], Awaitable[Any]],
+    iterations: int,
+    setup: Optional[Callable[[], Awaitable[Any]]] = None,
+    warmup: int = 1,
+) -> dict:
+    """Runs setup (untimed) + action `iterations` times, returns p50/p95 in ms"""
+    timings = []
+    errors = []
+    for iteration in range(warmup + iterations):
+        if setup is not None:
+            await setup()
+        start = time.perf_counter()
+        try:
+            result = await action()
+        except Exception as e:
+            result = e
+        elapsed = (time.perf_counter() - start) * 1000
+        if iteration < warmup:
+            continue
+        if _failed(result):
+            errors.append(str(result)[:200])
+        else:
+            timings.append(elapsed)
+
+    print(f'{name}: {len(timings)} ok, {len(errors)} errors', file=sys.stderr)
+    if not timings:
+        return {"n": 0, "errors": len(errors), "last_error": errors[-1] if errors else None}
+    return {
+        "n": len(timings),
+        "errors": len(errors),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "min_ms": round(min(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "last_error": errors[-1] if errors else None,
+    }
+
+
+async def element_index(hub: SapConfigHub, element_id: str) -> int:
+    await hub.current_page_index()
+    for index, node in (await hub.get_selector_map()).items():
+        if (node.attributes or {}).get('id') == element_id:
+            return index
+    raise RuntimeError(f'Element #{element_id} not found on the benchmark page')
+
+
+async def run_benchmarks(iterations: int = 10, latency_ms: int = 0, llm_latency: float = 0.0) -> dict:
+    results = {}
+    with LocalSuccessFactors(latency_ms=latency_ms) as site, tempfile.TemporaryDirectory() as state_dir:
+        hub = SapConfigHub(
+            company_id=BENCH_COMPANY_ID,
+            username=BENCH_USERNAME,
+            password=BENCH_PASSWORD,
+            base_url=site.url,
+            llm=ScriptedChatModel(responses=PLANNER_SCRIPT, latency=llm_latency),
+        )
+        # keep saved logins and trajectories of real runs out of the benchmark
+        hub.session_store = SessionStateStore(str(Path(state_dir) / 'state'))
+        hub.trajectory_store = TrajectoryStore(str(Path(state_dir) / 'trajectories'))
+        browser_session = await hub.get_browser_session()
+        await browser_session.start()
+        try:
+            async def logged_out():
+                hub.session_store.delete(BENCH_COMPANY_ID, BENCH_USERNAME)
+                await browser_session.clear_cookies()
+                await hub.go_to_url('about:blank', new_tab=False)
+
+            async def login():
+                # login_script reports every failure as a status string, see login_succeeded
+                status = await hub.login_script()
+                return status if login_succeeded(status) else f'Error: {status}'
+
+            results['login_script'] = await measure('login_script', login, iterations, setup=logged_out)
+
+            admin_url = f'{site.url}sf/admin'
+            results['go_to_url'] = await measure(
+                'go_to_url', lambda: hub.go_to_url(admin_url, new_tab=False), iterations
+            )
+
+            # navigation until the page is ready, with everything loading vs. the SuccessFactors blocking preset
+            async def page_load():
+                await hub.go_to_url(admin_url, new_tab=False)
+                readiness = await hub.wait_until_ready(timeout=30)
+                return readiness if readiness["ready"] else f'Error: page not ready ({readiness["pending"]})'
+
+            profile = hub.request_blocker.profile
+            try:
+                for name, blocking in (
+                    ('page_load_unblocked', RequestBlockingProfile('off')),
+                    ('page_load_blocked', RequestBlockingProfile.preset('successfactors')),
+                ):
+                    await hub.set_request_blocking(blocking)
+                    hub.request_blocker.reset_stats()
+                    results[name] = await measure(name, page_load, iterations)
+                    stats = hub.request_blocker.stats()
+                    results[name].update(
+                        requests_blocked=stats["blocked"], bytes_saved=stats["bytes_saved"], bytes_loaded=stats["bytes_loaded"]
+                    )
+            finally:
+                await hub.set_request_blocking(profile)
+
+            async def cold_cache():
+                hub.dom_cache.invalidate()
+
+            results['current_page_index'] = await measure(
+                'current_page_index', hub.current_page_index, iterations, setup=cold_cache
+            )
+            results['current_page_index_cached'] = await measure(
+                'current_page_index_cached', hub.current_page_index, iterations
+            )
+
+            engine = settings.snapshot_engine
+            settings.snapshot_engine = 'js'
+            try:
+                results['current_page_index_js'] = await measure(
+                    'current_page_index_js', hub.current_page_index, iterations, setup=cold_cache
+                )
+            finally:
+                settings.snapshot_engine = engine
+                hub.dom_cache.invalidate()
+
+            results['find'] = await measure(
+                'find', lambda: hub.find(role='button', text='Show details'), iterations
+            )
+
+            toggle_index = await element_index(hub, '__xmlview0--togglePanel')
+            results['click_element_by_index'] = await measure(
+                'click_element_by_index',
+                lambda: hub.click_element_by_index(toggle_index, while_holding_ctrl=False),
+                iterations,
+            )
+
+            search_index = await element_index(hub, '__xmlview0--search-inner')
+            results['input_text'] = await measure(
+                'input_text', lambda: hub.input_text(search_index, text='Manage Permission Roles', clear_existing=True), iterations
+            )
+
+            # a description sized value, typed per character vs set in one call
+            long_text = 'Grants read access to employee files for HR business partners of the region. ' * 4
+            results['input_text_long_typed'] = await measure(
+                'input_text_long_typed',
+                lambda: hub.input_text(search_index, text=long_text, clear_existing=True, fast=False),
+                iterations,
+            )
+            results['input_text_long_fast'] = await measure(
+                'input_text_long_fast',
+                lambda: hub.input_text(search_index, text=long_text, clear_existing=True, fast=True),
+                iterations,
+            )
+
+            select_index = await element_index(hub, '__xmlview0--viewSelect')
+            results['get_dropdown_options'] = await measure(
+                'get_dropdown_options', lambda: hub.get_dropdown_options(select_index), iterations
+            )
+
+            directions = itertools.count()
+            results['scroll'] = await measure(
+                'scroll', lambda: hub.scroll(down=next(directions) % 2 == 0, num_pages=1), iterations
+            )
+
+            graph = await hub.graph_builder(AgentState)
+            results['planner_graph'] = await measure(
+                'planner_graph',
+                lambda: graph.ainvoke({"messages": [HumanMessage(content='Open Admin Centre')]}),
+                iterations,
+            )
+        finally:
+            await browser_session.kill()
+
+    return {
+        "meta": {
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "iterations": iterations,
+            "latency_ms": latency_ms,
+            "llm_latency_s": llm_latency,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Benchmarks whose p95 got more than `tolerance` (0.2 = 20%) slower than in the baseline"""
+    found = []
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name, {}).get('p95_ms')
+        after = result.get('p95_ms')
+        if before and after and after > before * (1 + tolerance):
+            found.append(f'{name}: p95 {before}ms -> {after}ms')
+        elif before and not after:
+            found.append(f'{name}: no successful iteration (baseline p95 {before}ms)')
+    return found
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the SAP Config Hub tools')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--latency-ms', type=int, default=0, help='added to every response of the local site')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds per scripted LLM answer')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='earlier results file, exit 1 when a p95 regressed')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_benchmarks(args.iterations, args.latency_ms, args.llm_latency))
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(json.dumps(report['results'], indent=2))
+
+    if args.baseline:
+        found = regressions(report, json.loads(Path(args.baseline).read_text(encoding='utf-8')), args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# utility
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+import html
+import json
+import threading
+import time
+
+
+SESSION_COOKIE = 'JSESSIONID'
+
+# UI5 pages show a busy indicator while their OData calls run, the readiness waits have to see it go away
+UI5_BOOT_JS = """
+<script>
+(function () {
+    var busy = document.createElement('div');
+    busy.className = 'sapUiLocalBusyIndicator';
+    busy.style.cssText = 'position:fixed;top:0;left:0;width:40px;height:40px';
+    document.body.appendChild(busy);
+    fetch('/odata/v2/User?$top=20').then(function (r) { return r.json(); }).then(function (data) {
+        var list = document.getElementById('__xmlview0--recentUsers');
+        if (list) {
+            data.d.results.forEach(function (user) {
+                var item = document.createElement('li');
+                item.innerHTML = '<a href="#/user/' + user.userId + '">' + user.displayName + '</a>';
+                list.appendChild(item);
+            });
+        }
+        busy.remove();
+    });
+})();
+</script>
+"""
+
+
+# Theme resources the UI5 shell loads on every page: a stylesheet with the "72" web font, theme images
+# and an analytics agent (served locally under a path with the vendor's host name in it)
+THEME = '/resources/sap/fiori/themes/sap_horizon'
+THEME_CSS = (
+    f'@font-face{{font-family:"72";src:url({THEME}/fonts/72-Regular.woff2) format("woff2")}}'
+    'body{font-family:"72",Arial} .sapMPanel h2{padding-left:36px;min-height:32px;'
+    f'background:url({THEME}/img/group.png) no-repeat}}'
+)
+ASSET_BYTES = {'.png': 25_000, '.woff2': 80_000, '.js': 60_000}
+ASSET_TYPES = {'.png': 'image/png', '.woff2': 'font/woff2', '.js': 'application/javascript', '.css': 'text/css'}
+
+
+def _page(title: str, body: str, ui5: bool = False) -> str:
+    theme = (
+        f'<link rel="stylesheet" href="{THEME}/library.css">'
+        f'<img src="{THEME}/img/logo.png" alt="" width="120" height="40">'
+        '<script async src="/resources/analytics/pendo.io/agent.js"></script>'
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>{html.escape(title)}</title>'
+        '<style>body{font-family:Arial;margin:0} .sapMTile{display:inline-block;width:180px;height:120px;margin:4px;'
+        'border:1px solid #ccc} .sapMPanel{padding:8px} #content{height:2400px}</style>'
+        f'</head><body class="sapUiBody">{theme}{body}{UI5_BOOT_JS if ui5 else ""}</body></html>'
+    )
+
+
+def _ui5(element: str, view: int, name: str, depth: int = 3) -> str:
+    """Wraps an element in the nested, generated-id divs UI5 renders around every control"""
+    for level in range(depth):
+        element = (
+            f'<div id="__xmlview{view}--{name}-wrap{level}" class="sapMFlexItem sapUiRespGridSpanL{level + 3}" '
+            f'data-sap-ui="__xmlview{view}--{name}-wrap{level}">{element}</div>'
+        )
+    return element
+
+
+def company_entry_page() -> str:
+    body = (
+        '<div class="sapMPage"><h1>Welcome to SAP SuccessFactors</h1>'
+        '<form action="/login/credentials" method="get">'
+        '<input id="__input0-inner" name="company" type="text" placeholder="Enter Company ID" aria-label="Company ID">'
+        '<a href="#help">Help</a>'
+        '<a href="#privacy">Privacy</a>'
+        '<button id="__button0" type="submit">Continue</button>'
+        '</form></div>'
+    )
+    return _page('Company ID', body)
+
+
+def credentials_page(company: str) -> str:
+    links = ''.join(f'<a href="#link{number}">Link {number}</a>' for number in range(7))
+    body = (
+        f'<div class="sapMPage"><h1>Log in to {html.escape(company)}</h1>'
+        '<form action="/login/submit" method="post">'
+        f'<input type="hidden" name="company" value="{html.escape(company)}">'
+        '<input id="__input1-inner" name="username" type="text" placeholder="Username" aria-label="Username">'
+        '<input id="__input2-inner" name="password" type="password" placeholder="Password" aria-label="Password">'
+        f'{links}'
+        '<button id="__button1" type="submit">Log in</button>'
+        '</form></div>'
+    )
+    return _page('Log in', body)
+
+
+def admin_centre_page(tiles: int = 120, rows: int = 150) -> str:
+    """UI5-like Admin Centre: tile groups, a large user table, a native select and a search field"""
+    toolbar = _ui5(
+        '<input id="__xmlview0--search-inner" type="search" placeholder="Search Actions or People" aria-label="Search">'
+        '<select id="__xmlview0--viewSelect" aria-label="View">'
+        + ''.join(f'<option value="v{number}">View {number}</option>' for number in range(50))
+        + '</select>'
+        '<button id="__xmlview0--togglePanel" onclick="var p=document.getElementById(\'__xmlview0--panel\');'
+        'p.hidden=!p.hidden">Show details</button>',
+        0, 'toolbar',
+    )
+    panel = '<div id="__xmlview0--panel" class="sapMPanel" hidden><p>Details of the current instance.</p></div>'
+    groups = []
+    for group in range(tiles // 10):
+        group_tiles = ''.join(
+            _ui5(
+                f'<a class="sapMTile" href="#/tool/{group}/{number}" id="__tile{group * 10 + number}">'
+                f'<span>Tool {group}.{number}</span><span class="sapMTileSubtitle">Manage setting {number}</span></a>',
+                1, f'tile{group * 10 + number}', depth=2,
+            )
+            for number in range(10)
+        )
+        groups.append(
+            f'<section class="sapMPanel" id="__xmlview1--group{group}"><h2>Group {group}</h2>'
+            f'<img src="{THEME}/img/group{group}.png" alt="" width="32" height="32">{group_tiles}</section>'
+        )
+    table_rows = ''.join(
+        f'<tr id="__item{number}"><td><a href="#/user/u{number}">User {number}</a></td><td>Department {number % 12}</td>'
+        f'<td>Role {number % 7}</td><td>Active</td><td><button id="__button{100 + number}">Edit</button></td></tr>'
+        for number in range(rows)
+    )
+    table = f'<table id="__xmlview2--users" role="grid"><tbody>{table_rows}</tbody></table>'
+    recent = '<ul id="__xmlview0--recentUsers" role="list"></ul>'
+    body = f'<div id="content" class="sapMPage">{toolbar}{panel}{"".join(groups)}{recent}{table}</div>'
+    return _page('Admin Center', body, ui5=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'LocalSuccessFactors'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str | bytes = '', content_type: str = 'text/html', headers: Optional[dict] = None):
+        data = body if isinstance(body, bytes) else body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type if isinstance(body, bytes) else f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _logged_in(self) -> bool:
+        return f'{SESSION_COOKIE}=' in (self.headers.get('Cookie') or '')
+
+    def do_GET(self):
+        self.server.latency()
+        url = urlparse(self.path)
+        if url.path == '/':
+            return self._send(302, headers={'Location': '/sf/admin' if self._logged_in() else '/login/companyEntry'})
+        if url.path == '/login/companyEntry':
+            return self._send(200, company_entry_page())
+        if url.path == '/login/credentials':
+            company = parse_qs(url.query).get('company', [''])[0]
+            return self._send(200, credentials_page(company))
+        if url.path == '/sf/admin':
+            if not self._logged_in():
+                return self._send(302, headers={'Location': '/login/companyEntry'})
+            return self._send(200, self.server.admin_html)
+        if url.path == f'{THEME}/library.css':
+            return self._send(200, THEME_CSS, content_type='text/css')
+        if url.path.startswith('/resources/'):
+            extension = url.path[url.path.rfind('.'):]
+            if extension in ASSET_BYTES:
+                return self._send(200, bytes(ASSET_BYTES[extension]), content_type=ASSET_TYPES[extension])
+        if url.path.startswith('/odata/'):
+            users = [{"userId": f'u{number}', "displayName": f'Recent User {number}'} for number in range(20)]
+            return self._send(200, json.dumps({"d": {"results": users}}), content_type='application/json')
+        return self._send(404, 'not found', content_type='text/plain')
+
+    def do_POST(self):
+        self.server.latency()
+        if urlparse(self.path).path == '/login/submit':
+            length = int(self.headers.get('Content-Length') or 0)
+            fields = parse_qs(self.rfile.read(length).decode())
+            if not fields.get('username') or not fields.get('password'):
+                return self._send(302, headers={'Location': '/login/companyEntry'})
+            return self._send(303, headers={
+                'Location': '/sf/admin',
+                'Set-Cookie': f'{SESSION_COOKIE}=bench-{int(time.time())}; Path=/; HttpOnly',
+            })
+        return self._send(404, 'not found', content_type='text/plain')
+
+
+class LocalSuccessFactors(ThreadingHTTPServer):
+    """
+    Local stand-in for a SuccessFactors tenant: company id page, login form and a large Admin Centre page,
+    each with the theme images / web font / analytics agent a real tenant loads.
+    latency_ms is added to every response to mimic a remote server.
+
+    usage:
+        with LocalSuccessFactors() as site:
+            hub = SapConfigHub(..., base_url=site.url)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency_ms: int = 0, tiles: int = 120, rows: int = 150):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency_ms = latency_ms
+        self.admin_html = admin_centre_page(tiles=tiles, rows=rows)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+    def latency(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def start(self) -> 'LocalSuccessFactors':
+        self._thread = threading.Thread(target=self.serve_forever, name='local-successfactors', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,245 @@
+"""
+sap-hub command line: run, graph, login, tenants, jobs, benchmark, startup.
+
+Only the standard library is imported here; every subcommand imports what it needs when it runs,
+so `sap-hub --help` and the startup check do not pay for browser_use / langgraph / langchain.
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+# utility
+from typing import Optional
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+
+
+# wall time of each STARTUP_COMMANDS entry in a fresh interpreter, checked by `sap-hub startup`
+STARTUP_BUDGET_SECONDS = 0.5
+
+# what `sap-hub startup` times: the bare CLI, a real subcommand's argument parsing, and the imports
+# every subcommand does before it starts working (the hub and the tools module)
+STARTUP_COMMANDS = {
+    "version": ["-m", "app.cli", "--version"],
+    "run --help": ["-m", "app.cli", "run", "--help"],
+    "import hub": ["-c", "import app.tools, app.sap_config_hub"],
+}
+
+
+def _run(args) -> int:
+    from app.tools import run_deep_agent
+
+    asyncio.run(run_deep_agent(args.task))
+    return 0
+
+
+def _graph(args) -> int:
+    from app.tools import get_hub
+
+    async def run_graph():
+        hub = get_hub()
+        if args.resume:
+            return await hub.run_graph(thread_id=args.resume)
+        from langchain_core.messages import HumanMessage
+
+        return await hub.run_graph({"messages": [HumanMessage(content=args.task)]}, thread_id=args.thread_id)
+
+    asyncio.run(run_graph())
+    return 0
+
+
+def _login(args) -> int:
+    from app.sap_config_hub import login_succeeded
+    from app.tools import get_hub
+
+    async def login() -> str:
+        hub = get_hub()
+        try:
+            return await hub.login_script()
+        finally:
+            browser_session = await hub.get_browser_session()
+            await browser_session.kill()
+
+    status = asyncio.run(login())
+    print(status)
+    return 0 if login_succeeded(status) else 1
+
+
+def _tenants(args) -> int:
+    from app.tenant_runner import load_tenant_runs, run_tenants
+
+    summary = asyncio.run(run_tenants(load_tenant_runs(args.file), args.max_browsers, args.max_llm_requests))
+    print(json.dumps(summary, indent=2, default=str))
+    return 0 if not summary["failed"] else 1
+
+
+def _jobs_enqueue(args) -> int:
+    from app.config import settings
+    from app.job_queue import JobQueue, JobSpec
+
+    spec = JobSpec(company_id=args.company_id, username=args.username, task=args.task)
+    if args.password_env:
+        spec['password_env'] = args.password_env
+    if args.base_url:
+        spec['base_url'] = args.base_url
+    queue = JobQueue(args.queue or settings.job_queue_path)
+    try:
+        print(queue.enqueue(spec, max_attempts=args.max_attempts or settings.job_max_attempts))
+    finally:
+        queue.close()
+    return 0
+
+
+def _jobs_worker(args) -> int:
+    if args.processes > 1:
+        # one browser per worker process, a crashed process only loses its lease
+        command = [sys.executable, "-m", "app.cli", "jobs"] + (["--queue", args.queue] if args.queue else []) + ["worker"]
+        if args.max_jobs is not None:
+            command += ["--max-jobs", str(args.max_jobs)]
+        if args.exit_when_empty:
+            command.append("--exit-when-empty")
+        workers = [subprocess.Popen(command) for _ in range(args.processes)]
+        return max(worker.wait() for worker in workers)
+
+    from app.job_worker import run_worker
+
+    asyncio.run(run_worker(args.queue, args.max_jobs, args.exit_when_empty))
+    return 0
+
+
+def _jobs_status(args) -> int:
+    from app.config import settings
+    from app.job_queue import JobQueue
+
+    queue = JobQueue(args.queue or settings.job_queue_path)
+    try:
+        if args.job is not None:
+            job = queue.get(args.job)
+            print(json.dumps(job, indent=2, default=str))
+            return 0 if job is not None else 1
+        queue.requeue_expired()
+        print(json.dumps(queue.stats(), indent=2))
+    finally:
+        queue.close()
+    return 0
+
+
+def _benchmark(args) -> int:
+    from app.benchmark.run import main as benchmark_main
+
+    return benchmark_main(args.benchmark_args)
+
+
+def _startup(args) -> int:
+    """Times STARTUP_COMMANDS in fresh interpreters, exit 1 when the median of any of them is over budget"""
+    results = {}
+    for name, command in STARTUP_COMMANDS.items():
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *command], check=True, stdout=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start)
+        median = statistics.median(timings)
+        results[name] = {
+            "p50_s": round(median, 4),
+            "max_s": round(max(timings), 4),
+            "within_budget": median <= args.budget,
+        }
+    within = all(result["within_budget"] for result in results.values())
+    print(json.dumps({
+        "runs": args.runs,
+        "budget_s": args.budget,
+        "commands": results,
+        "within_budget": within,
+    }, indent=2))
+    return 0 if within else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="sap-hub", description="SAP Configuration Hub")
+    parser.add_argument("--version", action="store_true", help="print the version and exit")
+    subcommands = parser.add_subparsers(dest="command")
+
+    run = subcommands.add_parser("run", help="run a task with the deep agent (default: log in and open Admin Centre)")
+    run.add_argument("--task", help="task for the agent, starts on the home page after login")
+    run.set_defaults(handler=_run)
+
+    graph = subcommands.add_parser("graph", help="run a task with the planner graph, checkpointed per thread id")
+    graph_input = graph.add_mutually_exclusive_group(required=True)
+    graph_input.add_argument("--task")
+    graph_input.add_argument("--resume", metavar="THREAD_ID", help="continue an interrupted run from its last completed node")
+    graph.add_argument("--thread-id", help="thread id of a new run (default: a random id, logged at start)")
+    graph.set_defaults(handler=_graph)
+
+    login = subcommands.add_parser("login", help="log in with the configured credentials and save the session")
+    login.set_defaults(handler=_login)
+
+    tenants = subcommands.add_parser("tenants", help="run the tasks of a tenants JSON file concurrently")
+    tenants.add_argument("file")
+    tenants.add_argument("--max-browsers", type=int)
+    tenants.add_argument("--max-llm-requests", type=int)
+    tenants.set_defaults(handler=_tenants)
+
+    jobs = subcommands.add_parser("jobs", help="durable job queue: enqueue tasks, run workers, show status")
+    jobs.add_argument("--queue", help="queue file (default: the job_queue_path setting)")
+    job_commands = jobs.add_subparsers(dest="job_command", required=True)
+
+    enqueue = job_commands.add_parser("enqueue", help="queue a task, prints the job id")
+    enqueue.add_argument("--company-id", required=True)
+    enqueue.add_argument("--username", required=True)
+    enqueue.add_argument("--task", required=True)
+    enqueue.add_argument("--password-env", help="environment variable holding the password (default: the password setting)")
+    enqueue.add_argument("--base-url")
+    enqueue.add_argument("--max-attempts", type=int)
+    enqueue.set_defaults(handler=_jobs_enqueue)
+
+    worker = job_commands.add_parser("worker", help="run queued jobs, each worker process owns one browser")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--max-jobs", type=int)
+    worker.add_argument("--exit-when-empty", action="store_true")
+    worker.set_defaults(handler=_jobs_worker)
+
+    status = job_commands.add_parser("status", help="job counts per status, or one job with --job")
+    status.add_argument("--job", type=int)
+    status.set_defaults(handler=_jobs_status)
+
+    benchmark = subcommands.add_parser("benchmark", help="offline benchmarks, arguments go to app.benchmark.run")
+    benchmark.add_argument("benchmark_args", nargs=argparse.REMAINDER)
+    benchmark.set_defaults(handler=_benchmark)
+
+    startup = subcommands.add_parser("startup", help="check the CLI startup time against its budget")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    startup.set_defaults(handler=_startup)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.version:
+        from importlib.metadata import PackageNotFoundError, version
+
+        try:
+            print(version("sap_config_hub"))
+        except PackageNotFoundError:
+            print("unknown (not installed)")
+        return 0
+
+    startup = time.perf_counter() - _STARTED
+    if startup > STARTUP_BUDGET_SECONDS:
+        print(f"warning: CLI startup took {startup:.2f}s (budget {STARTUP_BUDGET_SECONDS}s)", file=sys.stderr)
+
+    if args.command is None:
+        parser.print_help()
+        return 2
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+# browser_use (only for type hints, importing this module does not load browser_use)
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from browser_use.dom.views import EnhancedDOMTreeNode
+
+# utility
+from typing import Optional
+import re
+
+
+# roles a tag already implies, repeating them costs tokens and tells the LLM nothing
+IMPLIED_ROLES = {
+    'a': 'link',
+    'button': 'button',
+    'input': 'textbox',
+    'textarea': 'textbox',
+    'select': 'combobox',
+    'option': 'option',
+    'li': 'listitem',
+    'tr': 'row',
+    'td': 'cell',
+}
+
+# nearest ancestor with one of these tags / roles is the list a repeated element belongs to
+CONTAINER_TAGS = {'table', 'tbody', 'ul', 'ol'}
+CONTAINER_ROLES = {'list', 'listbox', 'grid', 'table', 'tree', 'treegrid', 'rowgroup', 'menu'}
+
+# a run of at least REPEAT_THRESHOLD similar siblings keeps REPEAT_KEEP of them (plus task relevant ones)
+REPEAT_THRESHOLD = 6
+REPEAT_KEEP = 3
+
+# UI5 id segments that carry no meaning: __button12, id1234567, xmlview0, ...
+GENERATED_SEGMENT = re.compile(r'^_*[a-zA-Z]*\d+$')
+
+STOP_WORDS = {'the', 'and', 'for', 'with', 'then', 'that', 'this', 'into', 'from', 'page', 'click', 'enter', 'type', 'go'}
+
+MAX_TEXT_LENGTH = 60
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token for English / markup, close enough for a budget"""
+    return len(text) // 4 + 1
+
+
+def short_id(element_id: str) -> Optional[str]:
+    """
+    __xmlview0--userNameInput-inner -> userNameInput, __button12 -> None
+    """
+    from browser_use.dom.utils import cap_text_length
+
+    segment = element_id.split('--')[-1]
+    segment = re.sub(r'-(inner|content|input|arrow|icon)$', '', segment)
+    if not segment or GENERATED_SEGMENT.match(segment):
+        return None
+    return cap_text_length(segment, 30)
+
+
+def task_terms(task: Optional[str]) -> set[str]:
+    words = re.findall(r'[a-z0-9]{3,}', (task or '').lower())
+    return {word for word in words if word not in STOP_WORDS}
+
+
+def compact_attributes(node: EnhancedDOMTreeNode, include_attributes: list[str], text: str) -> list[str]:
+    from browser_use.dom.utils import cap_text_length
+
+    attributes = dict(node.attributes or {})
+    if node.ax_node and node.ax_node.role:
+        attributes.setdefault('role', node.ax_node.role)
+    if node.ax_node and node.ax_node.name:
+        attributes.setdefault('aria-label', node.ax_node.name)
+
+    seen = {text.lower()} if text else set()
+    parts = []
+    for key in include_attributes:
+        value = attributes.get(key)
+        if not value:
+            continue
+        value = str(value).strip()
+        if key == 'id':
+            value = short_id(value)
+        elif key == 'role' and IMPLIED_ROLES.get(node.tag_name) == value:
+            value = None
+        elif key == 'type' and value == 'text':
+            value = None
+        elif key == 'value' and attributes.get('type') == 'password':
+            value = None
+        if not value or value.lower() in seen:
+            continue
+        seen.add(value.lower())
+        parts.append(f'{key}={cap_text_length(value, 40)}')
+    return parts
+
+
+def compact_line(index: int, node: EnhancedDOMTreeNode, include_attributes: list[str]) -> str:
+    from browser_use.dom.utils import cap_text_length
+
+    text = cap_text_length(' '.join(node.get_all_children_text(max_depth=2).split()), MAX_TEXT_LENGTH)
+    line = ' '.join([f'[{index}]<{node.tag_name}'] + compact_attributes(node, include_attributes, text)) + '>'
+    if text:
+        line += f' {text}'
+    return line
+
+
+def relevance(line: str, node: EnhancedDOMTreeNode, terms: set[str]) -> float:
+    score = sum(1.0 for term in terms if term in line.lower())
+    # form fields and buttons are what a configuration task acts on
+    if node.tag_name in ('input', 'textarea', 'select', 'button'):
+        score += 0.5
+    return score
+
+
+def _container(node: EnhancedDOMTreeNode) -> Optional[int]:
+    parent = node.parent_node
+    for _ in range(6):
+        if parent is None:
+            return None
+        role = parent.ax_node.role if parent.ax_node else None
+        if parent.tag_name in CONTAINER_TAGS or role in CONTAINER_ROLES:
+            return parent.backend_node_id
+        parent = parent.parent_node
+    return None
+
+
+def _group_key(node: EnhancedDOMTreeNode) -> Optional[tuple]:
+    container = _container(node)
+    if container is None:
+        return None
+    return (container, node.tag_name, node.ax_node.role if node.ax_node else None)
+
+
+def compact_index_tree(
+    selector_map: dict[int, EnhancedDOMTreeNode],
+    include_attributes: list[str],
+    budget: int,
+    task: Optional[str] = None,
+    url: Optional[str] = None,
+) -> str:
+    """
+    Flat, token-budgeted alternative to the full index tree:
+    - one short line per interactive element, generated ids shortened, redundant attributes dropped
+    - long runs of similar list / table items collapsed into a summary line
+    - elements ranked by relevance to the task and added until the budget is used up
+    Indices are the same as in the full tree.
+    """
+    terms = task_terms(task)
+    entries = []
+    for index in sorted(selector_map):
+        node = selector_map[index]
+        line = compact_line(index, node, include_attributes)
+        entries.append((index, line, relevance(line, node, terms), _group_key(node)))
+
+    # units are (score, first index, lines) and are kept or dropped as a whole
+    units = []
+    position = 0
+    while position < len(entries):
+        key = entries[position][3]
+        end = position + 1
+        while key is not None and end < len(entries) and entries[end][3] == key:
+            end += 1
+        run = entries[position:end]
+        if len(run) < REPEAT_THRESHOLD:
+            units.extend((score, index, [line]) for index, line, score, _ in run)
+        else:
+            kept = [entry for number, entry in enumerate(run) if number < REPEAT_KEEP or entry[2] >= 1]
+            hidden = [entry for entry in run if entry not in kept]
+            lines = [(index, line) for index, line, _, _ in kept]
+            if hidden:
+                tag = selector_map[hidden[0][0]].tag_name
+                lines.append((hidden[0][0], (
+                    f'  ... {len(hidden)} more similar <{tag}> items (indices {hidden[0][0]}-{hidden[-1][0]}), '
+                    'use the full tree to see them'
+                )))
+            units.append((max(entry[2] for entry in run), run[0][0], [line for _, line in sorted(lines)]))
+        position = end
+
+    header = f'Compact view of {url}:' if url else 'Compact view:'
+    used = estimate_tokens(header) + 30  # room for the footer
+    selected = []
+    omitted = 0
+    for score, first_index, lines in sorted(units, key=lambda unit: (-unit[0], unit[1])):
+        cost = sum(estimate_tokens(line) for line in lines)
+        if used + cost > budget:
+            omitted += sum(1 for line in lines if line.startswith('['))
+            continue
+        used += cost
+        selected.append((first_index, lines))
+
+    output = [header]
+    for _, lines in sorted(selected):
+        output.extend(lines)
+    if omitted:
+        output.append(f'{omitted} less relevant elements omitted to stay within {budget} tokens, call current_page_index with budget=0 for all of them.')
+    return '\n'.join(output)
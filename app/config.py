@@ -1,26 +1,266 @@
-from langchain_openai import AzureChatOpenAI
 from pydantic import BaseModel
+from typing import Optional
 import os
 from dotenv import load_dotenv
+import atexit
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 load_dotenv()
 
-llm = AzureChatOpenAI(model="gpt-4.1")
-
 class Settings(BaseModel):
     company_id: str = None
     username: str= None
     password: str= None
+    browser_pool_size: int = 2
+    # LLM requests in flight at once across all runs of the tenant runner
+    max_concurrent_llm: int = 4
+    base_url: str = "https://salesdemo.successfactors.eu/"
+    session_state_dir: str = ".sap_hub_state"
+    # key for the saved login state, the SAP password is used when not set
+    session_state_key: Optional[str] = None
+    trajectory_dir: str = ".sap_hub_trajectories"
+    # opt-in, cached responses are stored unencrypted (responses containing the password are never cached)
+    llm_cache_enabled: bool = False
+    llm_cache_path: str = ".sap_hub_cache/llm.sqlite"
+    llm_cache_ttl: float = 7 * 24 * 3600
+    llm_cache_max_entries: int = 10_000
+    # token budget of current_page_index, 0 returns the full index tree
+    dom_token_budget: int = 0
+    # "dom": full DOM + accessibility tree pipeline, "js": one injected script (faster, main frame and open shadow roots only)
+    snapshot_engine: str = "dom"
+    # input_text sets values at least this long in one call instead of typing them, 0 always types
+    fast_input_min_length: int = 40
+    # snapshot the page in the background after a page changing tool, see SapConfigHub.prefetch_snapshot
+    dom_prefetch: bool = True
+    # seconds the prefetch waits for the page to settle before the snapshot
+    dom_prefetch_settle: float = 5
+    # learn the wait before the first snapshot after a navigation per URL pattern, from the measured time
+    # between the navigation committing and the page being ready (app.page_timing); later snapshots of the
+    # page wait page_wait_min
+    adaptive_page_wait: bool = True
+    # learned table, "" keeps it in memory only
+    page_timing_path: str = ".sap_hub_state/page_timing.json"
+    # bounds of the learned wait in seconds, percentile of the last page_wait_window samples it is taken from
+    page_wait_min: float = 0.25
+    page_wait_max: float = 10
+    page_wait_percentile: float = 90
+    page_wait_window: int = 20
+    # request blocking preset (app.request_blocking.PRESETS), "off" loads everything
+    request_blocking: str = "successfactors"
+    # comma separated URL patterns ('*' wildcards) blocked on top of the preset / never blocked
+    request_block_deny: str = ""
+    request_block_allow: str = ""
+    # where agent runs dump their metrics, *.prom for Prometheus text, JSON otherwise
+    metrics_path: Optional[str] = None
+    # directory for Chrome trace files of agent runs, no traces when not set
+    trace_dir: Optional[str] = None
+    # logging goes through a bounded queue to a background thread
+    log_queue_size: int = 10_000
+    # "drop_new" or "drop_oldest" when the log queue is full
+    log_drop_policy: str = "drop_new"
+    log_json: bool = False
+    job_queue_path: str = ".sap_hub_state/jobs.sqlite"
+    # a worker that misses its heartbeats this long is considered dead and its job is queued again
+    job_lease_seconds: float = 120
+    job_max_attempts: int = 3
+    # LangGraph checkpoints of run_graph, "" turns them off
+    graph_checkpoint_path: str = ".sap_hub_state/graph.sqlite"
+    # turns (an AI message and its tool results) the planner graph keeps verbatim
+    history_keep_turns: int = 4
+    # estimated tokens of the planner history, older turns and all but the newest DOM dump are shortened /
+    # dropped above it (best effort, see app.history.trim_history), 0 for no ceiling
+    history_max_tokens: int = 60_000
 
 settings = Settings(
     company_id=os.getenv("company_id"),
     username=os.getenv("username"),
-    password=os.getenv("password")
+    password=os.getenv("password"),
+    browser_pool_size=int(os.getenv("browser_pool_size", 2)),
+    max_concurrent_llm=int(os.getenv("max_concurrent_llm", 4)),
+    base_url=os.getenv("base_url", "https://salesdemo.successfactors.eu/"),
+    session_state_dir=os.getenv("session_state_dir", ".sap_hub_state"),
+    session_state_key=os.getenv("session_state_key"),
+    trajectory_dir=os.getenv("trajectory_dir", ".sap_hub_trajectories"),
+    llm_cache_enabled=os.getenv("llm_cache_enabled", "false").lower() in ("1", "true", "yes"),
+    llm_cache_path=os.getenv("llm_cache_path", ".sap_hub_cache/llm.sqlite"),
+    llm_cache_ttl=float(os.getenv("llm_cache_ttl", 7 * 24 * 3600)),
+    llm_cache_max_entries=int(os.getenv("llm_cache_max_entries", 10_000)),
+    dom_token_budget=int(os.getenv("dom_token_budget", 0)),
+    snapshot_engine=os.getenv("snapshot_engine", "dom"),
+    fast_input_min_length=int(os.getenv("fast_input_min_length", 40)),
+    dom_prefetch=os.getenv("dom_prefetch", "true").lower() in ("1", "true", "yes"),
+    dom_prefetch_settle=float(os.getenv("dom_prefetch_settle", 5)),
+    adaptive_page_wait=os.getenv("adaptive_page_wait", "true").lower() in ("1", "true", "yes"),
+    page_timing_path=os.getenv("page_timing_path", ".sap_hub_state/page_timing.json"),
+    page_wait_min=float(os.getenv("page_wait_min", 0.25)),
+    page_wait_max=float(os.getenv("page_wait_max", 10)),
+    page_wait_percentile=float(os.getenv("page_wait_percentile", 90)),
+    page_wait_window=int(os.getenv("page_wait_window", 20)),
+    request_blocking=os.getenv("request_blocking", "successfactors"),
+    request_block_deny=os.getenv("request_block_deny", ""),
+    request_block_allow=os.getenv("request_block_allow", ""),
+    metrics_path=os.getenv("metrics_path"),
+    trace_dir=os.getenv("trace_dir"),
+    log_queue_size=int(os.getenv("log_queue_size", 10_000)),
+    log_drop_policy=os.getenv("log_drop_policy", "drop_new"),
+    log_json=os.getenv("log_json", "false").lower() in ("1", "true", "yes"),
+    job_queue_path=os.getenv("job_queue_path", ".sap_hub_state/jobs.sqlite"),
+    job_lease_seconds=float(os.getenv("job_lease_seconds", 120)),
+    job_max_attempts=int(os.getenv("job_max_attempts", 3)),
+    graph_checkpoint_path=os.getenv("graph_checkpoint_path", ".sap_hub_state/graph.sqlite"),
+    history_keep_turns=int(os.getenv("history_keep_turns", 4)),
+    history_max_tokens=int(os.getenv("history_max_tokens", 60_000)),
 )
 
+# llm / llm_cache are built on first use (module __getattr__), importing this module stays cheap
+_lazy: dict = {}
+
+
+def get_llm():
+    if "llm" not in _lazy:
+        from langchain_openai import AzureChatOpenAI
+        from app.llm_cache import LLMResponseCache
+        from app.llm_cache_keys import register_secret
+        from app.llm_callbacks import LLMMetricsCallback
+
+        register_secret(settings.password)
+        _lazy["llm_cache"] = LLMResponseCache(
+            path=settings.llm_cache_path,
+            ttl=settings.llm_cache_ttl,
+            max_entries=settings.llm_cache_max_entries,
+        ) if settings.llm_cache_enabled else None
+        _lazy["llm"] = AzureChatOpenAI(model="gpt-4.1", cache=_lazy["llm_cache"], callbacks=[LLMMetricsCallback()])
+    return _lazy["llm"]
+
+
+def __getattr__(name: str):
+    if name == "llm":
+        return get_llm()
+    if name == "llm_cache":
+        get_llm()
+        return _lazy["llm_cache"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue without ever blocking the caller (the asyncio loop driving CDP).
+    When the queue is full: drop_policy "drop_new" drops the record, "drop_oldest" makes room for it.
+    """
+
+    def __init__(self, log_queue: queue.Queue, drop_policy: str = "drop_new"):
+        super().__init__(log_queue)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.drop_policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message (+ exception)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+# log_file -> (queue handler, listener), one background writer per file
+_log_pipelines: dict[str, tuple[DroppingQueueHandler, QueueListener]] = {}
+# log_file -> arguments of its pipeline, the first setup_logger call for a file sets them
+_log_pipeline_args: dict[str, tuple] = {}
+LOG_PIPELINE_ARGS = ("max_bytes", "backup_count", "queue_size", "drop_policy", "json_lines")
+# loggers of the same file may log their first record from different threads
+_log_pipelines_lock = threading.Lock()
+
+
+def _log_pipeline(log_file):
+    with _log_pipelines_lock:
+        return _start_log_pipeline(log_file, *_log_pipeline_args[log_file])
+
+
+def _start_log_pipeline(log_file, max_bytes, backup_count, queue_size, drop_policy, json_lines):
+    pipeline = _log_pipelines.get(log_file)
+    if pipeline is not None:
+        return pipeline[0]
+
+    # Format logs
+    if json_lines:
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(
+            fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+
+    # Stream handler (console)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    # File handler (rotating)
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.setFormatter(formatter)
+
+    # the blocking handlers run on the listener thread, loggers only enqueue
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size), drop_policy=drop_policy)
+    listener = QueueListener(queue_handler.queue, stream_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    # flush what is still queued when the process exits
+    atexit.register(listener.stop)
+    _log_pipelines[log_file] = (queue_handler, listener)
+    return queue_handler
+
+
+class DeferredLogHandler(logging.Handler):
+    """
+    Starts the pipeline of its log file with the first record it gets, so a module that sets up its
+    logger at import time neither opens the file nor starts the writer thread until it logs
+    """
+
+    def __init__(self, log_file: str):
+        super().__init__()
+        self.log_file = log_file
+        self._queue_handler: Optional[DroppingQueueHandler] = None
+
+    def emit(self, record: logging.LogRecord):
+        if self._queue_handler is None:
+            self._queue_handler = _log_pipeline(self.log_file)
+        self._queue_handler.handle(record)
+
+
+def logging_stats() -> dict:
+    return {
+        log_file: {"queued": handler.queue.qsize(), "dropped": handler.dropped}
+        for log_file, (handler, _) in _log_pipelines.items()
+    }
+
 
 def setup_logger(
     name: str = "app_logger",
@@ -28,31 +268,35 @@ def setup_logger(
     level: int = logging.INFO,
     max_bytes: int = 5_000_000,  # 5 MB per log file
     backup_count: int = 5,       # Keep last 5 logs
+    queue_size: Optional[int] = None,
+    drop_policy: Optional[str] = None,
+    json_lines: Optional[bool] = None,
 ):
     # Create custom logger
     logger = logging.getLogger(name)
     logger.setLevel(level)
     logger.propagate = False  # Prevent duplicate logs if root logger also logs
 
-    # Format logs
-    formatter = logging.Formatter(
-        fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-
-    # Stream handler (console)
-    stream_handler = logging.StreamHandler(sys.stdout)
-    stream_handler.setFormatter(formatter)
-
-    # File handler (rotating)
-    file_handler = RotatingFileHandler(
-        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    args = (
+        max_bytes,
+        backup_count,
+        queue_size or settings.log_queue_size,
+        drop_policy or settings.log_drop_policy,
+        settings.log_json if json_lines is None else json_lines,
     )
-    file_handler.setFormatter(formatter)
+    with _log_pipelines_lock:
+        pipeline_args = _log_pipeline_args.setdefault(log_file, args)
 
-    # Add handlers (if not already)
+    # Add handler (if not already), console and file output happen on a background thread started by the first record
     if not logger.handlers:
-        logger.addHandler(stream_handler)
-        logger.addHandler(file_handler)
+        logger.addHandler(DeferredLogHandler(log_file))
+
+    # one pipeline per file: a later call cannot change it, say so instead of ignoring the arguments
+    if args != pipeline_args:
+        differing = ", ".join(
+            f"{name}={new!r} (pipeline has {old!r})"
+            for name, old, new in zip(LOG_PIPELINE_ARGS, pipeline_args, args) if old != new
+        )
+        logger.warning(f"⚠️ Log pipeline of {log_file} is already set up, ignoring {differing}")
 
     return logger
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+# browser_use (only for type hints, importing this module does not load browser_use)
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from browser_use.dom.views import EnhancedDOMTreeNode, SimplifiedNode
+
+# utility
+from typing import NamedTuple, Optional
+
+
+# Installs (once per document) a MutationObserver and a capturing scroll listener,
+# then returns a cheap fingerprint: url | document token | mutation count | scroll state.
+# A new document gets a new token, so navigations never collide with an old entry.
+PAGE_FINGERPRINT_JS = """
+(() => {
+    const w = window;
+    if (!w.__sapHubFp) {
+        const fp = {token: Math.random().toString(36).slice(2), mutations: 0, scrolls: 0};
+        w.__sapHubFp = fp;
+        new MutationObserver(records => { fp.mutations += records.length; })
+            .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        document.addEventListener('scroll', () => { fp.scrolls += 1; }, {capture: true, passive: true});
+    }
+    const fp = w.__sapHubFp;
+    return [location.href, fp.token, fp.mutations, fp.scrolls, innerWidth, innerHeight].join('|');
+})()
+"""
+
+
+class PageSnapshot(NamedTuple):
+    url: str
+    index_tree: str
+    # (target_id, backend_node_id) -> (index, line), see app.dom_diff.interactive_elements
+    elements: dict
+    # index -> node, for the compact serialization
+    selector_map: dict[int, EnhancedDOMTreeNode]
+    # "dom" (DOMTreeSerializer) or "js" (app.js_snapshot)
+    engine: str = 'dom'
+
+
+class DomSnapshotCache:
+    """
+    Caches the last serialized index tree of current_page_index.
+
+    - whole-tree hit when the page fingerprint is unchanged
+    - on a miss, subtrees whose content is unchanged reuse their previously serialized text
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.subtree_hits = 0
+        self.subtree_misses = 0
+        self._fingerprint: Optional[str] = None
+        self._snapshot: Optional[PageSnapshot] = None
+        self._subtrees: dict[tuple[int, int], str] = {}
+
+    def lookup(self, fingerprint: Optional[str]) -> Optional[PageSnapshot]:
+        if fingerprint is not None and fingerprint == self._fingerprint and self._snapshot is not None:
+            self.hits += 1
+            return self._snapshot
+        self.misses += 1
+        return None
+
+    def store(self, fingerprint: Optional[str], snapshot: PageSnapshot):
+        self._fingerprint = fingerprint
+        self._snapshot = snapshot
+
+    def invalidate(self):
+        self._fingerprint = None
+        self._snapshot = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "subtree_hits": self.subtree_hits,
+            "subtree_misses": self.subtree_misses,
+        }
+
+    def serialize_tree(self, root: Optional[SimplifiedNode], include_attributes: list[str]) -> str:
+        """
+        Same output as DOMTreeSerializer.serialize_tree, but only re-serializes changed subtrees:
+        signatures are hashed bottom-up once per snapshot, a changed node renders its own line(s)
+        and recurses, so its unchanged children still come from the memo
+        """
+        signatures: dict[int, int] = {}
+        if root:
+            self._sign(root, include_attributes, signatures)
+        subtrees: dict[tuple[int, int], str] = {}
+        text = self._serialize(root, include_attributes, 0, subtrees, signatures)
+        # keep only what the current snapshot used so the memo cannot grow without bound
+        self._subtrees = subtrees
+        return text
+
+    def _serialize(self, node: Optional[SimplifiedNode], include_attributes: list[str], depth: int, subtrees: dict,
+                   signatures: dict) -> str:
+        if not node:
+            return ''
+
+        if self._is_transparent(node):
+            # nodes that render no line of their own just join their children at the same depth
+            parts = [self._serialize(child, include_attributes, depth, subtrees, signatures) for child in node.children]
+            return '\n'.join(part for part in parts if part)
+
+        key = (signatures[id(node)], depth)
+        text = self._subtrees.get(key)
+        if text is not None:
+            self.subtree_hits += 1
+            # the memo entries below an unchanged subtree stay valid for the next snapshot too
+            self._keep(node, depth, subtrees, signatures)
+            return text
+
+        self.subtree_misses += 1
+        # own line(s) (a shadow root also has its end marker) with the children between them
+        head = self._own_lines(node, include_attributes, depth)
+        child_depth = depth if self._is_text(node) else depth + 1
+        parts = [self._serialize(child, include_attributes, child_depth, subtrees, signatures) for child in node.children]
+        text = '\n'.join(line for line in head[:1] + parts + head[1:] if line)
+        subtrees[key] = text
+        return text
+
+    def _keep(self, node: SimplifiedNode, depth: int, subtrees: dict, signatures: dict):
+        """Carry the memo entries of an unchanged subtree over to the new memo"""
+        if self._is_transparent(node):
+            for child in node.children:
+                self._keep(child, depth, subtrees, signatures)
+            return
+        key = (signatures[id(node)], depth)
+        text = self._subtrees.get(key)
+        if text is None:
+            return
+        subtrees[key] = text
+        child_depth = depth if self._is_text(node) else depth + 1
+        for child in node.children:
+            self._keep(child, child_depth, subtrees, signatures)
+
+    @staticmethod
+    def _own_lines(node: SimplifiedNode, include_attributes: list[str], depth: int) -> list[str]:
+        """
+        Lines DOMTreeSerializer renders for node itself: it serializes a copy whose children render nothing
+        but still tell it about closed shadow roots
+        """
+        from dataclasses import replace
+        from browser_use.dom.serializer.serializer import DOMTreeSerializer
+
+        stubs = [replace(child, children=[], excluded_by_parent=True) for child in node.children]
+        text = DOMTreeSerializer.serialize_tree(replace(node, children=stubs), include_attributes, depth)
+        return text.split('\n') if text else []
+
+    @staticmethod
+    def _is_text(node: SimplifiedNode) -> bool:
+        from browser_use.dom.views import NodeType
+
+        return node.original_node.node_type == NodeType.TEXT_NODE
+
+    @staticmethod
+    def _is_transparent(node: SimplifiedNode) -> bool:
+        from browser_use.dom.views import NodeType
+
+        original = node.original_node
+        if node.excluded_by_parent:
+            return True
+        if original.node_type == NodeType.ELEMENT_NODE:
+            if not node.should_display:
+                return True
+            return not (
+                node.interactive_index is not None
+                or original.is_actually_scrollable
+                or original.is_scrollable
+                or original.tag_name.upper() in ('IFRAME', 'FRAME')
+            )
+        return original.node_type not in (NodeType.TEXT_NODE, NodeType.DOCUMENT_FRAGMENT_NODE)
+
+    def _sign(self, node: SimplifiedNode, include_attributes: list[str], signatures: dict) -> int:
+        """Hash of everything serialize_tree reads from this subtree, children first so each node is hashed once"""
+        from browser_use.dom.views import NodeType
+
+        children = tuple(self._sign(child, include_attributes, signatures) for child in node.children)
+        original = node.original_node
+        attributes = tuple(sorted(
+            (key, value) for key, value in (original.attributes or {}).items() if key in include_attributes
+        ))
+        ax_properties = ()
+        if original.ax_node and original.ax_node.properties:
+            ax_properties = tuple(
+                (prop.name, str(prop.value)) for prop in original.ax_node.properties if prop.name in include_attributes
+            )
+        scroll_info = ''
+        if original.node_type == NodeType.ELEMENT_NODE and original.should_show_scroll_info:
+            scroll_info = original.get_scroll_info_text()
+
+        signature = hash((
+            original.node_type,
+            original.node_name,
+            original.node_value,
+            original.backend_node_id,
+            bool(original.snapshot_node and original.is_visible),
+            original.ax_node.role if original.ax_node else None,
+            original.shadow_root_type,
+            attributes,
+            ax_properties,
+            repr(original._compound_children),
+            scroll_info,
+            node.interactive_index,
+            node.is_new,
+            node.should_display,
+            node.excluded_by_parent,
+            node.is_shadow_host,
+            children,
+        ))
+        signatures[id(node)] = signature
+        return signature
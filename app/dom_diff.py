@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+# browser_use (only for type hints, importing this module does not load browser_use)
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from browser_use.dom.views import EnhancedDOMTreeNode
+
+# utility
+from typing import TypedDict
+
+
+ElementKey = tuple[str | None, int]
+
+
+class DomDiff(TypedDict):
+    added: list[str]
+    removed: list[str]
+    changed: list[str]
+    unchanged: int
+
+
+def element_line(index: int, node: EnhancedDOMTreeNode, include_attributes: list[str]) -> str:
+    """One line per interactive element, in the same shape as the serialized tree"""
+    from browser_use.dom.serializer.serializer import DOMTreeSerializer
+    from browser_use.dom.utils import cap_text_length
+
+    attributes = DOMTreeSerializer._build_attributes_string(node, include_attributes, '')
+    text = cap_text_length(node.get_all_children_text(max_depth=2).replace('\n', ' '), 100)
+    line = f'[{index}]<{node.tag_name}'
+    if attributes:
+        line += f' {attributes}'
+    line += ' />'
+    if text:
+        line += f' {text}'
+    return line
+
+
+def interactive_elements(selector_map: dict[int, EnhancedDOMTreeNode], include_attributes: list[str]) -> dict[ElementKey, tuple[int, str]]:
+    """
+    Key every indexed element by (target_id, backend_node_id), which stays the same for
+    a DOM node as long as the document lives, while its index may shift between snapshots
+    """
+    return {
+        (node.target_id, node.backend_node_id): (index, element_line(index, node, include_attributes))
+        for index, node in selector_map.items()
+    }
+
+
+def diff_elements(previous: dict[ElementKey, tuple[int, str]], current: dict[ElementKey, tuple[int, str]]) -> DomDiff:
+    added = [line for key, (_, line) in current.items() if key not in previous]
+    removed = [line for key, (_, line) in previous.items() if key not in current]
+    changed = []
+    unchanged = 0
+    for key, (index, line) in current.items():
+        if key not in previous:
+            continue
+        previous_index, previous_line = previous[key]
+        if line == previous_line:
+            unchanged += 1
+        elif previous_index != index:
+            changed.append(f'{line} (was index {previous_index})')
+        else:
+            changed.append(line)
+    return DomDiff(added=added, removed=removed, changed=changed, unchanged=unchanged)
+
+
+def format_diff(diff: DomDiff, url: str) -> str:
+    if not (diff['added'] or diff['removed'] or diff['changed']):
+        return f"No interactive elements changed on {url} since the last snapshot ({diff['unchanged']} unchanged)."
+
+    sections = [f"Changes on {url} since the last snapshot ({diff['unchanged']} elements unchanged, indices not listed here are still valid):"]
+    for title, lines in (('Added', diff['added']), ('Changed', diff['changed']), ('Removed (indices no longer valid)', diff['removed'])):
+        if lines:
+            sections.append(f'{title}:')
+            sections.extend(f'\t{line}' for line in lines)
+    return '\n'.join(sections)
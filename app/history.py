@@ -0,0 +1,123 @@
+# langchain
+from langchain_core.messages import AIMessage, BaseMessage, RemoveMessage, ToolMessage
+
+# app
+from app.compact_dom import estimate_tokens
+
+# utility
+import json
+import re
+
+
+# tools whose output is a serialized DOM, only the latest reads are worth resending
+DOM_TOOLS = {'current_page_index'}
+
+# older non-DOM tool outputs longer than this are cut down when the history is over its ceiling
+LONG_OUTPUT_TOKENS = 200
+
+ELIDED_PREFIX = '[elided'
+
+INDEX_LINE = re.compile(r'^\s*\*?\[\d+\]', re.MULTILINE)
+
+
+def _content(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    tokens = estimate_tokens(_content(message))
+    if isinstance(message, AIMessage) and message.tool_calls:
+        tokens += estimate_tokens(json.dumps([call['args'] for call in message.tool_calls], default=str))
+    return tokens
+
+
+def split_turns(messages: list[BaseMessage]) -> tuple[list[BaseMessage], list[list[BaseMessage]]]:
+    """
+    The messages before the first AI message (the task) and the turns after it,
+    a turn is one AI message followed by the tool messages answering its calls
+    """
+    head, turns = [], []
+    for message in messages:
+        if isinstance(message, AIMessage):
+            turns.append([message])
+        elif turns:
+            turns[-1].append(message)
+        else:
+            head.append(message)
+    return head, turns
+
+
+def _stub(message: ToolMessage, content: str) -> ToolMessage:
+    # same id, so add_messages replaces the original in the state
+    return ToolMessage(content=content, tool_call_id=message.tool_call_id, name=message.name, id=message.id)
+
+
+def summarize_dom_output(message: ToolMessage) -> ToolMessage:
+    content = _content(message)
+    elements = len(INDEX_LINE.findall(content))
+    return _stub(
+        message,
+        f'{ELIDED_PREFIX} {message.name} output: {elements} elements, ~{estimate_tokens(content)} tokens. '
+        f'It is out of date, call {message.name} again to read the current page]',
+    )
+
+
+def shorten_output(message: ToolMessage, keep_chars: int = 400) -> ToolMessage:
+    content = _content(message)
+    return _stub(message, f'{content[:keep_chars]}\n{ELIDED_PREFIX} {len(content) - keep_chars} more characters]')
+
+
+def trim_history(messages: list[BaseMessage], keep_turns: int, max_tokens: int) -> list[BaseMessage]:
+    """
+    State updates that keep the history bounded, for a graph node over an add_messages state:
+    - DOM dumps older than the last keep_turns turns are replaced by a one line summary
+    - while the history is over max_tokens: long tool outputs of older turns are cut down,
+      then the DOM dumps of the kept turns are summarized too except the newest one,
+      then the oldest turns are removed whole (AI message and its tool answers together)
+    The task (messages before the first AI message), the newest DOM dump and the other messages of
+    the last keep_turns turns are never changed, so max_tokens is best effort when they alone exceed it.
+    """
+    _, turns = split_turns(messages)
+    old_turns = turns[:-keep_turns] if keep_turns > 0 else turns
+    replaced: dict[str, BaseMessage] = {}
+
+    def current(message: BaseMessage) -> BaseMessage:
+        return replaced.get(message.id, message)
+
+    def total() -> int:
+        return sum(message_tokens(current(message)) for message in messages)
+
+    for turn in old_turns:
+        for message in turn:
+            if isinstance(message, ToolMessage) and message.name in DOM_TOOLS and not _content(message).startswith(ELIDED_PREFIX):
+                replaced[message.id] = summarize_dom_output(message)
+
+    if max_tokens > 0 and total() > max_tokens:
+        for turn in old_turns:
+            for message in turn:
+                message = current(message)
+                if (isinstance(message, ToolMessage) and ELIDED_PREFIX not in _content(message)
+                        and message_tokens(message) > LONG_OUTPUT_TOKENS):
+                    replaced[message.id] = shorten_output(message)
+
+    if max_tokens > 0 and total() > max_tokens:
+        kept_dom = [
+            message for turn in turns[len(old_turns):] for message in turn
+            if isinstance(message, ToolMessage) and message.name in DOM_TOOLS and not _content(message).startswith(ELIDED_PREFIX)
+        ]
+        # the newest DOM dump is the page the agent acts on next
+        for message in kept_dom[:-1]:
+            replaced[message.id] = summarize_dom_output(message)
+
+    removed: list[BaseMessage] = []
+    if max_tokens > 0:
+        tokens = total()
+        for turn in old_turns:
+            if tokens <= max_tokens:
+                break
+            for message in turn:
+                tokens -= message_tokens(current(message))
+                replaced.pop(message.id, None)
+                removed.append(RemoveMessage(id=message.id))
+
+    return removed + list(replaced.values())
@@ -0,0 +1,188 @@
+# utility
+from pathlib import Path
+from typing import Any, NotRequired, Optional, TypedDict
+import json
+import sqlite3
+import threading
+import time
+
+
+# statuses a job moves through: queued -> running -> done | failed (running -> queued again when its lease expires)
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+
+class JobSpec(TypedDict):
+    """
+    One configuration task. The password is not stored in the queue, password_env names the
+    environment variable the worker reads it from (settings.password when not given).
+    """
+    company_id: str
+    username: str
+    task: str
+    password_env: NotRequired[str]
+    base_url: NotRequired[str]
+
+
+class Job(TypedDict):
+    id: int
+    spec: JobSpec
+    status: str
+    attempts: int
+    max_attempts: int
+    worker: Optional[str]
+    lease_until: Optional[float]
+    checkpoint: Optional[dict]
+    result: Optional[Any]
+    error: Optional[str]
+    created: float
+    updated: float
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite file, shared by any number of worker processes on the host.
+
+    - lease() hands the oldest queued job to one worker for lease_seconds
+    - the worker renews the lease with heartbeat() and saves progress with checkpoint()
+    - a running job whose lease expired (its worker crashed or hung) is queued again on the next lease(),
+      with its checkpoint, until it has used max_attempts
+    """
+
+    def __init__(self, path: str = ".sap_hub_state/jobs.sqlite"):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit, transactions are opened explicitly; WAL lets readers run next to the writing worker
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, spec TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, worker TEXT, lease_until REAL, "
+            "checkpoint TEXT, result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def enqueue(self, spec: JobSpec, max_attempts: int = 3) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (spec, status, max_attempts, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+                (json.dumps(spec), max_attempts, now, now),
+            )
+            return cursor.lastrowid
+
+    def lease(self, worker: str, lease_seconds: float) -> Optional[Job]:
+        """Oldest queued job, now running for worker until the lease runs out; None when nothing is queued"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(now)
+                row = self._db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                    "WHERE id = ?",
+                    (worker, now + lease_seconds, now, row[0]),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float, checkpoint: Optional[dict] = None) -> bool:
+        """
+        Extends the lease (and saves the checkpoint if given).
+        False when the worker does not hold the job anymore, it must stop working on it then.
+        """
+        now = time.time()
+        assignments, params = "lease_until = ?, updated = ?", [now + lease_seconds, now]
+        if checkpoint is not None:
+            assignments += ", checkpoint = ?"
+            params.append(json.dumps(checkpoint))
+        return self._update_owned(job_id, worker, assignments, params)
+
+    def checkpoint(self, job_id: int, worker: str, checkpoint: dict) -> bool:
+        return self._update_owned(job_id, worker, "checkpoint = ?, updated = ?", [json.dumps(checkpoint), time.time()])
+
+    def complete(self, job_id: int, worker: str, result: Any = None) -> bool:
+        return self._update_owned(
+            job_id, worker,
+            "status = 'done', lease_until = NULL, result = ?, error = NULL, updated = ?",
+            [json.dumps(result, default=str), time.time()],
+        )
+
+    def fail(self, job_id: int, worker: str, error: str, retry: bool = True) -> bool:
+        """Queues the job again while it has attempts left (and retry is set), marks it failed otherwise"""
+        with self._lock:
+            row = self._db.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        status = 'queued' if retry and row is not None and row[0] < row[1] else 'failed'
+        return self._update_owned(
+            job_id, worker,
+            "status = ?, worker = NULL, lease_until = NULL, error = ?, updated = ?",
+            [status, error, time.time()],
+        )
+
+    def requeue_expired(self) -> int:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._requeue_expired(time.time())
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return count
+
+    def _requeue_expired(self, now: float) -> int:
+        """Call inside a transaction. Jobs of dead workers go back to the queue, or fail when out of attempts"""
+        failed = self._db.execute(
+            "UPDATE jobs SET status = 'failed', worker = NULL, lease_until = NULL, "
+            "error = COALESCE(error, 'lease expired'), updated = ? "
+            "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+            (now, now),
+        ).rowcount
+        requeued = self._db.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, updated = ? "
+            "WHERE status = 'running' AND lease_until < ?",
+            (now, now),
+        ).rowcount
+        return failed + requeued
+
+    def _update_owned(self, job_id: int, worker: str, assignments: str, params: list) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND worker = ? AND status = 'running'",
+                (*params, job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, spec, status, attempts, max_attempts, worker, lease_until, checkpoint, result, error, created, updated "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return Job(
+            id=row[0], spec=json.loads(row[1]), status=row[2], attempts=row[3], max_attempts=row[4],
+            worker=row[5], lease_until=row[6], checkpoint=json.loads(row[7]) if row[7] else None,
+            result=json.loads(row[8]) if row[8] else None, error=row[9], created=row[10], updated=row[11],
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update(dict(rows))
+        return counts
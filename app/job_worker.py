@@ -0,0 +1,149 @@
+# app
+from app.config import setup_logger
+from app.config import settings
+from app.job_queue import Job, JobQueue
+from app.metrics import metrics
+from app.session_pool import BrowserSessionPool
+from app.sap_config_hub import SapConfigHub, login_succeeded
+
+# utility
+from typing import Optional
+import asyncio
+import os
+import socket
+import traceback
+
+
+logger = setup_logger("SAP_Config_Hub")
+
+
+class JobWorker:
+    """
+    Runs queued jobs one after the other on its own browser.
+
+    While a job runs a heartbeat renews the lease every lease_seconds / 3 and checkpoints the steps
+    recorded so far; a job re-leased after a crash replays those steps before the agent takes over.
+    When the lease is lost (the job was handed to another worker) the running job is cancelled.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        poll_interval: float = 2.0,
+    ):
+        self.queue = queue
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.lease_seconds = lease_seconds or settings.job_lease_seconds
+        self.poll_interval = poll_interval
+        self.processed = 0
+
+    async def run(self, max_jobs: Optional[int] = None, stop_when_empty: bool = False):
+        async with BrowserSessionPool(size=1) as pool:
+            while max_jobs is None or self.processed < max_jobs:
+                job = await asyncio.to_thread(self.queue.lease, self.worker_id, self.lease_seconds)
+                if job is None:
+                    if stop_when_empty:
+                        break
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                await self.run_job(job, pool)
+                self.processed += 1
+        logger.info(f'👷 Worker {self.worker_id} stopped after {self.processed} jobs')
+
+    async def run_job(self, job: Job, pool: BrowserSessionPool):
+        spec = job['spec']
+        checkpoint = job['checkpoint'] or {}
+        password = os.getenv(spec['password_env']) if spec.get('password_env') else settings.password
+        hub = SapConfigHub(
+            company_id=spec['company_id'], username=spec['username'], password=password, base_url=spec.get('base_url')
+        )
+        resume_steps = checkpoint.get('steps') or None
+        logger.info(
+            f'👷 {self.worker_id} runs job {job["id"]} (attempt {job["attempts"]}/{job["max_attempts"]})'
+            + (f', resuming after {len(resume_steps)} steps' if resume_steps else '')
+        )
+
+        async def work():
+            async with hub.leased_browser_session(pool):
+                login_status = await hub.login_script()
+                logger.info(f'🏢 Job {job["id"]} {spec["company_id"]}: {login_status}')
+                if not login_succeeded(login_status):
+                    # the task would run against the login page
+                    raise RuntimeError(f'Login failed: {login_status}')
+                result = await hub.run_deep_agent(spec['task'], resume_steps=resume_steps)
+                await hub.save_login()
+                return result
+
+        work_task = asyncio.create_task(work())
+        heartbeat_task = asyncio.create_task(self._heartbeat(job['id'], hub, work_task))
+        try:
+            result = await work_task
+        except asyncio.CancelledError:
+            if not heartbeat_task.done():
+                raise
+            # cancelled by the heartbeat, the job belongs to another worker now
+            logger.warning(f'⚠️ Lost the lease of job {job["id"]}, dropped it')
+            metrics.inc('sap_hub_jobs_total', outcome='lease_lost')
+            return
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            logger.error(f'❌ Job {job["id"]} failed: {error}')
+            logger.debug(traceback.format_exc())
+            if hub.interrupted_steps:
+                await asyncio.to_thread(self.queue.checkpoint, job['id'], self.worker_id, {"steps": hub.interrupted_steps})
+            await asyncio.to_thread(self.queue.fail, job['id'], self.worker_id, error)
+            metrics.inc('sap_hub_jobs_total', outcome='error')
+            return
+        finally:
+            heartbeat_task.cancel()
+
+        if not result.get('completed'):
+            # the agent stopped before it finished: keep its steps and queue the job again
+            error = f'Agent run did not complete ({len(result["done_steps"])} steps)'
+            logger.error(f'❌ Job {job["id"]} failed: {error}')
+            if result['done_steps']:
+                await asyncio.to_thread(self.queue.checkpoint, job['id'], self.worker_id, {"steps": result['done_steps']})
+            await asyncio.to_thread(self.queue.fail, job['id'], self.worker_id, error)
+            metrics.inc('sap_hub_jobs_total', outcome='incomplete')
+            return
+
+        await asyncio.to_thread(self.queue.complete, job['id'], self.worker_id, result)
+        metrics.inc('sap_hub_jobs_total', outcome='ok')
+        logger.info(f'✅ Job {job["id"]} done')
+
+    async def _heartbeat(self, job_id: int, hub: SapConfigHub, work_task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            held = await asyncio.to_thread(
+                self.queue.heartbeat, job_id, self.worker_id, self.lease_seconds, self._progress(hub)
+            )
+            if not held:
+                work_task.cancel()
+                return
+
+    @staticmethod
+    def _progress(hub: SapConfigHub) -> Optional[dict]:
+        """Steps recorded so far (secrets are masked in them), None keeps the saved checkpoint"""
+        if hub.recorder is None or not hub.recorder.steps:
+            return None
+        return {"steps": list(hub.recorder.steps)}
+
+
+async def run_worker(
+    queue_path: Optional[str] = None,
+    max_jobs: Optional[int] = None,
+    stop_when_empty: bool = False,
+) -> int:
+    queue = JobQueue(queue_path or settings.job_queue_path)
+    try:
+        worker = JobWorker(queue)
+        await worker.run(max_jobs=max_jobs, stop_when_empty=stop_when_empty)
+        return worker.processed
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
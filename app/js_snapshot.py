@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+# browser_use (only for type hints, importing this module does not load browser_use)
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from browser_use.browser import BrowserSession
+    from browser_use.dom.views import EnhancedDOMTreeNode
+
+# app
+from app.dom_diff import element_line
+
+# utility
+from typing import Optional
+import json
+
+
+# backend_node_id of a node built from the JS snapshot that was not resolved yet
+UNRESOLVED = 0
+
+# One round trip: indexes the visible interactive elements of the document (and its open shadow roots),
+# keeps weak references to them in window.__sapHubElements[index] for resolve_js_node (unless keep is false,
+# for probes that must not renumber the elements of the last snapshot; weak so removed elements can still
+# be garbage collected) and returns, per element, its
+# attributes, accessible name, text, page bounding box and a fingerprint that stays the same across
+# reloads as long as the element itself does not change. Nothing is written into the DOM, so the
+# page fingerprint (app.dom_cache) is not affected.
+JS_SNAPSHOT_JS = """
+((includeAttributes, keep) => {
+    const SELECTOR = 'a[href], button, input:not([type=hidden]), select, textarea, summary, [contenteditable=""], '
+        + '[contenteditable=true], [onclick], [tabindex]:not([tabindex="-1"]), [role=button], [role=link], '
+        + '[role=checkbox], [role=radio], [role=switch], [role=tab], [role=menuitem], [role=option], '
+        + '[role=combobox], [role=textbox], [role=searchbox], [role=treeitem], [role=gridcell]';
+    const clean = value => (value || '').replace(/\\s+/g, ' ').trim();
+    const text = el => clean(el.textContent).slice(0, 200);
+    const accessibleName = el => {
+        const label = el.getAttribute('aria-label');
+        if (label) return clean(label);
+        const labelledBy = (el.getAttribute('aria-labelledby') || '').split(/\\s+/)
+            .map(id => id && document.getElementById(id)).filter(Boolean).map(text).join(' ');
+        if (labelledBy) return labelledBy;
+        if (el.labels && el.labels.length) return [...el.labels].map(text).join(' ');
+        return clean(el.getAttribute('placeholder') || el.getAttribute('title') || el.getAttribute('alt') || text(el).slice(0, 100));
+    };
+    const hash = value => {
+        let h = 0x811c9dc5;
+        for (let i = 0; i < value.length; i++) h = Math.imul(h ^ value.charCodeAt(i), 0x01000193);
+        return (h >>> 0).toString(16);
+    };
+    const path = el => {
+        const parts = [];
+        for (let node = el; node && node.tagName && parts.length < 4; node = node.parentElement) parts.push(node.tagName);
+        return parts.join('<');
+    };
+
+    const found = [];
+    const collect = root => {
+        for (const el of root.querySelectorAll('*')) {
+            if (el.matches(SELECTOR)) found.push(el);
+            if (el.shadowRoot) collect(el.shadowRoot);
+        }
+    };
+    collect(document);
+
+    const indexed = [null];
+    const elements = [];
+    let hidden = 0;
+    for (const el of found) {
+        const rect = el.getBoundingClientRect();
+        const style = getComputedStyle(el);
+        const visible = rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden'
+            && (el.checkVisibility ? el.checkVisibility() : style.display !== 'none')
+            && !el.closest('[aria-hidden=true]') && !el.disabled;
+        if (!visible) { hidden++; continue; }
+        const attributes = {};
+        for (const name of includeAttributes) {
+            const value = el.getAttribute(name);
+            if (value !== null) attributes[name] = value;
+        }
+        const name = accessibleName(el);
+        const role = el.getAttribute('role') || '';
+        indexed.push(new WeakRef(el));
+        elements.push({
+            index: indexed.length - 1,
+            tag: el.tagName.toLowerCase(),
+            attributes,
+            role,
+            name,
+            text: text(el),
+            bbox: [rect.x + scrollX, rect.y + scrollY, rect.width, rect.height],
+            visible,
+            fingerprint: hash([el.tagName, el.id, el.getAttribute('name'), role, name, el.getAttribute('type'), path(el)].join('|')),
+        });
+    }
+    if (keep) window.__sapHubElements = indexed;
+    return {url: location.href, elements, hidden, total: found.length};
+})(%s, %s)
+"""
+
+
+def js_node(element: dict, target_id: str) -> EnhancedDOMTreeNode:
+    """EnhancedDOMTreeNode of a JS snapshot element; its backend_node_id is resolved when a tool acts on it"""
+    from browser_use.dom.views import DOMRect, EnhancedAXNode, EnhancedDOMTreeNode, NodeType
+
+    children = []
+    if element['text']:
+        children.append(EnhancedDOMTreeNode(
+            node_id=UNRESOLVED, backend_node_id=UNRESOLVED, node_type=NodeType.TEXT_NODE, node_name='#text',
+            node_value=element['text'], attributes={}, is_scrollable=False, is_visible=True, absolute_position=None,
+            target_id=target_id, frame_id=None, session_id=None, content_document=None, shadow_root_type=None,
+            shadow_roots=None, parent_node=None, children_nodes=None, ax_node=None, snapshot_node=None,
+        ))
+    x, y, width, height = element['bbox']
+    node = EnhancedDOMTreeNode(
+        node_id=UNRESOLVED, backend_node_id=UNRESOLVED, node_type=NodeType.ELEMENT_NODE,
+        node_name=element['tag'].upper(), node_value='', attributes=element['attributes'],
+        is_scrollable=False, is_visible=element['visible'], absolute_position=DOMRect(x=x, y=y, width=width, height=height),
+        target_id=target_id, frame_id=None, session_id=None, content_document=None, shadow_root_type=None,
+        shadow_roots=None, parent_node=None, children_nodes=children,
+        ax_node=EnhancedAXNode(
+            ax_node_id='', ignored=False, role=element['role'] or None, name=element['name'] or None,
+            description=None, properties=None, child_ids=None,
+        ),
+        snapshot_node=None, element_index=element['index'],
+    )
+    for child in children:
+        child.parent_node = node
+    return node
+
+
+def build_js_snapshot(result: dict, target_id: str, include_attributes: list[str]) -> tuple[str, dict, dict[int, EnhancedDOMTreeNode]]:
+    """
+    index tree, elements (for app.dom_diff, keyed by (target_id, element fingerprint)) and selector map
+    of a JS_SNAPSHOT_JS result, in the same shapes the DOMTreeSerializer pipeline produces
+    """
+    selector_map: dict[int, EnhancedDOMTreeNode] = {}
+    elements: dict = {}
+    lines = []
+    seen: dict[str, int] = {}
+    for element in result['elements']:
+        node = js_node(element, target_id)
+        index = element['index']
+        selector_map[index] = node
+        line = element_line(index, node, include_attributes)
+        lines.append(line)
+        # the same fingerprint twice (e.g. repeated rows) is told apart by its occurrence
+        occurrence = seen.get(element['fingerprint'], 0)
+        seen[element['fingerprint']] = occurrence + 1
+        elements[(target_id, f"{element['fingerprint']}:{occurrence}")] = (index, line)
+    return '\n'.join(lines), elements, selector_map
+
+
+# Element `index` of the last snapshot, null when it was collected or is no longer in the document
+RESOLVE_ELEMENT_JS = """
+(() => {
+    const ref = (window.__sapHubElements || [])[%d];
+    const el = ref && ref.deref();
+    return el && el.isConnected ? el : null;
+})()
+"""
+
+# object group of the remote objects resolve_js_node creates, released right after use
+OBJECT_GROUP = 'sap_hub_resolve'
+
+
+def js_snapshot_expression(include_attributes: list[str], keep: bool = True) -> str:
+    return JS_SNAPSHOT_JS % (json.dumps(include_attributes), json.dumps(keep))
+
+
+async def resolve_js_node(browser_session: BrowserSession, node: EnhancedDOMTreeNode) -> Optional[EnhancedDOMTreeNode]:
+    """
+    Fills in the backend_node_id of a JS snapshot node (2 CDP calls, only for the element a tool acts on).
+    None when the element is gone, i.e. the page was reloaded or the element removed since the snapshot.
+    """
+    if node.backend_node_id != UNRESOLVED:
+        return node
+    cdp_session = await browser_session.get_or_create_cdp_session(target_id=node.target_id, focus=False)
+    result = await cdp_session.cdp_client.send.Runtime.evaluate(
+        params={'expression': RESOLVE_ELEMENT_JS % int(node.element_index), 'objectGroup': OBJECT_GROUP},
+        session_id=cdp_session.session_id,
+    )
+    object_id = result.get('result', {}).get('objectId')
+    if not object_id:
+        return None
+    try:
+        described = await cdp_session.cdp_client.send.DOM.describeNode(
+            params={'objectId': object_id}, session_id=cdp_session.session_id
+        )
+    finally:
+        # the backend node id is all we need, the remote object would keep the element alive
+        await cdp_session.cdp_client.send.Runtime.releaseObjectGroup(
+            params={'objectGroup': OBJECT_GROUP}, session_id=cdp_session.session_id
+        )
+    node.backend_node_id = described['node']['backendNodeId']
+    node.node_id = described['node'].get('nodeId') or UNRESOLVED
+    return node
@@ -0,0 +1,144 @@
+# langchain
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+# app
+from app.llm_cache_keys import cache_key, contains_secret, current_page_fingerprint
+
+# utility
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+import json
+import sqlite3
+import threading
+import time
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Two tier response cache for chat models (llm = AzureChatOpenAI(..., cache=LLMResponseCache())):
+    - in-memory LRU
+    - SQLite file with TTL and eviction of the least recently used rows
+    Reports hit rate and the LLM latency saved by hits.
+    Responses containing a registered secret (register_secret) are not cached in either tier.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = ".sap_hub_cache/llm.sqlite",
+        memory_size: int = 256,
+        ttl: float = 7 * 24 * 3600,
+        max_entries: int = 10_000,
+    ):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (created, latency, serialized generations)
+        self._memory: OrderedDict[str, tuple[float, float, str]] = OrderedDict()
+        # key -> time of the miss, to measure how long the real call took
+        self._pending: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        # responses not cached because they contain a secret
+        self.skipped = 0
+        self.saved_latency = 0.0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, latency REAL NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string, current_page_fingerprint())
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_latency += entry[1]
+                return self._load(entry[2])
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, latency, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[2] <= self.ttl:
+                    self._db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, (row[2], row[1], row[0]))
+                    self.sqlite_hits += 1
+                    self.saved_latency += row[1]
+                    return self._load(row[0])
+                if row is not None:
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            self._pending[key] = now
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string, current_page_fingerprint())
+        now = time.time()
+        value = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            latency = now - self._pending.pop(key, now)
+            if contains_secret(value):
+                self.skipped += 1
+                return
+            self._remember(key, (now, latency, value))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, latency, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, latency, now, now),
+                )
+                self._db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM llm_cache WHERE key NOT IN (SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+                self._db.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._pending.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.sqlite_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_latency_s": round(self.saved_latency, 3),
+        }
+
+    def _remember(self, key: str, entry: tuple[float, float, str]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _load(value: str) -> RETURN_VAL_TYPE:
+        generations = [loads(item) for item in json.loads(value)]
+        for generation in generations:
+            # a fresh id per use, otherwise add_messages would treat a reused answer as an update of the old message
+            message = getattr(generation, 'message', None)
+            if message is not None:
+                message.id = None
+        return generations
@@ -0,0 +1,63 @@
+# utility
+from contextvars import ContextVar
+from typing import Any, Optional
+import hashlib
+import json
+
+
+# keys that differ between two runs of the same conversation and must not be part of the cache key
+VOLATILE_KEYS = {'tool_call_id', 'additional_kwargs', 'response_metadata', 'usage_metadata'}
+
+# Passwords etc. a cached response must never contain (the cache file is not encrypted), see register_secret
+_secrets: set[str] = set()
+
+
+def register_secret(value: Optional[str]):
+    """Responses containing value are not cached, e.g. an input_text tool call typing the password"""
+    if value:
+        # as written in the cache value: plain, JSON escaped (the serialized message) and escaped twice (its list)
+        escaped = json.dumps(value)[1:-1]
+        _secrets.update((value, escaped, json.dumps(escaped)[1:-1]))
+
+
+def contains_secret(value: str) -> bool:
+    return any(secret in value for secret in _secrets)
+
+
+# Holder of the fingerprint of the page the agent is looking at. The hub binds one mutable holder per run,
+# so updates made inside tool calls (child asyncio tasks) are seen by the following LLM calls.
+_page_fingerprint: ContextVar[Optional[dict]] = ContextVar('page_fingerprint', default=None)
+
+
+def bind_page_fingerprint(holder: dict):
+    _page_fingerprint.set(holder)
+
+
+def current_page_fingerprint() -> str:
+    holder = _page_fingerprint.get()
+    return holder.get('fingerprint', '') if holder else ''
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        # 'id' of a message / tool call is volatile, 'id' of a serialized object ('lc' dict) is its class path
+        return {
+            key: _normalize(item) for key, item in value.items()
+            if key not in VOLATILE_KEYS and (key != 'id' or 'lc' in value)
+        }
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    return value
+
+
+def cache_key(prompt: str, llm_string: str, page_fingerprint: str = '') -> str:
+    """
+    prompt is the serialized message list and llm_string holds the model params incl. the bound tool schemas
+    """
+    try:
+        messages = json.dumps(_normalize(json.loads(prompt)), sort_keys=True)
+    except ValueError:
+        messages = ' '.join(prompt.split())
+    return hashlib.sha256(f'{messages}\0{llm_string}\0{page_fingerprint}'.encode()).hexdigest()
@@ -0,0 +1,92 @@
+# langchain
+from langchain_core.callbacks import AsyncCallbackHandler
+
+# app
+from app.metrics import metrics
+from app.tracing import Span, TraceRecorder, _current_span
+
+# utility
+from typing import Any, Optional
+from uuid import UUID
+import asyncio
+import time
+
+
+class LLMMetricsCallback(AsyncCallbackHandler):
+    """Chat model latency into sap_hub_llm_seconds and token usage into sap_hub_llm_tokens_total"""
+
+    def __init__(self):
+        self._started: dict[UUID, tuple[float, str]] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        model = (kwargs.get('invocation_params') or {}).get('model') or (serialized or {}).get('name') or 'unknown'
+        self._started[run_id] = (time.perf_counter(), str(model))
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        started, model = self._started.pop(run_id, (None, 'unknown'))
+        if started is not None:
+            metrics.observe('sap_hub_llm_seconds', time.perf_counter() - started, model=model, outcome='ok')
+        for kind, count in self._token_usage(response).items():
+            metrics.inc('sap_hub_llm_tokens_total', count, model=model, kind=kind)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started, model = self._started.pop(run_id, (None, 'unknown'))
+        if started is not None:
+            outcome = 'timeout' if isinstance(error, (asyncio.TimeoutError, TimeoutError)) else 'error'
+            metrics.observe('sap_hub_llm_seconds', time.perf_counter() - started, model=model, outcome=outcome)
+        metrics.inc('sap_hub_errors_total', operation='llm')
+
+    @staticmethod
+    def _token_usage(response) -> dict[str, int]:
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                for kind in ('input_tokens', 'output_tokens'):
+                    usage[kind] = usage.get(kind, 0) + int(metadata.get(kind) or 0)
+        return {kind: count for kind, count in usage.items() if count}
+
+
+class TraceCallback(AsyncCallbackHandler):
+    """
+    Spans for LLM requests and LangGraph nodes.
+    Runs inline so the node span becomes the parent of the tool / DOM spans started by the node.
+    """
+
+    run_inline = True
+
+    def __init__(self, recorder: TraceRecorder):
+        self.recorder = recorder
+        # run_id -> span that was current before the node started
+        self._previous: dict[UUID, Optional[Span]] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        model = (kwargs.get('invocation_params') or {}).get('model') or 'llm'
+        self.recorder.begin(run_id, f'llm {model}', 'llm', messages=sum(len(batch) for batch in messages))
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        self.recorder.end(run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.recorder.end(run_id, error=f'{type(error).__name__}: {error}')
+
+    async def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get('langgraph_node')
+        # nested runnables of a node carry the same metadata, only the node itself gets a span
+        if not node or kwargs.get('name') != node:
+            return
+        span = self.recorder.begin(run_id, node, 'graph', step=(metadata or {}).get('langgraph_step'))
+        self._previous[run_id] = _current_span.get()
+        _current_span.set(span)
+
+    async def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any) -> None:
+        self._close_node(run_id)
+
+    async def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._close_node(run_id, error=f'{type(error).__name__}: {error}')
+
+    def _close_node(self, run_id: UUID, **args):
+        if run_id not in self._previous:
+            return
+        _current_span.set(self._previous.pop(run_id))
+        self.recorder.end(run_id, **args)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+# browser_use (only for type hints, importing this module does not load browser_use)
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from browser_use.dom.views import EnhancedDOMTreeNode
+
+# utility
+from typing import Optional
+import re
+
+
+# attributes an element is labelled with, besides its accessible name
+LABEL_ATTRIBUTES = ('aria-label', 'placeholder', 'name', 'title', 'alt')
+
+# role of elements without a role attribute / accessible role, by tag and input type
+INPUT_ROLES = {
+    'checkbox': 'checkbox',
+    'radio': 'radio',
+    'button': 'button',
+    'submit': 'button',
+    'reset': 'button',
+    'search': 'searchbox textbox',
+    'range': 'slider',
+    'number': 'spinbutton textbox',
+}
+TAG_ROLES = {
+    'button': 'button',
+    'a': 'link',
+    'select': 'combobox',
+    'textarea': 'textbox',
+    'option': 'option',
+    'summary': 'button',
+}
+
+TOKEN = re.compile(r'[a-z0-9]+')
+
+FIELDS = ('role', 'label', 'text')
+
+
+def tokens(value: str) -> list[str]:
+    return TOKEN.findall(value.lower())
+
+
+def element_values(node: EnhancedDOMTreeNode) -> dict[str, str]:
+    """The role, label and text an element can be found by"""
+    attributes = node.attributes or {}
+    tag = node.tag_name
+    ax_role = node.ax_node.role if node.ax_node and node.ax_node.role else ''
+    ax_name = node.ax_node.name if node.ax_node and node.ax_node.name else ''
+    if tag == 'input':
+        implied_role = INPUT_ROLES.get(attributes.get('type', 'text').lower(), 'textbox')
+    else:
+        implied_role = TAG_ROLES.get(tag, '')
+
+    labels = [attributes.get(name, '') for name in LABEL_ATTRIBUTES] + [ax_name]
+    text = node.get_all_children_text(max_depth=2)
+    if tag == 'input' and attributes.get('type', '').lower() in ('button', 'submit', 'reset'):
+        text = f"{text} {attributes.get('value', '')}"
+    return {
+        "role": ' '.join(filter(None, (attributes.get('role', ''), ax_role, implied_role))),
+        "label": ' '.join(filter(None, labels)),
+        "text": ' '.join(text.split()),
+    }
+
+
+class ElementIndex:
+    """
+    Inverted index over the elements of one selector map: token -> element indices, per field
+    (role, label = aria-label / placeholder / name / title / accessible name, text).
+
+    find(role=, label=, text=) intersects the posting sets of the query tokens, so a lookup costs
+    a few set operations however large the page is. Built once per snapshot.
+    """
+
+    def __init__(self, selector_map: dict[int, EnhancedDOMTreeNode]):
+        self._postings: dict[str, dict[str, set[int]]] = {field: {} for field in FIELDS}
+        self._tokens: dict[int, dict[str, list[str]]] = {}
+        for index, node in selector_map.items():
+            values = element_values(node)
+            self._tokens[index] = {field: tokens(value) for field, value in values.items()}
+            for field, field_tokens in self._tokens[index].items():
+                for token in field_tokens:
+                    self._postings[field].setdefault(token, set()).add(index)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def find_all(self, role: Optional[str] = None, label: Optional[str] = None, text: Optional[str] = None) -> list[int]:
+        """
+        Indices of the elements that have every token of every given criterion (case-insensitive),
+        best match first: exact label / text matches, then the fewest extra words, then document order
+        """
+        query = {field: tokens(value) for field, value in (('role', role), ('label', label), ('text', text)) if value}
+        if not query:
+            return []
+        candidates: Optional[set[int]] = None
+        for field, query_tokens in query.items():
+            for token in query_tokens:
+                matches = self._postings[field].get(token)
+                if not matches:
+                    return []
+                candidates = set(matches) if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+
+        def rank(index: int) -> tuple:
+            element_tokens = self._tokens[index]
+            exact = sum(1 for field, query_tokens in query.items() if field != 'role' and element_tokens[field] == query_tokens)
+            extra = sum(len(element_tokens[field]) - len(query_tokens) for field, query_tokens in query.items() if field != 'role')
+            return -exact, extra, index
+
+        return sorted(candidates or (), key=rank)
+
+    def find(self, role: Optional[str] = None, label: Optional[str] = None, text: Optional[str] = None) -> Optional[int]:
+        matches = self.find_all(role=role, label=label, text=text)
+        return matches[0] if matches else None
@@ -0,0 +1,190 @@
+# app
+from app.tracing import trace_span
+
+# utility
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Iterator
+import asyncio
+import bisect
+import json
+import threading
+import time
+
+
+# seconds, fits CDP round trips (ms) as well as LLM calls and page loads (s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# tools report failures as strings instead of raising
+TOOL_ERROR_PREFIXES = ('Failed', 'Navigation failed', 'Something went wrong', 'Error')
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        position = bisect.bisect_left(self.buckets, value)
+        if position < len(self.buckets):
+            self.counts[position] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[int]:
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms with labels, exported as Prometheus text or JSON.
+
+    usage:
+        metrics.inc('sap_hub_retries_total', operation='current_page_index')
+        with metrics.timer('sap_hub_event_bus_seconds', event='ClickElementEvent'):
+            ...
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[dict]:
+        """
+        Observes the duration with an outcome label (ok / error / timeout).
+        The yielded dict can override the outcome, e.g. for error results that are not exceptions.
+        """
+        state = {"outcome": "ok"}
+        start = time.perf_counter()
+        try:
+            yield state
+        except (asyncio.TimeoutError, TimeoutError):
+            state["outcome"] = "timeout"
+            raise
+        except BaseException:
+            state["outcome"] = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, outcome=state["outcome"], **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_json(self) -> dict:
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": histogram.count,
+                        "sum": round(histogram.sum, 6),
+                        "buckets": dict(zip((str(bound) for bound in histogram.buckets), histogram.cumulative())),
+                    }
+                    for key, histogram in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                for key, value in series.items():
+                    lines.append(f'{name}{_format_labels(key)} {value}')
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {name} histogram')
+                for key, histogram in series.items():
+                    for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                        lines.append(f'{name}_bucket{_format_labels(key, (("le", str(bound)),))} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(key, (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum}')
+                    lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str):
+        """Writes Prometheus text for *.prom / *.txt, JSON otherwise"""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.suffix in ('.prom', '.txt'):
+            target.write_text(self.to_prometheus(), encoding='utf-8')
+        else:
+            target.write_text(json.dumps(self.to_json(), indent=2), encoding='utf-8')
+
+
+metrics = MetricsRegistry()
+
+
+def timed_tool(function):
+    """
+    Times a hub tool into sap_hub_tool_seconds{tool, outcome} and a trace span, error strings count as errors
+    """
+    name = function.__name__
+
+    @wraps(function)
+    async def wrapper(*args, **kwargs):
+        with trace_span(name, 'tool'), metrics.timer('sap_hub_tool_seconds', tool=name) as state:
+            result = await function(*args, **kwargs)
+            if isinstance(result, str) and result.startswith(TOOL_ERROR_PREFIXES):
+                state["outcome"] = "error"
+                metrics.inc('sap_hub_errors_total', operation=name)
+            return result
+
+    return wrapper
+
+
+def __getattr__(name: str):
+    # the LangChain callback lives in app.llm_callbacks, importing this module does not load langchain
+    if name == "LLMMetricsCallback":
+        from app.llm_callbacks import LLMMetricsCallback
+
+        return LLMMetricsCallback
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
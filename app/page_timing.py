@@ -0,0 +1,126 @@
+# app
+from app.config import setup_logger
+
+# utility
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+import json
+import re
+
+
+logger = setup_logger("SAP_Config_Hub")
+
+# path segments that are ids (numbers, tenant / company ids, uuids, session ids) rather than pages
+ID_SEGMENT = re.compile(r'^\d+$|^(?=.*\d)[\w.~-]{6,}$')
+
+# samples a URL pattern needs before its learned wait replaces the default
+MIN_SAMPLES = 3
+
+
+def url_pattern(url: str, tenant: Optional[str] = None) -> str:
+    """
+    The page a URL is for, shared by every tenant: host, query, fragment and ;params are dropped,
+    the tenant and id-like path segments become '*'
+        https://hcm41.sapsf.com/sf/admin;jsessionid=ab12?company=SFCPART001662 -> /sf/admin
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https'):
+        return f'{parsed.scheme}:'
+    segments = []
+    for segment in parsed.path.split('/'):
+        segment = segment.split(';', 1)[0]
+        if not segment:
+            continue
+        if (tenant and segment.lower() == tenant.lower()) or ID_SEGMENT.match(segment):
+            segment = '*'
+        segments.append(segment.lower())
+    return '/' + '/'.join(segments)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Linear interpolation between closest ranks, q in [0, 100]"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class PageTimingTable:
+    """
+    Time-to-ready samples per URL pattern (the last `window` navigations, counted from the navigation
+    committing) and the wait before the first snapshot learned from them: the `q` percentile, bounded
+    by min_wait / max_wait. Patterns with fewer than MIN_SAMPLES samples get `default`.
+
+    Saved as JSON after every sample, so the next run starts tuned. Processes sharing the file do not
+    merge their samples, the last one to save wins.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        default: float,
+        min_wait: float,
+        max_wait: float,
+        q: float = 90,
+        window: int = 20,
+    ):
+        self.path = Path(path) if path else None
+        self.default = default
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.q = q
+        self.window = window
+        self.samples: dict[str, list[float]] = self._load()
+
+    def _load(self) -> dict[str, list[float]]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            return {pattern: [float(value) for value in values][-self.window:] for pattern, values in data['samples'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning(f'Ignoring unreadable page timing table {self.path}: {type(e).__name__}: {e}')
+            return {}
+
+    def save(self):
+        if self.path is None:
+            return
+        data = {
+            "percentile": self.q,
+            "samples": self.samples,
+            "minimum_wait": {pattern: round(self.minimum_wait_for(pattern), 3) for pattern in self.samples},
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(data, indent=1, sort_keys=True), encoding='utf-8')
+            tmp_path.replace(self.path)
+        except OSError as e:
+            logger.warning(f'Failed to save page timing table {self.path}: {type(e).__name__}: {e}')
+
+    def record(self, pattern: str, seconds: float):
+        samples = self.samples.setdefault(pattern, [])
+        samples.append(round(seconds, 3))
+        del samples[:-self.window]
+        self.save()
+
+    def minimum_wait_for(self, pattern: str) -> float:
+        samples = self.samples.get(pattern) or []
+        if len(samples) < MIN_SAMPLES:
+            return self.default
+        return min(max(percentile(samples, self.q), self.min_wait), self.max_wait)
+
+
+# one table per file for all hubs of the process, so concurrent runs add to the same samples
+_tables: dict[str, PageTimingTable] = {}
+
+
+def get_page_timing(path: str, default: float, min_wait: float, max_wait: float, q: float, window: int) -> PageTimingTable:
+    table = _tables.get(path)
+    if table is None:
+        table = _tables[path] = PageTimingTable(path, default, min_wait, max_wait, q, window)
+    return table
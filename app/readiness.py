@@ -0,0 +1,301 @@
+# app
+from app.config import setup_logger
+
+# utility
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import time
+
+
+logger = setup_logger("SAP_Config_Hub")
+
+# Resolves true once the document is complete and no UI5 busy indicator / block layer is visible,
+# false after the timeout. Event driven in the page (MutationObserver + load), no polling.
+UI5_IDLE_JS = """
+new Promise(resolve => {
+    const visible = el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const busy = () => {
+        if (document.readyState !== 'complete') return true;
+        const blockers = document.querySelectorAll(
+            '.sapUiLocalBusyIndicator, .sapUiBusyIndicator, .sapMBusyDialog, #sap-ui-blocklayer-popup, .sapUiBLy'
+        );
+        return Array.from(blockers).some(visible);
+    };
+    if (!busy()) return resolve(true);
+    let timer = null;
+    const observer = new MutationObserver(() => check());
+    const check = () => {
+        if (busy()) return;
+        observer.disconnect();
+        clearTimeout(timer);
+        resolve(true);
+    };
+    observer.observe(document, {subtree: true, childList: true, attributes: true, attributeFilter: ['class', 'style']});
+    window.addEventListener('load', check, {once: true});
+    timer = setTimeout(() => { observer.disconnect(); resolve(false); }, %d);
+})
+"""
+
+# Resolves on the next DOM mutation (or after the timeout)
+NEXT_MUTATION_JS = """
+new Promise(resolve => {
+    const observer = new MutationObserver(() => { observer.disconnect(); resolve(true); });
+    observer.observe(document, {subtree: true, childList: true, attributes: true});
+    setTimeout(() => { observer.disconnect(); resolve(false); }, %d);
+})
+"""
+
+
+# requests in flight for longer than this (long polling, streams) do not block network idle
+LONG_REQUEST_SECONDS = 10
+
+
+class TabEvents:
+    """Lifecycle and network state of one tab, fed by CDP events"""
+
+    def __init__(self, target_id: str):
+        self.target_id = target_id
+        self.lifecycle: set[str] = set()
+        # request id -> start time
+        self.inflight: dict[str, float] = {}
+        self.last_network_activity = time.monotonic()
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+
+    async def wait_for_change(self, timeout: float):
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            pass
+
+    async def wait_for_load(self, deadline: float) -> bool:
+        while 'load' not in self.lifecycle:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await self.wait_for_change(remaining)
+        return True
+
+    async def wait_for_network_idle(self, idle_time: float, deadline: float) -> bool:
+        while True:
+            now = time.monotonic()
+            # long polling requests never finish, ignore anything in flight for too long
+            active = [started for started in self.inflight.values() if now - started < LONG_REQUEST_SECONDS]
+            quiet_for = now - self.last_network_activity
+            if not active and quiet_for >= idle_time:
+                return True
+            remaining = deadline - now
+            if remaining <= 0:
+                return False
+            if active:
+                # wake up at the latest when the oldest active request turns into a long one
+                await self.wait_for_change(min(remaining, LONG_REQUEST_SECONDS - (now - min(active))))
+            else:
+                await self.wait_for_change(min(remaining, idle_time - quiet_for))
+
+
+class PageEvents:
+    """
+    Subscribes to Page.lifecycleEvent and Network request events on the CDP clients the hub uses.
+    One handler per CDP client dispatches to the TabEvents of the session the event came from
+    (and to the network listeners, e.g. app.request_blocking counting blocked requests).
+    """
+
+    def __init__(self):
+        self._tabs: dict[str, TabEvents] = {}
+        self._clients: list[Any] = []
+        self._sessions: dict[str, Any] = {}
+        self._change_listeners: list[Callable[[str], None]] = []
+        self._network_listeners: list[Callable[[str, dict], None]] = []
+        self._attach_hooks: list[Callable[[Any], Awaitable[None]]] = []
+
+    def on_change(self, listener: Callable[[str], None]):
+        """listener(target_id) is called when a tab starts a new document or its frame is resized"""
+        self._change_listeners.append(listener)
+
+    def on_network(self, listener: Callable[[str, dict], None]):
+        """listener(method, event) is called for requestWillBeSent, loadingFinished and loadingFailed"""
+        self._network_listeners.append(listener)
+
+    def on_attach(self, hook: Callable[[Any], Awaitable[None]]):
+        """await hook(cdp_session) runs once per session, after Network is enabled on it"""
+        self._attach_hooks.append(hook)
+
+    def _network(self, method: str, event: dict):
+        for listener in self._network_listeners:
+            try:
+                listener(method, event)
+            except Exception as e:
+                logger.debug(f'Network listener failed on {method}: {type(e).__name__}: {e}')
+
+    def _changed(self, tab: TabEvents):
+        for listener in self._change_listeners:
+            listener(tab.target_id)
+
+    def sessions(self) -> list:
+        """CDP sessions attached to so far"""
+        return list(self._sessions.values())
+
+    async def attach(self, cdp_session) -> TabEvents:
+        tab = self._tabs.get(cdp_session.session_id)
+        if tab is not None:
+            return tab
+
+        client = cdp_session.cdp_client
+        if not any(known is client for known in self._clients):
+            client.register.Page.lifecycleEvent(self._on_lifecycle)
+            client.register.Page.frameResized(self._on_frame_resized)
+            client.register.Network.requestWillBeSent(self._on_request_started)
+            client.register.Network.loadingFinished(self._on_loading_finished)
+            client.register.Network.loadingFailed(self._on_loading_failed)
+            self._clients.append(client)
+
+        tab = TabEvents(cdp_session.target_id)
+        self._tabs[cdp_session.session_id] = tab
+        self._sessions[cdp_session.session_id] = cdp_session
+        session_id = cdp_session.session_id
+        await client.send.Page.enable(session_id=session_id)
+        await client.send.Page.setLifecycleEventsEnabled(params={'enabled': True}, session_id=session_id)
+        await client.send.Network.enable(session_id=session_id)
+        for hook in self._attach_hooks:
+            try:
+                await hook(cdp_session)
+            except Exception as e:
+                logger.warning(f'Page events attach hook failed on {cdp_session.target_id}: {type(e).__name__}: {e}')
+
+        # we may attach after the page finished loading, in that case no 'load' event will come
+        result = await client.send.Runtime.evaluate(
+            params={'expression': 'document.readyState', 'returnByValue': True}, session_id=session_id
+        )
+        if result.get('result', {}).get('value') == 'complete':
+            tab.lifecycle.add('load')
+        return tab
+
+    def expect_navigation(self, cdp_session):
+        """
+        Forget the lifecycle of the tab's current document before it navigates, so wait_for_page_ready
+        waits for the 'load' of the next document instead of returning on the old one's
+        """
+        tab = self._tabs.get(cdp_session.session_id)
+        if tab is not None:
+            tab.lifecycle.clear()
+
+    def _on_lifecycle(self, event, session_id: Optional[str] = None):
+        tab = self._tabs.get(session_id)
+        # only the main frame of the tab, its frame id is the target id
+        if tab is None or event.get('frameId') != tab.target_id:
+            return
+        if event.get('name') == 'init':
+            tab.lifecycle.clear()
+            self._changed(tab)
+        tab.lifecycle.add(event.get('name'))
+        tab.notify()
+
+    def _on_frame_resized(self, event, session_id: Optional[str] = None):
+        tab = self._tabs.get(session_id)
+        if tab is not None:
+            self._changed(tab)
+
+    def _on_request_started(self, event, session_id: Optional[str] = None):
+        tab = self._tabs.get(session_id)
+        if tab is None:
+            return
+        tab.last_network_activity = time.monotonic()
+        tab.inflight[event.get('requestId')] = tab.last_network_activity
+        tab.notify()
+        self._network('requestWillBeSent', event)
+
+    def _on_loading_finished(self, event, session_id: Optional[str] = None):
+        self._on_request_done(event, session_id)
+        if session_id in self._tabs:
+            self._network('loadingFinished', event)
+
+    def _on_loading_failed(self, event, session_id: Optional[str] = None):
+        self._on_request_done(event, session_id)
+        if session_id in self._tabs:
+            self._network('loadingFailed', event)
+
+    def _on_request_done(self, event, session_id: Optional[str] = None):
+        tab = self._tabs.get(session_id)
+        if tab is None:
+            return
+        tab.inflight.pop(event.get('requestId'), None)
+        tab.last_network_activity = time.monotonic()
+        tab.notify()
+
+
+async def wait_for_page_ready(
+    browser_session,
+    page_events: PageEvents,
+    timeout: float = 15,
+    network_idle: float = 0.5,
+    ui5: bool = True,
+    until: Optional[Callable[[dict], bool]] = None,
+    probe: Optional[Callable[[], Awaitable[Optional[dict]]]] = None,
+) -> dict:
+    """
+    Wait until the focused tab is ready, returning as soon as every requested signal is there:
+    - main frame 'load' lifecycle event
+    - no request in flight for `network_idle` seconds
+    - no visible UI5 busy indicator / block layer (ui5=True)
+    - until(selector_map) is true for the selector map await probe() returns (optional, probe is
+      required with until); it is probed again after every DOM mutation, so it should be cheap
+    Never raises on timeout, the result says which signal was still pending.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    signals = []
+
+    def result(ready: bool, pending: Optional[str] = None) -> dict:
+        elapsed = time.monotonic() - start
+        if not ready:
+            logger.info(f'⏳ Page not ready after {elapsed:.2f}s, still waiting for {pending}')
+        return {"ready": ready, "elapsed": elapsed, "signals": signals, "pending": pending}
+
+    cdp_session = await browser_session.get_or_create_cdp_session()
+    tab = await page_events.attach(cdp_session)
+
+    if not await tab.wait_for_load(deadline):
+        return result(False, 'load')
+    signals.append('load')
+
+    if network_idle is not None and network_idle > 0:
+        if not await tab.wait_for_network_idle(network_idle, deadline):
+            return result(False, 'network_idle')
+        signals.append('network_idle')
+
+    if ui5:
+        remaining_ms = int(max(deadline - time.monotonic(), 0) * 1000)
+        idle = await _evaluate_promise(cdp_session, UI5_IDLE_JS % remaining_ms)
+        if idle is False:
+            return result(False, 'ui5_idle')
+        signals.append('ui5_idle')
+
+    if until is not None:
+        while True:
+            selector_map = await probe()
+            if selector_map is not None and until(selector_map):
+                signals.append('element')
+                break
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return result(False, 'element')
+            await _evaluate_promise(cdp_session, NEXT_MUTATION_JS % remaining_ms)
+
+    return result(True)
+
+
+async def _evaluate_promise(cdp_session, expression: str):
+    try:
+        response = await cdp_session.cdp_client.send.Runtime.evaluate(
+            params={'expression': expression, 'returnByValue': True, 'awaitPromise': True},
+            session_id=cdp_session.session_id,
+        )
+        return response.get('result', {}).get('value')
+    except Exception as e:
+        # the document may have been replaced while we were waiting on it
+        logger.debug(f'Readiness probe failed: {type(e).__name__}: {e}')
+        return None
@@ -0,0 +1,184 @@
+# app
+from app.config import setup_logger
+from app.metrics import metrics
+
+# utility
+from fnmatch import fnmatchcase
+from typing import Iterable, Optional
+
+
+logger = setup_logger("SAP_Config_Hub")
+
+
+def _extensions(*extensions: str) -> list[str]:
+    # Network.setBlockedURLs wildcards, with and without a query string
+    return [pattern for extension in extensions for pattern in (f'*.{extension}', f'*.{extension}?*')]
+
+
+# URL patterns of the resource types a profile can block, Network.setBlockedURLs only matches URLs
+RESOURCE_TYPE_PATTERNS = {
+    'image': _extensions('png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp', 'ico', 'svg'),
+    'font': _extensions('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': _extensions('mp4', 'webm', 'ogg', 'mp3', 'wav', 'm4a'),
+    'stylesheet': _extensions('css'),
+}
+
+# bytes a blocked request is assumed to save until requests of its type were seen loading
+TYPICAL_BYTES = {
+    'Image': 30_000,
+    'Font': 60_000,
+    'Media': 500_000,
+    'Stylesheet': 40_000,
+    'Script': 50_000,
+    'XHR': 2_000,
+    'Fetch': 2_000,
+    'Ping': 500,
+}
+DEFAULT_TYPICAL_BYTES = 10_000
+
+# analytics / product tour / monitoring beacons SuccessFactors tenants load, the agent never needs them
+ANALYTICS_PATTERNS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*pendo.io*',
+    '*walkme.com*',
+    '*qualtrics.com*',
+    '*omtrdc.net*',
+    '*adobedtm.com*',
+    '*demdex.net*',
+    '*hotjar.com*',
+    '*nr-data.net*',
+    '*newrelic.com*',
+]
+
+# Built-in profiles, name -> (resource types, deny patterns, allow patterns)
+PRESETS: dict[str, tuple[list[str], list[str], list[str]]] = {
+    'off': ([], [], []),
+    # Images, media, analytics and the "72" text fonts of the UI5 theme. Stylesheets stay, visibility and
+    # layout (what the snapshots look at) depend on them; so do the icon fonts (SAP-icons etc.), icon only
+    # buttons would collapse to zero width without them.
+    'successfactors': (
+        ['image', 'media'],
+        ANALYTICS_PATTERNS + ['*/fonts/72-*', '*/fonts/72Brand*', '*/themes/*/img/*'],
+        [],
+    ),
+}
+
+
+class RequestBlockingProfile:
+    """
+    Deny rules by resource type (RESOURCE_TYPE_PATTERNS) and by URL pattern ('*' wildcards), allow rules
+    by URL pattern. Allow wins over deny: Network.setBlockedURLs has no exceptions, so an allow pattern
+    lifts every deny pattern it matches, e.g. allow '*.svg*' keeps the svg images of the 'image' type.
+    """
+
+    def __init__(
+        self,
+        name: str = 'custom',
+        resource_types: Iterable[str] = (),
+        deny: Iterable[str] = (),
+        allow: Iterable[str] = (),
+    ):
+        self.name = name
+        self.resource_types = list(resource_types)
+        unknown = [resource_type for resource_type in self.resource_types if resource_type not in RESOURCE_TYPE_PATTERNS]
+        if unknown:
+            raise ValueError(f'Unknown resource types {unknown}, known: {sorted(RESOURCE_TYPE_PATTERNS)}')
+        self.deny = list(deny)
+        self.allow = list(allow)
+
+    @classmethod
+    def preset(cls, name: str, deny: Iterable[str] = (), allow: Iterable[str] = ()) -> 'RequestBlockingProfile':
+        """A built-in profile (PRESETS) with extra deny / allow patterns"""
+        if name not in PRESETS:
+            raise ValueError(f'Unknown request blocking preset {name!r}, known: {sorted(PRESETS)}')
+        resource_types, preset_deny, preset_allow = PRESETS[name]
+        return cls(name, resource_types, preset_deny + list(deny), preset_allow + list(allow))
+
+    def blocked_urls(self) -> list[str]:
+        patterns = [pattern for resource_type in self.resource_types for pattern in RESOURCE_TYPE_PATTERNS[resource_type]]
+        patterns += self.deny
+        return [
+            pattern for pattern in dict.fromkeys(patterns)
+            if not any(fnmatchcase(pattern, allowed) for allowed in self.allow)
+        ]
+
+    def blocks(self, url: str) -> bool:
+        """Whether Chrome blocks url under this profile"""
+        return any(fnmatchcase(url, pattern) for pattern in self.blocked_urls())
+
+    def __repr__(self) -> str:
+        return f'RequestBlockingProfile({self.name!r}, {len(self.blocked_urls())} patterns)'
+
+
+class RequestBlocker:
+    """
+    Applies a RequestBlockingProfile to the CDP sessions PageEvents attaches to and counts what it saved.
+    Blocked requests show up as Network.loadingFailed with blockedReason 'inspector'; the bytes they
+    would have cost are the average encoded size of the requests of the same type that did load,
+    TYPICAL_BYTES until there are any.
+    """
+
+    def __init__(self, profile: Optional[RequestBlockingProfile] = None):
+        self.profile = profile or RequestBlockingProfile('off')
+        self.blocked: dict[str, int] = {}
+        self.bytes_saved = 0
+        # encoded bytes of the requests that loaded
+        self.bytes_loaded = 0
+        # resource type -> (requests, bytes) that loaded
+        self._loaded: dict[str, tuple[int, int]] = {}
+        # request id -> resource type, while in flight
+        self._types: dict[str, str] = {}
+
+    async def apply(self, cdp_session):
+        """Sets the blocked URLs of the session, called once Network is enabled on it"""
+        # also sent when empty, that lifts the patterns of a previous profile
+        urls = self.profile.blocked_urls()
+        await cdp_session.cdp_client.send.Network.setBlockedURLs(params={'urls': urls}, session_id=cdp_session.session_id)
+        logger.debug(f'🚫 {self.profile.name} request blocking on {cdp_session.target_id}: {len(urls)} patterns')
+
+    def on_network(self, method: str, event: dict):
+        """PageEvents network listener"""
+        request_id = event.get('requestId')
+        if method == 'requestWillBeSent':
+            self._types[request_id] = event.get('type') or 'Other'
+            return
+        resource_type = self._types.pop(request_id, None) or event.get('type') or 'Other'
+        if method == 'loadingFinished':
+            size = int(event.get('encodedDataLength') or 0)
+            requests, total = self._loaded.get(resource_type, (0, 0))
+            self._loaded[resource_type] = (requests + 1, total + size)
+            self.bytes_loaded += size
+        elif method == 'loadingFailed' and event.get('blockedReason') == 'inspector':
+            saved = self.estimated_bytes(resource_type)
+            self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+            self.bytes_saved += saved
+            metrics.inc('sap_hub_requests_blocked_total', resource_type=resource_type, profile=self.profile.name)
+            metrics.inc('sap_hub_request_bytes_saved_total', saved, resource_type=resource_type, profile=self.profile.name)
+
+    def estimated_bytes(self, resource_type: str) -> int:
+        requests, total = self._loaded.get(resource_type, (0, 0))
+        if requests:
+            return total // requests
+        return TYPICAL_BYTES.get(resource_type, DEFAULT_TYPICAL_BYTES)
+
+    def stats(self) -> dict:
+        return {
+            "profile": self.profile.name,
+            "blocked": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "bytes_saved": self.bytes_saved,
+            "bytes_loaded": self.bytes_loaded,
+        }
+
+    def reset_stats(self):
+        self.blocked.clear()
+        self.bytes_saved = 0
+        self.bytes_loaded = 0
+
+
+def profile_from_settings(name: str, deny: str = '', allow: str = '') -> RequestBlockingProfile:
+    """Profile of the request_blocking settings, deny / allow are comma separated URL patterns"""
+    split = lambda patterns: [pattern.strip() for pattern in (patterns or '').split(',') if pattern.strip()]
+    return RequestBlockingProfile.preset(name or 'off', deny=split(deny), allow=split(allow))
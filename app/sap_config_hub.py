@@ -1,85 +1,232 @@
-# browser_use
-from browser_use.dom.serializer.serializer import DOMTreeSerializer
-from browser_use.tools.views import (
-	ClickElementAction,
-	CloseTabAction,
-	DoneAction,
-	GetDropdownOptionsAction,
-	GoToUrlAction,
-	InputTextAction,
-	NoParamsAction,
-	ScrollAction,
-	SearchAction,
-	SelectDropdownOptionAction,
-	SendKeysAction,
-	StructuredOutputAction,
-	SwitchTabAction,
-	UploadFileAction,
-)
-from browser_use.tools.service import _detect_sensitive_key_name
-from browser_use.browser.views import BrowserError
-from browser_use.browser import BrowserSession
-from browser_use.browser.events import (
-	ClickElementEvent,
-	CloseTabEvent,
-	GetDropdownOptionsEvent,
-	GoBackEvent,
-	NavigateToUrlEvent,
-	ScrollEvent,
-	ScrollToTextEvent,
-	SendKeysEvent,
-	SwitchTabEvent,
-	TypeTextEvent,
-	UploadFileEvent,
-    ScreenshotEvent
-)
-from browser_use.browser.profile import BrowserProfile
+# browser_use / langchain / langgraph are imported by the methods that use them, importing the hub stays cheap
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+	from browser_use.browser import BrowserSession
+	from langchain_core.language_models import BaseChatModel
+	from langgraph.types import Command
+	from app.agent_state import AgentState, TaskExecutor
 
 # app
 from app.config import setup_logger
 from app.config import settings
-from app.config import llm
-
-# langchain
-from langchain_core.tools import tool
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
-
-# langgraph
-from langgraph.graph.message import add_messages
-from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.types import Command
+from app.config import get_llm
+from app.compact_dom import compact_index_tree
+from app.locator import ElementIndex
+from app.js_snapshot import UNRESOLVED, build_js_snapshot, js_snapshot_expression, resolve_js_node
+from app.dom_cache import DomSnapshotCache, PageSnapshot, PAGE_FINGERPRINT_JS
+from app.dom_diff import diff_elements, format_diff, interactive_elements
+from app.session_pool import DEFAULT_MINIMUM_WAIT, BrowserSessionPool, build_browser_profile
+from app.page_timing import get_page_timing, url_pattern
+from app.readiness import PageEvents, wait_for_page_ready
+from app.request_blocking import RequestBlocker, RequestBlockingProfile, profile_from_settings
+from app.session_store import SessionStateStore
+from app.llm_cache_keys import bind_page_fingerprint, register_secret
+from app.metrics import TOOL_ERROR_PREFIXES, metrics, timed_tool
+from app.tracing import recording, trace_file, trace_span
+from app.trajectory import INDEX_ARGUMENTS, TrajectoryRecorder, TrajectoryStore, find_element, trajectory_name
 
 # utility
-from typing import Optional, TypedDict, NotRequired, Annotated, Literal
-from deepagents.tools import write_todos, WRITE_TODOS_DESCRIPTION, Todo
+from typing import Any, Optional, TypedDict, NotRequired, Literal, AsyncIterator, Awaitable, Callable
+from contextlib import AsyncExitStack, asynccontextmanager
+from functools import wraps
+from pathlib import Path
+import hashlib
+import inspect
+import json
 import asyncio
+import time
+import uuid
 
 
 logger = setup_logger("SAP_Config_Hub")
 
+# Scrolls the closest scrollable ancestor of `this` (or the page) to its end, returns the distance in px
+SCROLL_TO_END_JS = """function(down) {
+    const scrollable = el => el && el.scrollHeight > el.clientHeight + 1
+        && /(auto|scroll|overlay)/.test(getComputedStyle(el).overflowY);
+    let el = this;
+    while (el && el !== document.scrollingElement && !scrollable(el)) el = el.parentElement;
+    el = el || document.scrollingElement || document.documentElement;
+    const before = el.scrollTop;
+    el.scrollTop = down ? el.scrollHeight : 0;
+    return Math.abs(el.scrollTop - before);
+}"""
+
+# Sets the value of `this` (or the input inside it) with the native setter, so UI5 / framework wrappers
+# see the change, fires input + change + blur and returns whether the value reads back as expected.
+# A value that did not take is put back, so typing can start from the original value.
+SET_VALUE_JS = """function(text, clear) {
+    let el = this;
+    const editable = e => e && (e.isContentEditable || ['INPUT', 'TEXTAREA'].includes(e.tagName));
+    if (!editable(el)) el = el.querySelector('input:not([type=hidden]), textarea, [contenteditable=""], [contenteditable=true]');
+    if (!editable(el) || el.disabled || el.readOnly) return {ok: false, reason: 'not an editable element'};
+    const proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    const read = () => el.isContentEditable ? el.textContent : el.value;
+    const write = value => el.isContentEditable
+        ? (el.textContent = value)
+        : Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+    const before = read();
+    const expected = clear ? text : before + text;
+    el.focus();
+    write(expected);
+    el.dispatchEvent(new InputEvent('input', {bubbles: true, inputType: 'insertText', data: text}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    el.blur();
+    const actual = read();
+    if (actual === expected) return {ok: true, reason: ''};
+    write(before);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    return {ok: false, reason: `value reads back with length ${actual.length}, expected ${expected.length}`};
+}"""
+
+# a url containing one of these is the company id / login page, i.e. not logged in
+LOGIN_URL_MARKERS = ('/login', 'companyEntry', '/saml2/')
+
+# statuses of login_script when the tenant is logged in afterwards, every other status is a failure
+LOGIN_OK_PREFIXES = ('Restored', 'Login sequence executed')
+
+# Sets saved local/session storage before the page's own scripts run
+RESTORE_STORAGE_JS = """
+(() => {
+    const origins = %s;
+    const saved = origins.find(o => o.origin === location.origin);
+    if (!saved) return;
+    for (const [k, v] of Object.entries(saved.localStorage || {})) localStorage.setItem(k, v);
+    for (const [k, v] of Object.entries(saved.sessionStorage || {})) sessionStorage.setItem(k, v);
+})()
+"""
+
+# keys Storage.setCookies accepts
+COOKIE_PARAM_KEYS = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires', 'priority', 'sourceScheme', 'sourcePort', 'partitionKey')
+
+DEFAULT_TASK = """Go to https://salesdemo.successfactors.eu/
+                                                enter this company id  and go to next page
+                                                take one by one action
+                                                and type username box  = ""
+                                                password box  = "" (these are two different fields)
+                                                and click the continue button"""
+
+# how long a replayed step may wait for its element to show up before handing over to the agent
+REPLAY_ELEMENT_TIMEOUT = 15
+
+# attributes shown to the LLM for every indexed element
+INCLUDE_ATTRIBUTES = ['id', 'name', 'aria-label', 'role', 'placeholder', 'value', 'type', 'title', 'alt', 'label']
+
+
+class FormField(TypedDict):
+    """One fill_form entry, the element is given by index or by an element fingerprint (app.trajectory)"""
+    index: NotRequired[int]
+    element: NotRequired[dict]
+    text: str
+    clear_existing: NotRequired[bool]
+    sensitive: NotRequired[bool]
+    # label used instead of the value in messages / logs for sensitive fields, e.g. "password"
+    name: NotRequired[str]
+    # see input_text
+    fast: NotRequired[bool]
+
+def __getattr__(name):
+    # AgentState / TaskExecutor moved to app.agent_state, they need langchain and langgraph
+    if name in ('AgentState', 'TaskExecutor'):
+        from app import agent_state
+
+        return getattr(agent_state, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def login_succeeded(status) -> bool:
+    """Whether a login_script status means the tenant is logged in"""
+    return isinstance(status, str) and status.startswith(LOGIN_OK_PREFIXES)
+
 
+def agent_finished(messages: list) -> bool:
+    """
+    Success signal of an agent run (see SapConfigHub.run_recorded): it ended with an answer
+    rather than a tool call, and its last tool call did not fail
+    """
+    if not messages or getattr(messages[-1], 'type', None) != 'ai' or getattr(messages[-1], 'tool_calls', None):
+        return False
+    last_tool = next((message for message in reversed(messages) if getattr(message, 'type', None) == 'tool'), None)
+    return last_tool is None or not str(last_tool.content).startswith(TOOL_ERROR_PREFIXES)
 
-class AgentState(TypedDict):
-    todos: NotRequired[list[Todo]]
-    messages: Annotated[list[BaseMessage],add_messages]
-    current_state: str
 
-class TaskExecutor(TypedDict):
-    current_task: str
-    last_task: str
-    message: BaseMessage
-    current_state: str
+def prefetches_snapshot(function):
+    """
+    For hub tools that change the page: a running prefetch is cancelled before the tool acts,
+    and after it succeeded the next snapshot is taken in the background (see SapConfigHub.prefetch_snapshot)
+    """
+    @wraps(function)
+    async def wrapper(self, *args, **kwargs):
+        await self.cancel_prefetch()
+        result = await function(self, *args, **kwargs)
+        if not (isinstance(result, str) and result.startswith(TOOL_ERROR_PREFIXES)):
+            self.prefetch_snapshot()
+        return result
+
+    return wrapper
 
 
 class SapConfigHub:
-    def __init__(self,company_id,username,password):
+    def __init__(self,company_id,username,password, browser_session: Optional['BrowserSession'] = None, base_url: Optional[str] = None, llm: Optional['BaseChatModel'] = None):
         self._SAP_Company_Id = company_id
         self._sap_username = username
         self._sap_password = password
-        self._browser_session: Optional[BrowserSession] = None
+        register_secret(password)
+        self.base_url = base_url or settings.base_url
+        # chat model used by the agents, the configured Azure model (built on first use) unless one is passed
+        self._llm: Optional['BaseChatModel'] = llm
+        self.session_store = SessionStateStore(settings.session_state_dir)
+        self.trajectory_store = TrajectoryStore(settings.trajectory_dir)
+        self.recorder: Optional[TrajectoryRecorder] = None
+        # steps done by the last run_recorded that failed, to resume it (app.job_worker)
+        self.interrupted_steps: list = []
+        self._browser_session: Optional['BrowserSession'] = browser_session
         self.browser_state_summary = None
-        self.tool_node = ToolNode(self.tools_list())
+        self.dom_cache = DomSnapshotCache()
+        # last snapshot handed to the caller, baseline for diff mode
+        self._last_snapshot: Optional[PageSnapshot] = None
+        # selector map of the last JS engine snapshot (settings.snapshot_engine == "js")
+        self._js_selector_map: dict = {}
+        # (page fingerprint, locator index) of the page find() last looked at
+        self._locator: Optional[tuple[Optional[str], ElementIndex]] = None
+        # fingerprint of the page the agent last saw, part of the LLM cache key
+        self._page_state: dict = {}
+        # task the agent is working on, ranks elements in the compact index tree
+        self.task: Optional[str] = None
+        # request blocking profile, applied to every tab page_events attaches to
+        self.request_blocker = RequestBlocker(
+            profile_from_settings(settings.request_blocking, settings.request_block_deny, settings.request_block_allow)
+        )
+        self.page_events = self._new_page_events()
+        # time-to-ready per URL pattern, sets the minimum page load wait of each navigation
+        self.page_timing = get_page_timing(
+            settings.page_timing_path,
+            default=DEFAULT_MINIMUM_WAIT,
+            min_wait=settings.page_wait_min,
+            max_wait=settings.page_wait_max,
+            q=settings.page_wait_percentile,
+            window=settings.page_wait_window,
+        )
+        self._page_load_timer: Optional[asyncio.Task] = None
+        # the learned wait is set for the next snapshot only, see _settle_page_wait
+        self._page_wait_pending = False
+        # target_id -> viewport height in px, used by scroll
+        self._viewport_heights: dict[str, int] = {}
+        # background snapshot started after a page changing tool, see prefetch_snapshot
+        self._prefetch: Optional[asyncio.Task] = None
+        self._tool_node = None
+
+    @property
+    def llm(self) -> 'BaseChatModel':
+        return self._llm or get_llm()
+
+    @property
+    def tool_node(self):
+        if self._tool_node is None:
+            from langgraph.prebuilt import ToolNode
+
+            self._tool_node = ToolNode(self.tools_list())
+        return self._tool_node
 
     async def login_script(self):
         """
@@ -96,30 +243,23 @@ class SapConfigHub:
             browser_session = await self.get_browser_session()
             await browser_session.start()
 
+            # a saved, still valid session skips the whole login form
+            if await self.restore_login():
+                return "Restored saved login session — already logged in."
+
             # Use your go_to_url wrapper so you get the same error handling / logs
-            nav_msg = await self.go_to_url(url="https://salesdemo.successfactors.eu/", new_tab=False)
+            nav_msg = await self.go_to_url(url=self.base_url, new_tab=False)
             # go_to_url returns (msg, memory) on success or error string on failure
             if isinstance(nav_msg, str) and nav_msg.startswith("Navigation failed"):
                 return f"Navigation failed: {nav_msg}"
             # if it's a tuple like (msg,memory) keep going
 
-            # small wait for page to settle; consider one of your wait helpers
-            await self.wait(2)
-
-            # sanity-check: make sure required indices exist before acting
-            # Replace these indices with correct ones you discovered with current_page_index()
-            company_index = 1
-            username_index = 1   # update if different
-            password_index = 2   # update if different
-            continue_button_index = 10
-            intermediate_button_index = 4  # if you need to click something before username/password
-
-            # helper to assert element presence and return node if you want
-            node = await browser_session.get_element_by_index(company_index)
-            if node is None:
+            # elements are located by role / label / text, so a shifted page does not break the script
+            company_index = await self.find(role='textbox', label='company', timeout=15)
+            if company_index is None:
                 # give user actionable guidance
-                return ("Company ID input (index=%d) not found. "
-                        "Call current_page_index() to inspect available indices.") % company_index
+                return ("Company ID input not found. "
+                        "Call current_page_index() to inspect available indices.")
 
             # Input company id (pass clear_existing)
             result = await self.input_text(company_index, text=self._SAP_Company_Id, clear_existing=True)
@@ -127,40 +267,50 @@ class SapConfigHub:
             if isinstance(result, str) and result.startswith("Failed"):
                 return f"Input company id failed: {result}"
 
-            await self.wait(1)
-
             # Click the next element (pass while_holding_ctrl explicitly)
+            intermediate_button_index = await self.find(role='button', text='continue')
+            if intermediate_button_index is None:
+                return "Continue button of the company id page not found."
             click_res = await self.click_element_by_index(intermediate_button_index, while_holding_ctrl=False)
             if isinstance(click_res, str) and click_res.startswith("Failed"):
                 # try to continue anyway or return early
                 return f"Click failed (index {intermediate_button_index}): {click_res}"
 
-            await self.wait(1)
-
-            # Input username & password
-            username_res = await self.input_text(username_index, text=self._sap_username, clear_existing=True)
-            if isinstance(username_res, str) and username_res.startswith("Failed"):
-                return f"Input username failed: {username_res}"
-
-            await self.wait(0.5)
-
-            password_res = await self.input_text(password_index, text=self._sap_password, clear_existing=True, has_sensitive_data=True, sensitive_data={"password": self._sap_password})
-            if isinstance(password_res, str) and password_res.startswith("Failed"):
-                return f"Input password failed: {password_res}"
-
-            await self.wait(0.5)
+            # the login form replaces the company id page
+            password_index = await self.find(role='textbox', label='password', timeout=20)
+            username_index = await self.find(role='textbox', label='username')
+            if password_index is None or username_index is None:
+                return "Username / password inputs not found."
+
+            # Input username & password in one go
+            fill_res = await self.fill_form([
+                FormField(index=username_index, text=self._sap_username, clear_existing=True, name="username"),
+                FormField(index=password_index, text=self._sap_password, clear_existing=True, sensitive=True, name="password"),
+            ])
+            if isinstance(fill_res, str):
+                return f"Input username / password failed: {fill_res}"
+            failed_fields = [result['message'] for result in fill_res[1] if not result['ok']]
+            if failed_fields:
+                return f"Input username / password failed: {'; '.join(failed_fields)}"
 
             # Click continue (explicit boolean)
+            # index 0 is a valid element, only None means not found
+            continue_button_index = await self.find(role='button', text='log in')
+            if continue_button_index is None:
+                continue_button_index = await self.find(role='button', text='continue')
+            if continue_button_index is None:
+                return "Log in button not found."
             final_click = await self.click_element_by_index(continue_button_index, while_holding_ctrl=False)
             if isinstance(final_click, str) and final_click.startswith("Failed"):
                 return f"Final click failed: {final_click}"
 
-            await self.wait(2)
+            await self.wait_until_ready(timeout=30)
 
             # Optionally confirm that login succeeded by checking for a known post-login element or URL
-            browser_state = await browser_session.get_browser_state_summary(include_screenshot=False)
-            # Quick heuristic: check if URL changed or DOM includes something expected
-            current_url = getattr(browser_session, "current_url", None)
+            await browser_session.get_browser_state_summary(include_screenshot=False)
+            # keep the authenticated state so the next run can skip this form
+            if await self.save_login():
+                return "Login sequence executed — logged in, session state saved for later runs."
             # return success message
             return "Login sequence executed — check browser to confirm; browser_state_summary captured."
 
@@ -169,25 +319,409 @@ class SapConfigHub:
             return f"Something went wrong with error: {type(e).__name__}: {e}"
         
 
-    async def get_browser_session(self) -> BrowserSession:
+    def _session_state_secret(self) -> str:
+        return settings.session_state_key or self._sap_password
+
+    async def is_logged_in(self) -> bool:
+        browser_session = await self.get_browser_session()
+        url = await browser_session.get_current_page_url()
+        return url.startswith('http') and not any(marker in url for marker in LOGIN_URL_MARKERS)
+
+    async def export_session_state(self) -> dict:
+        """
+        Cookies of the browser plus local/session storage of the current origin
+        """
+        browser_session = await self.get_browser_session()
+        cookies = await browser_session.cdp_client.send.Storage.getCookies()
+        storage = await self.evaluate(
+            "({origin: location.origin, localStorage: {...localStorage}, sessionStorage: {...sessionStorage}})"
+        )
+        return {
+            "url": await browser_session.get_current_page_url(),
+            "cookies": cookies.get('cookies', []),
+            "origins": [storage] if storage else [],
+        }
+
+    async def restore_session_state(self, state: dict) -> bool:
+        """
+        Load exported state into the browser and open the saved url.
+        Returns True if that landed on an authenticated page, False if the session has expired.
+        """
+        browser_session = await self.get_browser_session()
+        await browser_session.start()
+        cookies = [{key: cookie[key] for key in COOKIE_PARAM_KEYS if key in cookie} for cookie in state.get('cookies', [])]
+        if cookies:
+            await browser_session.cdp_client.send.Storage.setCookies(params={'cookies': cookies})
+
+        # storage has to be in place before the app boots, so inject it on document creation
+        cdp_session = await browser_session.get_or_create_cdp_session()
+        script = await cdp_session.cdp_client.send.Page.addScriptToEvaluateOnNewDocument(
+            params={'source': RESTORE_STORAGE_JS % json.dumps(state.get('origins', []))},
+            session_id=cdp_session.session_id,
+        )
+        try:
+            # the navigation is the validity check: an expired session is redirected to the login page
+            nav_msg = await self.go_to_url(url=state.get('url') or self.base_url, new_tab=False)
+            if isinstance(nav_msg, str):
+                return False
+            await self.wait_until_ready(timeout=20)
+        finally:
+            await cdp_session.cdp_client.send.Page.removeScriptToEvaluateOnNewDocument(
+                params={'identifier': script['identifier']}, session_id=cdp_session.session_id
+            )
+        return await self.is_logged_in()
+
+    async def restore_login(self) -> bool:
+        """
+        Restore the saved login of this company id / username, if there is one and it is still valid
+        """
+        state = self.session_store.load(self._SAP_Company_Id, self._sap_username, self._session_state_secret())
+        if state is None:
+            return False
+        try:
+            if await self.restore_session_state(state):
+                logger.info('🔑 Restored saved login session')
+                return True
+        except Exception as e:
+            logger.warning(f'Failed to restore saved login session: {type(e).__name__}: {e}')
+        logger.info('🔑 Saved login session expired, logging in again')
+        self.session_store.delete(self._SAP_Company_Id, self._sap_username)
+        return False
+
+    async def save_login(self) -> bool:
+        """
+        Save the current authenticated state, encrypted, for later runs. Returns False if not logged in.
+        """
+        try:
+            if not await self.is_logged_in():
+                return False
+            state = await self.export_session_state()
+            self.session_store.save(self._SAP_Company_Id, self._sap_username, self._session_state_secret(), state)
+            logger.info(f'🔑 Saved login session ({len(state["cookies"])} cookies)')
+            return True
+        except Exception as e:
+            logger.warning(f'Failed to save login session: {type(e).__name__}: {e}')
+            return False
+
+    async def get_browser_session(self) -> 'BrowserSession':
+        from browser_use.browser import BrowserSession
+
         if self._browser_session is None:
-            self._browser_session = BrowserSession(browser_profile=BrowserProfile(minimum_wait_page_load_time=3))
+            self._browser_session = BrowserSession(browser_profile=build_browser_profile())
         return self._browser_session
 
+    @asynccontextmanager
+    async def leased_browser_session(self, pool: BrowserSessionPool) -> AsyncIterator['BrowserSession']:
+        """
+        Run this hub on a session leased from the pool, the session goes back to the pool on exit
+        """
+        async with pool.lease() as browser_session:
+            self._use_browser_session(browser_session)
+            try:
+                yield browser_session
+            finally:
+                self._use_browser_session(None)
+
+    def _use_browser_session(self, browser_session: Optional['BrowserSession']):
+        self._browser_session = browser_session
+        # snapshots belong to the previous session
+        self.browser_state_summary = None
+        self._last_snapshot = None
+        self._locator = None
+        self._js_selector_map = {}
+        if self._prefetch is not None:
+            self._prefetch.cancel()
+            self._prefetch = None
+        if self._page_load_timer is not None:
+            self._page_load_timer.cancel()
+            self._page_load_timer = None
+        self._page_wait_pending = False
+        self._page_state.pop('fingerprint', None)
+        self.dom_cache.invalidate()
+        self.page_events = self._new_page_events()
+        self._viewport_heights.clear()
+
+    def _new_page_events(self) -> PageEvents:
+        page_events = PageEvents()
+        page_events.on_change(self._forget_viewport)
+        page_events.on_attach(self.request_blocker.apply)
+        page_events.on_network(self.request_blocker.on_network)
+        return page_events
+
+    def _forget_viewport(self, target_id: str):
+        self._viewport_heights.pop(target_id, None)
+
+    def _adapt_page_wait(self, browser_session: 'BrowserSession', url: str) -> Optional[str]:
+        """
+        Set the minimum page load wait of the first snapshot after a navigation to url to the one learned
+        for its URL pattern, returns the pattern (None for non-http pages or when adaptive_page_wait is off)
+        """
+        if self._page_load_timer is not None:
+            self._page_load_timer.cancel()
+            self._page_load_timer = None
+        pattern = url_pattern(url, tenant=self._SAP_Company_Id)
+        if not settings.adaptive_page_wait or not pattern.startswith('/'):
+            return None
+        wait = self.page_timing.minimum_wait_for(pattern)
+        browser_session.browser_profile.minimum_wait_page_load_time = wait
+        self._page_wait_pending = True
+        logger.debug(f'⏳ Minimum page load wait for {pattern}: {wait:.2f}s')
+        return pattern
+
+    def _settle_page_wait(self, browser_session: 'BrowserSession'):
+        """After the first snapshot of a navigation, the page is loaded: later snapshots only wait page_wait_min"""
+        if self._page_wait_pending:
+            self._page_wait_pending = False
+            browser_session.browser_profile.minimum_wait_page_load_time = settings.page_wait_min
+
+    def _time_page_load(self, pattern: Optional[str], started: float):
+        """Measure the time-to-ready of the navigation committed at `started` in the background"""
+        if pattern is None:
+            return
+        self._page_load_timer = asyncio.create_task(self._measure_page_load(pattern, started), name='page_load_timer')
+
+    async def _measure_page_load(self, pattern: str, started: float):
+        try:
+            browser_session = await self.get_browser_session()
+            remaining = settings.page_wait_max - (time.monotonic() - started)
+            readiness = await wait_for_page_ready(browser_session, self.page_events, timeout=max(remaining, 0))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f'Failed to time the page load of {pattern}: {type(e).__name__}: {e}')
+            return
+        # a page that was not ready in time counts as the longest wait
+        seconds = time.monotonic() - started if readiness["ready"] else settings.page_wait_max
+        self.page_timing.record(pattern, seconds)
+        metrics.observe('sap_hub_page_ready_seconds', seconds, pattern=pattern)
+
+    async def set_request_blocking(self, profile: RequestBlockingProfile):
+        """Switch the request blocking profile, tabs already attached get the new one right away"""
+        self.request_blocker.profile = profile
+        for cdp_session in self.page_events.sessions():
+            try:
+                await self.request_blocker.apply(cdp_session)
+            except Exception as e:
+                # the tab was closed
+                logger.debug(f'Failed to apply request blocking to {cdp_session.target_id}: {type(e).__name__}: {e}')
+        logger.info(f'🚫 Request blocking profile: {profile!r}')
+
+    async def _attach_page_events(self, browser_session: 'BrowserSession'):
+        """
+        Subscribe to the focused tab (and apply the request blocking profile) before a navigation,
+        so the first load of the page is already filtered and timed from its own 'load'
+        """
+        try:
+            cdp_session = await browser_session.get_or_create_cdp_session()
+            await self.page_events.attach(cdp_session)
+            self.page_events.expect_navigation(cdp_session)
+        except Exception as e:
+            logger.debug(f'Failed to attach page events before navigating: {type(e).__name__}: {e}')
+
     async def get_llm_with_tools(self, tools):
-         llm_with_tool = llm.bind_tools(tools)
+         llm_with_tool = self.llm.bind_tools(tools)
          return llm_with_tool
     
-    async def current_page_index(self):
+    async def evaluate(self, expression: str, await_promise: bool = False):
+        """
+        Evaluate a JS expression in the focused tab and return its value
         """
-        Use this fucntion to get the interactive element index
+        browser_session = await self.get_browser_session()
+        cdp_session = await browser_session.get_or_create_cdp_session()
+        result = await cdp_session.cdp_client.send.Runtime.evaluate(
+            params={'expression': expression, 'returnByValue': True, 'awaitPromise': await_promise},
+            session_id=cdp_session.session_id,
+        )
+        if result.get('exceptionDetails'):
+            raise RuntimeError(f"JS evaluation failed: {result['exceptionDetails'].get('text')}")
+        return result.get('result', {}).get('value')
+
+    async def page_fingerprint(self) -> Optional[str]:
         """
+        Cheap page fingerprint (tab + url + DOM mutation counter), None if it can not be read
+        """
+        try:
+            browser_session = await self.get_browser_session()
+            target_id = browser_session.agent_focus.target_id if browser_session.agent_focus else None
+            return f'{target_id}|{await self.evaluate(PAGE_FINGERPRINT_JS)}'
+        except Exception as e:
+            logger.debug(f'Could not read page fingerprint: {type(e).__name__}: {e}')
+            return None
+
+    async def element_index(self) -> ElementIndex:
+        """
+        Locator index of the current page, built once per snapshot: reused while the page fingerprint is unchanged
+        """
+        await self.await_prefetch()
+        fingerprint = await self.page_fingerprint()
+        if self._locator is not None and fingerprint is not None and self._locator[0] == fingerprint:
+            return self._locator[1]
+        with trace_span('build_element_index', 'dom'):
+            await self._take_snapshot()
+            index = ElementIndex(await self.get_selector_map())
+        self._locator = (fingerprint, index)
+        return index
+
+    async def find(
+        self,
+        role: Optional[str] = None,
+        label: Optional[str] = None,
+        text: Optional[str] = None,
+        timeout: float = 0,
+    ) -> Optional[int]:
+        """
+        Index of the element matching role, label (aria-label, placeholder, name, title, accessible name)
+        and text, e.g. find(role='button', text='Log in'); None when there is no such element.
+        With timeout the page is watched until the element shows up, instead of a fixed wait.
+        """
+        index = (await self.element_index()).find(role=role, label=label, text=text)
+        if index is not None or timeout <= 0:
+            return index
+
+        await self.wait_until_ready(
+            timeout=timeout,
+            until=lambda selector_map: ElementIndex(selector_map).find(role=role, label=label, text=text) is not None,
+        )
+        return (await self.element_index()).find(role=role, label=label, text=text)
+
+    def dom_cache_stats(self) -> dict:
+        return self.dom_cache.stats()
+
+    def llm_cache_stats(self) -> Optional[dict]:
+        from app.llm_cache import LLMResponseCache
+
+        return self.llm.cache.stats() if isinstance(self.llm.cache, LLMResponseCache) else None
+
+    @timed_tool
+    async def current_page_index(self, diff: bool = False, budget: Optional[int] = None):
+        """
+        Use this fucntion to get the interactive element index.
+        Set diff=True to get only the interactive elements added, removed or changed since the previous call
+        (the full tree is returned when there is no previous snapshot of the same url).
+        budget caps the size of the tree in tokens: a compact list of the elements most relevant to the task,
+        0 for the full tree, default from settings.
+        """
+        await self.await_prefetch()
+        snapshot = await self._take_snapshot()
+        if snapshot is None:
+            return
+
+        previous = self._last_snapshot
+        self._last_snapshot = snapshot
+        self._page_state['fingerprint'] = hashlib.sha256(snapshot.index_tree.encode()).hexdigest()[:16]
+        if diff and previous is not None and previous.url == snapshot.url:
+            return format_diff(diff_elements(previous.elements, snapshot.elements), snapshot.url)
+        budget = settings.dom_token_budget if budget is None else budget
+        if budget > 0:
+            return compact_index_tree(snapshot.selector_map, INCLUDE_ATTRIBUTES, budget, task=self.task, url=snapshot.url)
+        return snapshot.index_tree
+
+    def prefetch_snapshot(self):
+        """
+        Take the next snapshot in the background once the page settles, so it overlaps with the LLM round trip;
+        the following current_page_index reuses it from the DOM cache while the page fingerprint still matches
+        """
+        if not settings.dom_prefetch or self._browser_session is None:
+            return
+        if self._prefetch is not None and not self._prefetch.done():
+            self._prefetch.cancel()
+        self._prefetch = asyncio.create_task(self._prefetch_snapshot(), name='dom_prefetch')
+
+    async def _prefetch_snapshot(self):
+        with trace_span('prefetch_snapshot', 'dom'):
+            try:
+                await self.wait_until_ready(timeout=settings.dom_prefetch_settle)
+                await self._take_snapshot()
+                metrics.inc('sap_hub_dom_prefetch_total', outcome='ok')
+            except asyncio.CancelledError:
+                metrics.inc('sap_hub_dom_prefetch_total', outcome='cancelled')
+                raise
+            except Exception as e:
+                # the caller takes its own snapshot then
+                logger.debug(f'DOM prefetch failed: {type(e).__name__}: {e}')
+                metrics.inc('sap_hub_dom_prefetch_total', outcome='error')
+
+    async def await_prefetch(self):
+        """Wait for a running prefetch instead of taking a second snapshot next to it"""
+        prefetch = self._prefetch
+        if prefetch is None or prefetch.done() or prefetch is asyncio.current_task():
+            return
+        # asyncio.wait neither raises the prefetch's cancellation nor cancels it when the caller is cancelled
+        await asyncio.wait({prefetch})
+
+    async def cancel_prefetch(self):
+        """The page is about to change, a snapshot taken now would be stale"""
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is None or prefetch.done():
+            return
+        prefetch.cancel()
+        await asyncio.wait({prefetch})
+
+    async def js_snapshot(self, keep: bool = True) -> Optional[PageSnapshot]:
+        """
+        Interactive elements of the focused tab from one injected script (app.js_snapshot).
+        keep=False only looks: the indices of the last snapshot stay the ones tools act on.
+        """
+        browser_session = await self.get_browser_session()
+        cdp_session = await browser_session.get_or_create_cdp_session()
+        with trace_span('js_snapshot', 'dom'):
+            result = await cdp_session.cdp_client.send.Runtime.evaluate(
+                params={'expression': js_snapshot_expression(INCLUDE_ATTRIBUTES, keep=keep), 'returnByValue': True},
+                session_id=cdp_session.session_id,
+            )
+        value = result.get('result', {}).get('value')
+        if result.get('exceptionDetails') or not value:
+            logger.debug(f'JS snapshot failed: {result.get("exceptionDetails")}')
+            return None
+        index_tree, elements, selector_map = build_js_snapshot(value, cdp_session.target_id, INCLUDE_ATTRIBUTES)
+        if keep:
+            self._js_selector_map = selector_map
+        return PageSnapshot(url=value['url'], index_tree=index_tree, elements=elements, selector_map=selector_map, engine='js')
+
+    async def get_selector_map(self) -> dict:
+        """Selector map the indices of current_page_index refer to, for the configured snapshot engine"""
+        if settings.snapshot_engine == 'js':
+            return self._js_selector_map
+        browser_session = await self.get_browser_session()
+        return await browser_session.get_selector_map()
+
+    async def get_element(self, index: int):
+        """Node of index, nodes of the JS engine get their backend node id here (None if the element is gone)"""
+        node = (await self.get_selector_map()).get(index)
+        if node is not None and node.backend_node_id == UNRESOLVED:
+            browser_session = await self.get_browser_session()
+            node = await resolve_js_node(browser_session, node)
+        return node
+
+    async def _take_snapshot(self) -> Optional[PageSnapshot]:
+        from browser_use.dom.serializer.serializer import DOMTreeSerializer
+
         session = await self.get_browser_session()
-        browser_state_summary = await session.get_browser_state_summary(include_screenshot = False)
+
+        # Unchanged page -> return the cached snapshot without a new one
+        with trace_span('page_fingerprint', 'dom'):
+            fingerprint = await self.page_fingerprint()
+        cached_snapshot = self.dom_cache.lookup(fingerprint)
+        if cached_snapshot is not None and (self.browser_state_summary is not None or cached_snapshot.engine == 'js'):
+            logger.debug('♻️ Page unchanged, reusing cached index tree')
+            return cached_snapshot
+
+        if settings.snapshot_engine == 'js':
+            snapshot = await self.js_snapshot()
+            if snapshot is None:
+                self.dom_cache.invalidate()
+                return None
+            self.dom_cache.store(fingerprint, snapshot)
+            return snapshot
+
+        with trace_span('get_browser_state_summary', 'dom'):
+            browser_state_summary = await session.get_browser_state_summary(include_screenshot = False)
+        self._settle_page_wait(session)
         self.browser_state_summary = browser_state_summary
         if not browser_state_summary or not browser_state_summary.dom_state or not browser_state_summary.dom_state._root:
             print("Error: Could not get DOM snapshot or root node is None.")
-            return
+            self.dom_cache.invalidate()
+            return None
 
         # The DOMTreeSerializer expects an EnhancedDOMTreeNode as its root_node
         # We can get this from the SimplifiedNode's original_node attribute
@@ -198,29 +732,43 @@ class SapConfigHub:
         serializer = DOMTreeSerializer(root_node=enhanced_dom_tree_root)
 
         # Serialize accessible elements
-        serialized_dom_state, timing_info = serializer.serialize_accessible_elements()
-
-        # Get the final textual output for LLM
-        final_index_tree = DOMTreeSerializer.serialize_tree(
-            node=serialized_dom_state._root,
-            include_attributes=['id', 'name', 'aria-label', 'role', 'placeholder', 'value', 'type', 'title', 'alt', 'label']
+        with trace_span('serialize_accessible_elements', 'dom'):
+            serialized_dom_state, timing_info = serializer.serialize_accessible_elements()
+
+        # Get the final textual output for LLM, re-serializing only the subtrees that changed
+        with trace_span('serialize_tree', 'dom'):
+            final_index_tree = self.dom_cache.serialize_tree(serialized_dom_state._root, INCLUDE_ATTRIBUTES)
+        snapshot = PageSnapshot(
+            url=browser_state_summary.url,
+            index_tree=final_index_tree,
+            elements=interactive_elements(serialized_dom_state.selector_map, INCLUDE_ATTRIBUTES),
+            selector_map=dict(serialized_dom_state.selector_map),
         )
-        return final_index_tree
+        self.dom_cache.store(fingerprint, snapshot)
+        return snapshot
 
         # **Tools**
 
     # @tool
+    @timed_tool
+    @prefetches_snapshot
     async def go_to_url(self, url:str, new_tab: bool):
                 """
                 'Navigate to URL, set new_tab=True to open in new tab, False to navigate in current tab'
                 """
+                from browser_use.browser.events import NavigateToUrlEvent
+
                 try:
                     # Dispatch navigation event
                     browser_session = await self.get_browser_session()
                     await browser_session.start()
-                    event = browser_session.event_bus.dispatch(NavigateToUrlEvent(url=url, new_tab=new_tab))
-                    await event
-                    await event.event_result(raise_if_any=True, raise_if_none=False)
+                    if not new_tab:
+                        await self._attach_page_events(browser_session)
+                    pattern = self._adapt_page_wait(browser_session, url)
+                    await self.dispatch_event(browser_session, NavigateToUrlEvent(url=url, new_tab=new_tab))
+                    # timed from here: the dispatch returns once the navigation committed, what is left until
+                    # the page is ready is the wait the first snapshot needs
+                    self._time_page_load(pattern, time.monotonic())
 
                     if new_tab:
                         memory = f'Opened new tab with URL {url}'
@@ -230,6 +778,7 @@ class SapConfigHub:
                         msg = f'🔗 {memory}'
 
                     logger.info(msg)
+                    self._record('go_to_url', {'url': url, 'new_tab': new_tab})
                     return msg, memory
                 except Exception as e:
                     error_msg = str(e)
@@ -258,20 +807,88 @@ class SapConfigHub:
                         # Return error in ActionResult instead of re-raising
                         return f'Navigation failed: {str(e)}'
     
+    @timed_tool
     async def wait(self,seconds: int = 2):
             """
-            'Wait for x seconds (default 2) (max 30 seconds). This can be used to wait until the page is fully loaded.'
+            'Wait until the page is fully loaded, for at most x seconds (default 2) (max 30 seconds). Returns as soon as the page is ready.'
             """
             actual_seconds = min(max(seconds, 0), 30)
-            memory = f'Waited for {seconds} seconds'
-            logger.info(f'🕒 waited for {actual_seconds}')
-            await asyncio.sleep(actual_seconds)
+            readiness = await self.wait_until_ready(timeout=actual_seconds)
+            if readiness["ready"]:
+                memory = f'Waited {readiness["elapsed"]:.1f} seconds until the page was ready'
+            else:
+                memory = f'Waited for {seconds} seconds, the page is still loading ({readiness["pending"]})'
+            logger.info(f'🕒 {memory}')
             return memory
-    
+
+    async def wait_until_ready(
+        self,
+        timeout: float = 15,
+        network_idle: float = 0.5,
+        ui5: bool = True,
+        until_index: Optional[int] = None,
+        until: Optional[Callable[[dict], bool]] = None,
+    ) -> dict:
+        """
+        Wait on page lifecycle, network idle, UI5 busy indicators and optionally an element appearing;
+        returns as soon as all of them are there or the timeout is hit.
+        - until(selector_map) is checked against a JS engine probe (one script, nothing of the last
+          snapshot is replaced), so it should look at the elements, not at their index numbers
+        - until_index is checked against a snapshot of the configured engine, the one its index is from;
+          that snapshot goes through the DOM cache like current_page_index
+        """
+        probe = self._probe_selector_map
+        if until is None and until_index is not None:
+            until = lambda selector_map: until_index in selector_map
+            probe = self._snapshot_selector_map
+        browser_session = await self.get_browser_session()
+        try:
+            with trace_span('wait_until_ready', 'wait', timeout=timeout) as span:
+                readiness = await wait_for_page_ready(
+                    browser_session, self.page_events, timeout=timeout, network_idle=network_idle, ui5=ui5,
+                    until=until, probe=probe,
+                )
+                if span is not None:
+                    span.args.update(ready=readiness["ready"], pending=readiness["pending"])
+        except Exception as e:
+            # no usable CDP session yet, fall back to a plain sleep
+            logger.debug(f'Readiness wait failed, sleeping instead: {type(e).__name__}: {e}')
+            metrics.inc('sap_hub_errors_total', operation='wait_until_ready')
+            with trace_span('sleep', 'wait', seconds=timeout):
+                await asyncio.sleep(timeout)
+            return {"ready": False, "elapsed": timeout, "signals": [], "pending": f'{type(e).__name__}: {e}'}
+        metrics.observe('sap_hub_wait_seconds', readiness["elapsed"], pending=readiness["pending"] or 'none')
+        if not readiness["ready"]:
+            metrics.inc('sap_hub_timeouts_total', operation='wait_until_ready', pending=readiness["pending"])
+        return readiness
+
+    async def _probe_selector_map(self) -> Optional[dict]:
+        snapshot = await self.js_snapshot(keep=False)
+        return snapshot.selector_map if snapshot is not None else None
+
+    async def _snapshot_selector_map(self) -> Optional[dict]:
+        snapshot = await self._take_snapshot()
+        return snapshot.selector_map if snapshot is not None else None
+
+    async def dispatch_event(self, browser_session: 'BrowserSession', event, raise_if_none: bool = False):
+        """
+        event_bus.dispatch + event_result round trip, timed per event type into sap_hub_event_bus_seconds
+        """
+        with metrics.timer('sap_hub_event_bus_seconds', event=type(event).__name__):
+            event = browser_session.event_bus.dispatch(event)
+            await event
+            return await event.event_result(raise_if_any=True, raise_if_none=raise_if_none)
+
+    @timed_tool
+    @prefetches_snapshot
     async def click_element_by_index(self,index: int , while_holding_ctrl: bool):
                 """
                 'Click element by index. Only indices from your browser_state are allowed. Never use an index that is not inside your current browser_state. Set while_holding_ctrl=True to open any resulting navigation in a new tab.'
                 """
+                from browser_use.browser.events import ClickElementEvent
+                from browser_use.browser.views import BrowserError
+                from browser_use.tools.views import GetDropdownOptionsAction
+
                 # Dispatch click event with node
                 try:
                     assert index != 0, (
@@ -279,16 +896,15 @@ class SapConfigHub:
                     )
                     browser_session = await self.get_browser_session()
                     # Look up the node from the selector map
-                    node = await browser_session.get_element_by_index(index)
+                    node = await self.get_element(index)
                     if node is None:
                         raise ValueError(f'Element index {index} not found in browser state')
 
-                    event = browser_session.event_bus.dispatch(
+                    # Wait for handler to complete and get any exception or metadata
+                    click_metadata = await self.dispatch_event(
+                        browser_session,
                         ClickElementEvent(node=node, while_holding_ctrl=while_holding_ctrl or False)
                     )
-                    await event
-                    # Wait for handler to complete and get any exception or metadata
-                    click_metadata = await event.event_result(raise_if_any=True, raise_if_none=False)
                     memory = 'Clicked element'
 
                     if while_holding_ctrl:
@@ -300,6 +916,7 @@ class SapConfigHub:
 
                     msg = f'🖱️ {memory}'
                     logger.info(msg)
+                    self._record('click_element_by_index', {'index': index, 'while_holding_ctrl': while_holding_ctrl}, node)
 
                     # Include click coordinates in metadata if available
                     return memory,click_metadata if isinstance(click_metadata, dict) else None
@@ -321,20 +938,22 @@ class SapConfigHub:
                     error_msg = f'Failed to click element {index}: {str(e)}'
                     return error_msg
     
+    @timed_tool
     async def get_dropdown_options(self,index: int):
                 """
                 Get all options from a native dropdown or ARIA menu
                 """
+                from browser_use.browser.events import GetDropdownOptionsEvent
+
                 # Look up the node from the selector map
                 browser_session = await self.get_browser_session()
-                node = await browser_session.get_element_by_index(index)
+                node = await self.get_element(index)
                 if node is None:
                     raise ValueError(f'Element index {index} not found in browser state')
 
                 # Dispatch GetDropdownOptionsEvent to the event handler
 
-                event = browser_session.event_bus.dispatch(GetDropdownOptionsEvent(node=node))
-                dropdown_data = await event.event_result( raise_if_none=True, raise_if_any=True)
+                dropdown_data = await self.dispatch_event(browser_session, GetDropdownOptionsEvent(node=node), raise_if_none=True)
 
                 if not dropdown_data:
                     raise ValueError('Failed to get dropdown options - no data returned')
@@ -342,19 +961,28 @@ class SapConfigHub:
                 # Use structured memory from the handler
                 return dropdown_data
     
+    @timed_tool
+    @prefetches_snapshot
     async def input_text(self,
         index : int,
         text : str,
         clear_existing: bool,
         has_sensitive_data: bool = False,
         sensitive_data: dict[str, str | dict[str, str]] | None = None,
-        browser_session: BrowserSession = None
+        browser_session: 'BrowserSession' = None,
+        fast: Optional[bool] = None,
     ):
-        'Input text into an input interactive element. Only input text into indices that are inside your current browser_state. Never input text into indices that are not inside your current browser_state.'
+        """
+        Input text into an input interactive element. Only input text into indices that are inside your current browser_state. Never input text into indices that are not inside your current browser_state.
+        fast=True sets the whole value at once instead of typing it, by default long non-sensitive values are set fast.
+        """
+        from browser_use.browser.views import BrowserError
+        from browser_use.tools.service import _detect_sensitive_key_name
+
         # Look up the node from the selector map
         browser_session = await self.get_browser_session()
         # params = InputTextAction(index=index, text=text, clear_existing=clear_existing)
-        node = await browser_session.get_element_by_index(index)
+        node = await self.get_element(index)
         if node is None:
             raise ValueError(f'Element index {index} not found in browser state')
 
@@ -365,17 +993,9 @@ class SapConfigHub:
             if has_sensitive_data and sensitive_data:
                 sensitive_key_name = _detect_sensitive_key_name(text, sensitive_data)
 
-            event = browser_session.event_bus.dispatch(
-                TypeTextEvent(
-                    node=node,
-                    text=text,
-                    clear_existing=clear_existing,
-                    is_sensitive=has_sensitive_data,
-                    sensitive_key_name=sensitive_key_name,
-                )
+            input_metadata = await self._type_text(
+                browser_session, node, text, clear_existing, has_sensitive_data, sensitive_key_name, fast
             )
-            await event
-            input_metadata = await event.event_result(raise_if_any=True, raise_if_none=False)
 
             # Create message with sensitive data handling
             if has_sensitive_data:
@@ -390,6 +1010,7 @@ class SapConfigHub:
                 log_msg = msg
 
             logger.debug(log_msg)
+            self._record('input_text', {'index': index, 'text': text, 'clear_existing': clear_existing, 'has_sensitive_data': has_sensitive_data}, node)
 
             # Include input coordinates in metadata if available
             return msg, input_metadata if isinstance(input_metadata, dict) else None
@@ -400,23 +1021,130 @@ class SapConfigHub:
             logger.error(f'Failed to dispatch TypeTextEvent: {type(e).__name__}: {e}')
             error_msg = f'Failed to input text into element {index}: {e}'
             return error_msg
-        
-    async def scroll(self, down: bool, num_pages: float,frame_element_index: int | None = None):
+
+    async def _type_text(self, browser_session: 'BrowserSession', node, text: str, clear_existing: bool,
+                         sensitive: bool, sensitive_key_name: Optional[str], fast: Optional[bool]):
+        """
+        Sets the value in one CDP call when fast (None = long non-sensitive text), types it
+        character by character with a TypeTextEvent otherwise or when the value did not take
+        """
+        from browser_use.browser.events import TypeTextEvent
+
+        if fast is None:
+            fast = not sensitive and 0 < settings.fast_input_min_length <= len(text)
+        if fast:
+            with trace_span('set_value', 'dom', length=len(text)):
+                try:
+                    reason = await self._set_value(browser_session, node, text, clear_existing)
+                except Exception as e:
+                    reason = f'{type(e).__name__}: {e}'
+            if not reason:
+                metrics.inc('sap_hub_fast_input_total', outcome='ok')
+                return None
+            metrics.inc('sap_hub_fast_input_total', outcome='fallback')
+            logger.debug(f'⌨️ Fast input into element {node.backend_node_id} did not take ({reason}), typing instead')
+
+        return await self.dispatch_event(
+            browser_session,
+            TypeTextEvent(
+                node=node,
+                text=text,
+                clear_existing=clear_existing,
+                is_sensitive=sensitive,
+                sensitive_key_name=sensitive_key_name,
+            )
+        )
+
+    async def _set_value(self, browser_session: 'BrowserSession', node, text: str, clear_existing: bool) -> str:
+        """Runs SET_VALUE_JS on the node, returns '' when the value reads back as expected, the reason otherwise"""
+        cdp_session = await browser_session.cdp_client_for_node(node)
+        resolved = await cdp_session.cdp_client.send.DOM.resolveNode(
+            params={'backendNodeId': node.backend_node_id}, session_id=cdp_session.session_id
+        )
+        result = await cdp_session.cdp_client.send.Runtime.callFunctionOn(
+            params={
+                'functionDeclaration': SET_VALUE_JS,
+                'objectId': resolved['object']['objectId'],
+                'arguments': [{'value': text}, {'value': clear_existing}],
+                'returnByValue': True,
+            },
+            session_id=cdp_session.session_id,
+        )
+        if result.get('exceptionDetails'):
+            return result['exceptionDetails'].get('text') or 'script error'
+        value = result.get('result', {}).get('value') or {}
+        if value.get('ok'):
+            return ''
+        return value.get('reason') or 'value did not take'
+
+    @timed_tool
+    @prefetches_snapshot
+    async def fill_form(self, fields: list[FormField]):
+        """
+        Fill many inputs in one call: fields is a list of {"index", "text", "clear_existing", "sensitive", "name"}.
+        All indices must come from the same current_page_index. Returns one result line per field,
+        a failing field does not stop the others.
+        """
+        browser_session = await self.get_browser_session()
+        # one selector map for every field, the page is not re-read between inputs
+        selector_map = await self.get_selector_map()
+        results = []
+        for number, field in enumerate(fields):
+            index = field.get('index')
+            if index is None and field.get('element'):
+                index = find_element(field['element'], selector_map)
+            node = await self.get_element(index) if index in selector_map else None
+            label = field.get('name') or (f'element {index}' if index is not None else f'field {number + 1}')
+            if node is None:
+                results.append({"index": index, "ok": False, "message": f'{label}: element not found on the page'})
+                continue
+
+            sensitive = field.get('sensitive', False)
+            clear_existing = field.get('clear_existing', True)
+            try:
+                await self._type_text(
+                    browser_session, node, field['text'], clear_existing, sensitive,
+                    field.get('name') if sensitive else None, field.get('fast'),
+                )
+            except Exception as e:
+                logger.error(f'Failed to fill {label}: {type(e).__name__}: {e}')
+                results.append({"index": index, "ok": False, "message": f'{label}: {type(e).__name__}: {e}'})
+                continue
+
+            shown = f'<{field.get("name") or "sensitive"}>' if sensitive else f"'{field['text']}'"
+            results.append({"index": index, "ok": True, "message": f'Input {shown} into element {index}.'})
+            # recorded as single inputs, so replays reuse the input_text step matching
+            self._record('input_text', {'index': index, 'text': field['text'], 'clear_existing': clear_existing, 'has_sensitive_data': sensitive}, node)
+
+        failed = sum(1 for result in results if not result['ok'])
+        memory = f'Filled {len(results) - failed}/{len(results)} form fields'
+        if failed:
+            memory = f'Failed to fill {failed} of {len(results)} form fields'
+        logger.info(f'📝 {memory}')
+        msg = '\n'.join([memory + ':'] + [result['message'] for result in results])
+        return msg, results
+
+    @timed_tool
+    @prefetches_snapshot
+    async def scroll(self, down: bool, num_pages: float,frame_element_index: int | None = None, fast: bool = False, to_end: bool = False):
                 """Scroll the page by specified number of pages (set down=True to scroll down, down=False to scroll up, num_pages=number of pages to scroll like 0.5 for half page, 10.0 for ten pages, etc.). 
 			Default behavior is to scroll the entire page. This is enough for most cases.
 			Optional if there are multiple scroll containers, use frame_element_index parameter with an element inside the container you want to scroll in. For that you must use indices that exist in your browser_state (works well for dropdowns and custom UI components). 
 			Instead of scrolling step after step, use a high number of pages at once like 10 to get to the bottom of the page.
+			Set fast=True to scroll the whole distance in a single step, set to_end=True to jump straight to the bottom (or top when down=False) of the page or container, num_pages is ignored then.
 			If you know where you want to scroll to, use scroll_to_text instead of this tool.
 			
-			Note: For multiple pages (>=1.0), scrolls are performed one page at a time to ensure reliability. Page height is detected from viewport, fallback is 1000px per page.
+			Note: For multiple pages (>=1.0), scrolls are performed one page at a time to ensure reliability unless fast=True. Page height is detected from viewport, fallback is 1000px per page.
 			"""
+                from browser_use.browser.events import ScrollEvent
+
                 browser_session = await self.get_browser_session()
                 try:
                     # Look up the node from the selector map if index is provided
                     # Special case: index 0 means scroll the whole page (root/body element)
                     node = None
                     if frame_element_index is not None and frame_element_index != 0:
-                        node = await browser_session.get_element_by_index(frame_element_index)
+                        node = await self.get_element(frame_element_index)
                         if node is None:
                             # Element does not exist
                             msg = f'Element index {frame_element_index} not found in browser state'
@@ -429,27 +1157,40 @@ class SapConfigHub:
                         else f'element {frame_element_index}'
                     )
 
-                    # Get actual viewport height for more accurate scrolling
-                    try:
-                        cdp_session = await browser_session.get_or_create_cdp_session()
-                        metrics = await cdp_session.cdp_client.send.Page.getLayoutMetrics(session_id=cdp_session.session_id)
-
-                        # Use cssVisualViewport for the most accurate representation
-                        css_viewport = metrics.get('cssVisualViewport', {})
-                        css_layout_viewport = metrics.get('cssLayoutViewport', {})
-
-                        # Get viewport height, prioritizing cssVisualViewport
-                        viewport_height = int(css_viewport.get('clientHeight') or css_layout_viewport.get('clientHeight', 1000))
-
-                        logger.debug(f'Detected viewport height: {viewport_height}px')
-                    except Exception as e:
-                        viewport_height = 1000  # Fallback to 1000px
-                        logger.debug(f'Failed to get viewport height, using fallback 1000px: {e}')
+                    if to_end:
+                        try:
+                            pixels = await self._scroll_to_end(browser_session, node, down)
+                            long_term_memory = f'Scrolled {direction} {target} to the {"end" if down else "top"} ({pixels}px)'
+                            msg = f'🔍 {long_term_memory}'
+                            logger.info(msg)
+                            self._record('scroll', {'down': down, 'num_pages': num_pages, 'frame_element_index': frame_element_index, 'fast': fast, 'to_end': to_end}, node)
+                            return msg,long_term_memory
+                        except Exception as e:
+                            # fall back to a long scroll by pages
+                            logger.warning(f'Scroll to end failed, scrolling by pages instead: {e}')
+                            num_pages, fast = max(num_pages, 10.0), True
+
+                    # Viewport height is cached per tab until it navigates or is resized
+                    viewport_height = await self._viewport_height(browser_session)
+
+                    # Whole distance in a single dispatch
+                    if fast and num_pages >= 1.0:
+                        try:
+                            pixels = int(num_pages * viewport_height)
+                            await self.dispatch_event(
+                                browser_session,
+                                ScrollEvent(direction=direction, amount=pixels, node=node)
+                            )
+                            long_term_memory = f'Scrolled {direction} {target} by {num_pages} pages ({viewport_height}px per page)'
+                            msg = f'🔍 {long_term_memory}'
+                            logger.info(msg)
+                            self._record('scroll', {'down': down, 'num_pages': num_pages, 'frame_element_index': frame_element_index, 'fast': fast, 'to_end': to_end}, node)
+                            return msg,long_term_memory
+                        except Exception as e:
+                            logger.warning(f'Single-step scroll failed, scrolling one page at a time: {e}')
 
                     # For multiple pages (>=1.0), scroll one page at a time to ensure each scroll completes
                     if num_pages >= 1.0:
-                        import asyncio
-
                         num_full_pages = int(num_pages)
                         remaining_fraction = num_pages - num_full_pages
 
@@ -462,15 +1203,15 @@ class SapConfigHub:
                                 if not down:
                                     pixels = -pixels
 
-                                event = browser_session.event_bus.dispatch(
+                                await self.dispatch_event(
+                                    browser_session,
                                     ScrollEvent(direction=direction, amount=abs(pixels), node=node)
                                 )
-                                await event
-                                await event.event_result(raise_if_any=True, raise_if_none=False)
                                 completed_scrolls += 1
 
                                 # Small delay to ensure scroll completes before next one
-                                await asyncio.sleep(0.3)
+                                with trace_span('sleep', 'wait', seconds=0.3):
+                                    await asyncio.sleep(0.3)
 
                             except Exception as e:
                                 logger.warning(f'Scroll {i + 1}/{num_full_pages} failed: {e}')
@@ -483,11 +1224,10 @@ class SapConfigHub:
                                 if not down:
                                     pixels = -pixels
 
-                                event = browser_session.event_bus.dispatch(
+                                await self.dispatch_event(
+                                    browser_session,
                                     ScrollEvent(direction=direction, amount=abs(pixels), node=node)
                                 )
-                                await event
-                                await event.event_result(raise_if_any=True, raise_if_none=False)
                                 completed_scrolls += remaining_fraction
 
                             except Exception as e:
@@ -500,37 +1240,207 @@ class SapConfigHub:
                     else:
                         # For fractional pages <1.0, do single scroll
                         pixels = int(num_pages * viewport_height)
-                        event = browser_session.event_bus.dispatch(
+                        await self.dispatch_event(
+                            browser_session,
                             ScrollEvent(direction='down' if down else 'up', amount=pixels, node=node)
                         )
-                        await event
-                        await event.event_result(raise_if_any=True, raise_if_none=False)
                         long_term_memory = f'Scrolled {direction} {target} by {num_pages} pages ({viewport_height}px per page)'
 
                     msg = f'🔍 {long_term_memory}'
                     logger.info(msg)
+                    self._record('scroll', {'down': down, 'num_pages': num_pages, 'frame_element_index': frame_element_index, 'fast': fast, 'to_end': to_end}, node)
                     return msg,long_term_memory
                 except Exception as e:
                     logger.error(f'Failed to dispatch ScrollEvent: {type(e).__name__}: {e}')
                     error_msg = 'Failed to execute scroll action.'
                     return error_msg
 
+    async def _viewport_height(self, browser_session: 'BrowserSession') -> int:
+        """
+        Viewport height of the focused tab, cached until the tab navigates or is resized
+        """
+        try:
+            cdp_session = await browser_session.get_or_create_cdp_session()
+            viewport_height = self._viewport_heights.get(cdp_session.target_id)
+            if viewport_height is not None:
+                return viewport_height
+
+            # subscribe before measuring so a resize right after is not missed
+            await self.page_events.attach(cdp_session)
+            metrics = await cdp_session.cdp_client.send.Page.getLayoutMetrics(session_id=cdp_session.session_id)
+
+            # Use cssVisualViewport for the most accurate representation
+            css_viewport = metrics.get('cssVisualViewport', {})
+            css_layout_viewport = metrics.get('cssLayoutViewport', {})
+
+            # Get viewport height, prioritizing cssVisualViewport
+            viewport_height = int(css_viewport.get('clientHeight') or css_layout_viewport.get('clientHeight', 1000))
+            self._viewport_heights[cdp_session.target_id] = viewport_height
+
+            logger.debug(f'Detected viewport height: {viewport_height}px')
+            return viewport_height
+        except Exception as e:
+            logger.debug(f'Failed to get viewport height, using fallback 1000px: {e}')
+            return 1000  # Fallback to 1000px
+
+    async def _scroll_to_end(self, browser_session: 'BrowserSession', node, down: bool) -> int:
+        """
+        Jump to the bottom / top of the page, or of the closest scrollable container of node, in one call.
+        Returns the scrolled distance in pixels.
+        """
+        if node is None:
+            cdp_session = await browser_session.get_or_create_cdp_session()
+            result = await cdp_session.cdp_client.send.Runtime.evaluate(
+                params={'expression': f'({SCROLL_TO_END_JS}).call(document.scrollingElement, {str(down).lower()})', 'returnByValue': True},
+                session_id=cdp_session.session_id,
+            )
+        else:
+            cdp_session = await browser_session.cdp_client_for_node(node)
+            resolved = await cdp_session.cdp_client.send.DOM.resolveNode(
+                params={'backendNodeId': node.backend_node_id}, session_id=cdp_session.session_id
+            )
+            result = await cdp_session.cdp_client.send.Runtime.callFunctionOn(
+                params={
+                    'functionDeclaration': SCROLL_TO_END_JS,
+                    'objectId': resolved['object']['objectId'],
+                    'arguments': [{'value': down}],
+                    'returnByValue': True,
+                },
+                session_id=cdp_session.session_id,
+            )
+        if result.get('exceptionDetails'):
+            raise RuntimeError(result['exceptionDetails'].get('text'))
+        return int(result.get('result', {}).get('value') or 0)
+
+    @timed_tool
+    @prefetches_snapshot
     async def send_keys(self, keys: str):
                 'Send strings of special keys to use e.g. Escape, Backspace, Insert, PageDown, Delete, Enter, or Shortcuts such as `Control+o`, `Control+Shift+T`'
+                from browser_use.browser.events import SendKeysEvent
+
                 browser_session = await self.get_browser_session()
                 try:
-                    event = browser_session.event_bus.dispatch(SendKeysEvent(keys=keys))
-                    await event
-                    await event.event_result(raise_if_any=True, raise_if_none=False)
+                    await self.dispatch_event(browser_session, SendKeysEvent(keys=keys))
                     memory = f'Sent keys: {keys}'
                     msg = f'⌨️  {memory}'
                     logger.info(msg)
+                    self._record('send_keys', {'keys': keys})
                     return memory
                 except Exception as e:
                     logger.error(f'Failed to dispatch SendKeysEvent: {type(e).__name__}: {e}')
                     error_msg = f'Failed to send keys: {str(e)}'
                     return error_msg
     
+    # record & replay
+
+    def _secrets(self) -> dict[str, str]:
+        return {"company_id": self._SAP_Company_Id, "username": self._sap_username, "password": self._sap_password}
+
+    def _record(self, tool: str, args: dict, node=None):
+        if self.recorder is None:
+            return
+        url = self.browser_state_summary.url if self.browser_state_summary else None
+        self.recorder.record(tool, args, node=node, url=url)
+
+    def start_recording(self, steps: Optional[list] = None):
+        """
+        Record every successful tool call (with element fingerprints) until stop_recording
+        """
+        self.recorder = TrajectoryRecorder(self._secrets(), steps)
+
+    def stop_recording(self, name: Optional[str] = None) -> list:
+        """
+        Stop recording, the trajectory is saved under name if given
+        """
+        steps = self.recorder.steps if self.recorder else []
+        self.recorder = None
+        if name:
+            self.trajectory_store.save(name, steps)
+            logger.info(f'⏺️ Saved trajectory {name} ({len(steps)} steps)')
+        return steps
+
+    async def replay(self, name: str, steps: Optional[list] = None) -> dict:
+        """
+        Replay a recorded trajectory (or the given steps) without the LLM.
+        Stops at the first step whose element fingerprint no longer matches (or whose tool call fails),
+        the result tells how many steps were done so the agent can take over from there.
+        """
+        if steps is None:
+            steps = self.trajectory_store.load(name)
+        if not steps:
+            return {"completed": False, "done_steps": [], "total": 0}
+
+        browser_session = await self.get_browser_session()
+        await browser_session.start()
+        for position, step in enumerate(steps):
+            if not await self._replay_step(step):
+                logger.info(f'⏪ Replay of {name} diverged at step {position + 1}/{len(steps)} ({step["tool"]}), handing over to the agent')
+                return {"completed": False, "done_steps": steps[:position], "total": len(steps)}
+        logger.info(f'⏩ Replayed {name} ({len(steps)} steps) without the LLM')
+        return {"completed": True, "done_steps": steps, "total": len(steps)}
+
+    async def _replay_step(self, step: dict) -> bool:
+        args = TrajectoryRecorder.unmask(step['args'], self._secrets())
+        fingerprint = step.get('element')
+        if fingerprint is not None:
+            await self.wait_until_ready(
+                timeout=REPLAY_ELEMENT_TIMEOUT,
+                until=lambda selector_map: find_element(fingerprint, selector_map) is not None,
+            )
+            # the wait looked at a probe, the index has to come from a snapshot the tool acts on
+            await self.await_prefetch()
+            snapshot = await self._take_snapshot()
+            index = find_element(fingerprint, snapshot.selector_map) if snapshot is not None else None
+            if index is None:
+                return False
+            args[INDEX_ARGUMENTS[step['tool']]] = index
+        try:
+            result = await getattr(self, step['tool'])(**args)
+        except Exception as e:
+            logger.debug(f'Replayed {step["tool"]} raised {type(e).__name__}: {e}')
+            return False
+        # tools return a tuple on success and an error string / exception otherwise (send_keys returns its memory)
+        return isinstance(result, tuple) or (isinstance(result, str) and result.startswith('Sent keys'))
+
+    async def run_recorded(self, task: str, run_agent: Callable[[str], Awaitable], resume_steps: Optional[list] = None,
+                           succeeded: Optional[Callable[[Any], Any]] = None) -> dict:
+        """
+        Replay the trajectory recorded for task; from the first step that does not match anymore
+        run_agent(prompt) takes over and what it does is recorded for the next run.
+        The recording is only saved when the run succeeded: succeeded(result of run_agent) is true
+        (it may be async), or without a predicate, run_agent returned True.
+        resume_steps (the steps of an interrupted run of task) are replayed instead of the saved trajectory.
+        """
+        bind_page_fingerprint(self._page_state)
+        self.task = task
+        name = trajectory_name(task)
+        replay = await self.replay(name, resume_steps or None)
+        if replay["completed"]:
+            return replay
+
+        done_steps = replay["done_steps"]
+        prompt = task
+        if done_steps:
+            done = ', '.join(step['tool'] for step in done_steps)
+            prompt = f'{task}\n\nThe first {len(done_steps)} actions were already done for you ({done}). Continue from the current page.'
+
+        self.start_recording(done_steps)
+        try:
+            result = await run_agent(prompt)
+            success = succeeded(result) if succeeded is not None else result is True
+            if inspect.isawaitable(success):
+                success = await success
+        except BaseException:
+            # only successful runs are worth replaying
+            self.interrupted_steps = self.stop_recording()
+            raise
+        if not success:
+            steps = self.stop_recording()
+            logger.info(f'⏺️ Run of {name} did not succeed, trajectory not saved ({len(steps)} steps)')
+            return {"completed": False, "done_steps": steps, "total": len(steps), "replayed": len(done_steps)}
+        steps = self.stop_recording(name)
+        return {"completed": True, "done_steps": steps, "total": len(steps), "replayed": len(done_steps)}
+
     # deep agent
 
     async def deep_agent(self):
@@ -548,64 +1458,123 @@ class SapConfigHub:
             but one tool is your guide through this browser automation which is current_page_index which will give you the current interactive elements from the browser page
             so before tacking any action make sure you have current screen exposure to you that yes right now this is the screen and based on this i have to decide what to do
             for completing the task
+            after a click or input call current_page_index with diff=True to see only what changed on the page
+            to fill several fields of a form use fill_form once with all of them instead of one input_text per field
 
             """,
-            model=llm
+            model=self.llm
         )
          return agent
-    async def run_deep_agent(self):
+    async def run_deep_agent(self, task: Optional[str] = None, callbacks: Optional[list] = None, trace_path: Optional[str] = None,
+                             resume_steps: Optional[list] = None, succeeded: Optional[Callable[[list], Any]] = None):
+         """
+         trace_path (default: a new file in settings.trace_dir, if set) receives a Chrome trace of the run,
+         resume_steps continues an interrupted run (see run_recorded),
+         succeeded(final messages) decides whether the run is saved for replay (default: agent_finished)
+         """
+         from app.llm_callbacks import TraceCallback
+
          agent = await self.deep_agent()
          browser_session = await self.get_browser_session()
          await browser_session.start()
-         async for stream_mode, chunk in agent.astream(
-        {"messages": [{"role": "user", "content": """Go to https://salesdemo.successfactors.eu/
-                                                enter this company id  and go to next page
-                                                take one by one action
-                                                and type username box  = ""
-                                                password box  = "" (these are two different fields)
-                                                and click the continue button"""}]},
-                    stream_mode=["updates", "messages", "custom"]
-        ):
-            print(stream_mode,":")
-            print(chunk)
-            print("\n")
+
+         with recording(trace_path or trace_file(settings.trace_dir, 'deep_agent'), 'run_deep_agent') as recorder:
+             run_callbacks = list(callbacks or []) + ([TraceCallback(recorder)] if recorder else [])
+
+             async def run_agent(prompt: str) -> list:
+                 messages = []
+                 async for stream_mode, chunk in agent.astream(
+                    {"messages": [{"role": "user", "content": prompt}]},
+                    stream_mode=["updates", "messages", "custom", "values"],
+                    config={"callbacks": run_callbacks}
+                 ):
+                    if stream_mode == "values":
+                        # the final state is the success signal of run_recorded, not printed
+                        messages = chunk.get('messages', messages)
+                        continue
+                    print(stream_mode,":")
+                    print(chunk)
+                    print("\n")
+                 return messages
+
+             # repeat flows are replayed at browser speed, the agent only runs from where the replay diverges
+             try:
+                 return await self.run_recorded(task or DEFAULT_TASK, run_agent, resume_steps, succeeded or agent_finished)
+             finally:
+                 if settings.metrics_path:
+                     metrics.dump(settings.metrics_path)
             
     # Tools list
     def tools_list(self):
-         tools = [self.get_dropdown_options,self.send_keys,self.go_to_url, self.click_element_by_index, self.input_text, self.wait, self.scroll,write_todos, self.current_page_index]
+         from deepagents.tools import write_todos
+
+         tools = [self.get_dropdown_options,self.send_keys,self.go_to_url, self.click_element_by_index, self.input_text, self.fill_form, self.wait, self.scroll,write_todos, self.current_page_index]
          return tools
     # Nodes
-    async def planner(self, state:AgentState):
+    async def planner(self, state: 'AgentState'):
         """
         Plans the actions before taking any action
         """
+        from langchain_core.messages import SystemMessage
+
+        from deepagents.tools import WRITE_TODOS_DESCRIPTION
+
         system_prompt = f"""
          You are planner node based on the user query plan the actions,
          {WRITE_TODOS_DESCRIPTION}
 
+         then carry out the todos one by one with the browser tools and keep their status up to date,
+         answer without a tool call when the task is done.
+         Old current_page_index outputs are elided from the history, call it again to read the current page.
         """
         logger.info("Generating Plan...")
-        todo_llm = await self.get_llm_with_tools([write_todos])
+        todo_llm = await self.get_llm_with_tools(self.tools_list())
         message = await todo_llm.ainvoke([SystemMessage(content=system_prompt)]+state['messages'])
         if message.tool_calls:
             logger.info('Plan generated.')
              
-  
-        return {"messages": [message]}
+        update = {"messages": [message]}
+        if self._browser_session is not None:
+            try:
+                update["url"] = await self._browser_session.get_current_page_url()
+            except Exception as e:
+                logger.debug(f'Planner could not read the current page url: {type(e).__name__}: {e}')
+        return update
     
-    async def todo_executer(self, state: TaskExecutor):
+    async def history(self, state: 'AgentState'):
+        """
+        Keeps the history sent to the planner bounded: the last settings.history_keep_turns turns verbatim,
+        older DOM dumps summarized and the total under settings.history_max_tokens (see trim_history)
+        """
+        from langchain_core.messages import RemoveMessage
+        from app.history import trim_history
+
+        updates = trim_history(state['messages'], settings.history_keep_turns, settings.history_max_tokens)
+        if updates:
+            removed = sum(1 for message in updates if isinstance(message, RemoveMessage))
+            logger.debug(f'🧹 History: {len(updates) - removed} messages shortened, {removed} removed')
+            metrics.inc('sap_hub_history_trimmed_total', len(updates) - removed, action='shortened')
+            metrics.inc('sap_hub_history_trimmed_total', removed, action='removed')
+        return {"messages": updates}
+
+    async def todo_executer(self, state: 'TaskExecutor'):
          pass
 
-    async def call_executor_graph(self,state: AgentState):
-         todos = state['todos']
+    async def call_executor_graph(self,state: 'AgentState'):
+         todos = state['todos']  # noqa: F841 (draft node, not wired into the graph yet)
          pass
-    async def assign_task(self, state:AgentState)-> Command[Literal["planner", "tools", "call_executor", "__end__"]]:
+    async def assign_task(self, state: 'AgentState')-> 'Command[Literal["planner", "tools", "call_executor", "__end__"]]':
+         from langchain_core.messages import AIMessage
+         from langgraph.types import Command
+
+         from deepagents.tools import write_todos, Todo
+
          if state['todos'] is None:
               return Command(
                    goto="planner",
                    update={"messages": [AIMessage(content="todos not found")]}
               )
-         todos = state['todos']
+         todos = state['todos']  # noqa: F841 (draft node, not wired into the graph yet)
          system_prompt = """ You are the task manager agent your task is to analyze the current todo list and action taken 
          based on that update the todo list and 
          handover the first pending todo in the list for execution
@@ -613,29 +1582,153 @@ class SapConfigHub:
          {todos}
 
          usage of todo tool: {WRITE_TODOS_DESCRIPTION}
-         """
+         """  # noqa: F841
          class TaskAssign(TypedDict):
               task: Todo
-         response = llm.bind_tools([write_todos]).with_structure_output(TaskAssign)
+         response = self.llm.bind_tools([write_todos]).with_structure_output(TaskAssign)  # noqa: F841
 
          
-    async def graph_builder(self, AgentState: AgentState):
+    async def graph_builder(self, AgentState: 'AgentState', checkpointer=None):
+         """
+         checkpointer (any LangGraph checkpoint saver) stores the state after every node, keyed by the thread_id of the run
+         """
+         from langgraph.graph import StateGraph, START
+         from langgraph.prebuilt import tools_condition
+
          builder = StateGraph(AgentState)
          builder.add_node("planner",self.planner)
          builder.add_node("tools",self.tool_node)
+         builder.add_node("history",self.history)
         #  builder.add_node("call_executor",self.call_executor_graph)
 
 
          builder.add_edge(START, "planner")
          builder.add_conditional_edges("planner", tools_condition)
+         builder.add_edge("tools", "history")
+         builder.add_edge("history", "planner")
         #  builder.add_edge("tools","call_executor")
          
-         graph = builder.compile()
+         graph = builder.compile(checkpointer=checkpointer)
          return graph
-    
-    async def run_graph(self, state: AgentState):
-         graph = await self.graph_builder(AgentState)
-         result = await graph.ainvoke(state,config={"recursion_limit": 1000})
+
+    @asynccontextmanager
+    async def open_checkpointer(self, path: Optional[str] = None):
+         """SQLite checkpoint saver at path (default: settings.graph_checkpoint_path), None when checkpoints are off"""
+         path = settings.graph_checkpoint_path if path is None else path
+         if not path:
+             yield None
+             return
+         from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+         Path(path).parent.mkdir(parents=True, exist_ok=True)
+         async with AsyncSqliteSaver.from_conn_string(path) as saver:
+             yield saver
+
+    async def resync_browser_state(self, url: Optional[str] = None):
+         """
+         Before a checkpointed run continues: start the browser, log in again if needed, go back to url
+         and read the page, so the tool calls that still run (see stale_tool_calls) use a fresh selector map
+         """
+         browser_session = await self.get_browser_session()
+         await browser_session.start()
+         # whatever was cached belongs to the interrupted process
+         self.browser_state_summary = None
+         self._last_snapshot = None
+         self.dom_cache.invalidate()
+         if not await self.is_logged_in():
+             logger.info(await self.login_script())
+         if url and url != await browser_session.get_current_page_url():
+             await self.go_to_url(url, new_tab=False)
+         await self.wait_until_ready(timeout=20)
+         await self.current_page_index()
+
+    @staticmethod
+    def stale_tool_calls(messages: list) -> list:
+         """
+         Answers for the pending tool calls of a resumed run when any of them acts on an element index:
+         the indices are from the interrupted process's snapshot and may point at other elements now,
+         so none of the batch runs and the planner reads the page again. Empty when they can run as they are.
+         """
+         from langchain_core.messages import AIMessage, ToolMessage
+
+         last = messages[-1] if messages else None
+         if not isinstance(last, AIMessage) or not last.tool_calls:
+             return []
+
+         def uses_index(tool_call: dict) -> bool:
+             args = tool_call.get('args') or {}
+             if tool_call['name'] == 'get_dropdown_options':
+                 return True
+             if tool_call['name'] == 'fill_form':
+                 return any(isinstance(field, dict) and field.get('index') is not None for field in args.get('fields') or [])
+             return tool_call['name'] in INDEX_ARGUMENTS and args.get(INDEX_ARGUMENTS[tool_call['name']]) is not None
+
+         if not any(uses_index(tool_call) for tool_call in last.tool_calls):
+             return []
+         return [
+             ToolMessage(
+                 content=(
+                     'Not run: the run was resumed in a new browser and the element indices are from before. '
+                     'Call current_page_index and retry with the new indices.'
+                     if uses_index(tool_call) else
+                     'Not run: the run was resumed in a new browser, call it again if it is still needed.'
+                 ),
+                 tool_call_id=tool_call['id'],
+                 name=tool_call['name'],
+             )
+             for tool_call in last.tool_calls
+         ]
+
+    async def run_graph(self, state: Optional['AgentState'] = None, trace_path: Optional[str] = None,
+                        thread_id: Optional[str] = None, checkpointer=None):
+         """
+         Runs the graph with a checkpoint after every node (see open_checkpointer, or pass any checkpointer).
+         state=None resumes thread_id from its last completed node, after re-syncing the browser.
+         Checkpoints are written in the background (durability="async") so they do not slow the steps down.
+         """
+         from langchain_core.messages import HumanMessage
+         from app.agent_state import AgentState
+         from app.llm_callbacks import TraceCallback
+
+         bind_page_fingerprint(self._page_state)
+         thread_id = thread_id or uuid.uuid4().hex
+         async with AsyncExitStack() as stack:
+             if checkpointer is None:
+                 checkpointer = await stack.enter_async_context(self.open_checkpointer())
+             graph = await self.graph_builder(AgentState, checkpointer=checkpointer)
+             config = {"recursion_limit": 1000, "configurable": {"thread_id": thread_id}}
+
+             if state is None:
+                 if checkpointer is None:
+                     raise ValueError('Resuming a run needs a checkpointer, graph_checkpoint_path is not set')
+                 snapshot = await graph.aget_state(config)
+                 if not snapshot.values:
+                     raise ValueError(f'No checkpoint found for thread {thread_id}')
+                 if not snapshot.next:
+                     logger.info(f'🧵 Thread {thread_id} already finished')
+                     return snapshot.values
+                 logger.info(f'🧵 Resuming thread {thread_id} at {", ".join(snapshot.next)}')
+                 messages = snapshot.values.get('messages', [])
+                 await self.resync_browser_state(snapshot.values.get('url'))
+                 stale = self.stale_tool_calls(messages) if 'tools' in snapshot.next else []
+                 if stale:
+                     # answered as if the tools node ran, the graph continues with history -> planner
+                     logger.info(f'🧵 Dropping {len(stale)} pending tool calls with element indices from before the restart')
+                     await graph.aupdate_state(config, {"messages": stale}, as_node="tools")
+             else:
+                 logger.info(f'🧵 Running thread {thread_id}')
+                 messages = state['messages']
+             self.task = next((m.content for m in messages if isinstance(m, HumanMessage)), None)
+
+             with recording(trace_path or trace_file(settings.trace_dir, 'graph'), 'run_graph') as recorder:
+                 config["callbacks"] = [TraceCallback(recorder)] if recorder else []
+                 try:
+                     result = await graph.ainvoke(
+                         state, config=config, durability="async" if checkpointer is not None else "exit"
+                     )
+                 finally:
+                     if settings.metrics_path:
+                         metrics.dump(settings.metrics_path)
          for m in result['messages']:
             m.pretty_print()
          return result
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+# browser_use (only for type hints, importing this module does not load browser_use)
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from browser_use.browser import BrowserSession
+    from browser_use.browser.profile import BrowserProfile
+
+# app
+from app.config import setup_logger
+
+# utility
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+from urllib.parse import urlsplit
+import asyncio
+
+
+logger = setup_logger("SAP_Config_Hub")
+
+
+# seconds the DOM watchdog waits before every snapshot, until app.page_timing learned the page
+DEFAULT_MINIMUM_WAIT = 3
+
+# what Storage.clearDataForOrigin removes for every origin a lease visited, cookies are cleared separately
+CLEARED_STORAGE_TYPES = 'local_storage,session_storage,indexeddb,cache_storage'
+
+
+def build_browser_profile() -> BrowserProfile:
+    """Browser profile shared by SapConfigHub and the session pool"""
+    from browser_use.browser.profile import BrowserProfile
+
+    return BrowserProfile(minimum_wait_page_load_time=DEFAULT_MINIMUM_WAIT)
+
+
+class BrowserSessionPool:
+    """
+    Pool of warm BrowserSessions.
+    - at most `size` sessions are leased at the same time, extra callers wait
+    - sessions are health checked when leased and when returned, bad ones are killed and replaced
+    - sessions are reset between leases (blank page, storage of every visited origin cleared,
+      cookies cleared unless keep_cookies)
+
+    usage:
+        async with BrowserSessionPool(size=2) as pool:
+            async with pool.lease() as browser_session:
+                ...
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        keep_cookies: bool = False,
+        health_check_timeout: float = 5,
+        profile_factory: Callable[[], BrowserProfile] = build_browser_profile,
+    ):
+        self.size = size
+        self.keep_cookies = keep_cookies
+        self.health_check_timeout = health_check_timeout
+        self.profile_factory = profile_factory
+        self._idle: list[BrowserSession] = []
+        self._slots = asyncio.Semaphore(size)
+        self._closed = False
+        self.created = 0
+        self.evicted = 0
+        self.leases = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """Launch all sessions up front so the first leases do not pay a cold Chromium start"""
+        missing = self.size - len(self._idle)
+        sessions = await asyncio.gather(*(self._new_session() for _ in range(missing)), return_exceptions=True)
+        for session in sessions:
+            if isinstance(session, BaseException):
+                logger.warning(f'Failed to warm browser session: {type(session).__name__}: {session}')
+            else:
+                self._idle.append(session)
+        logger.info(f'🔥 Browser pool warmed with {len(self._idle)}/{self.size} sessions')
+
+    async def close(self):
+        self._closed = True
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(self._kill(session) for session in idle))
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[BrowserSession]:
+        if self._closed:
+            raise RuntimeError('Browser pool is closed')
+        async with self._slots:
+            session = await self._acquire()
+            self.leases += 1
+            try:
+                yield session
+            finally:
+                await self._release(session)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "created": self.created,
+            "evicted": self.evicted,
+            "leases": self.leases,
+        }
+
+    async def _new_session(self) -> BrowserSession:
+        from browser_use.browser import BrowserSession
+
+        session = BrowserSession(browser_profile=self.profile_factory())
+        await session.start()
+        self.created += 1
+        return session
+
+    async def _acquire(self) -> BrowserSession:
+        while self._idle:
+            session = self._idle.pop()
+            if await self._is_healthy(session):
+                return session
+            await self._evict(session)
+        return await self._new_session()
+
+    async def _release(self, session: BrowserSession):
+        if self._closed or not await self._is_healthy(session):
+            await self._evict(session)
+            return
+        try:
+            await self._reset(session)
+        except Exception as e:
+            logger.warning(f'Failed to reset browser session, evicting it: {type(e).__name__}: {e}')
+            await self._evict(session)
+            return
+        self._idle.append(session)
+
+    async def _is_healthy(self, session: BrowserSession) -> bool:
+        try:
+            cdp_session = await session.get_or_create_cdp_session()
+            await asyncio.wait_for(
+                cdp_session.cdp_client.send.Runtime.evaluate(
+                    params={'expression': '1', 'returnByValue': True}, session_id=cdp_session.session_id
+                ),
+                timeout=self.health_check_timeout,
+            )
+            return True
+        except Exception as e:
+            logger.debug(f'Browser session failed health check: {type(e).__name__}: {e}')
+            return False
+
+    async def _reset(self, session: BrowserSession):
+        from browser_use.browser.events import NavigateToUrlEvent
+
+        await self._clear_storage(session)
+        if not self.keep_cookies:
+            await session.clear_cookies()
+        event = session.event_bus.dispatch(NavigateToUrlEvent(url='about:blank', new_tab=False))
+        await event
+        await event.event_result(raise_if_any=True, raise_if_none=False)
+        # the learned page load wait (app.page_timing) was for the previous lease's page
+        session.browser_profile.minimum_wait_page_load_time = DEFAULT_MINIMUM_WAIT
+        # the cached selector map belongs to the previous lease
+        session.update_cached_selector_map({})
+        session._cached_browser_state_summary = None
+
+    async def _clear_storage(self, session: BrowserSession):
+        """
+        Clears the storage of every origin the lease visited, not only the one of the current page:
+        the next lease may belong to another tenant
+        """
+        cdp_session = await session.get_or_create_cdp_session()
+        origins = await self._visited_origins(session)
+        for origin in sorted(origins):
+            await cdp_session.cdp_client.send.Storage.clearDataForOrigin(
+                params={'origin': origin, 'storageTypes': CLEARED_STORAGE_TYPES}, session_id=cdp_session.session_id
+            )
+        logger.debug(f'🧹 Cleared the storage of {len(origins)} origins')
+
+    @staticmethod
+    async def _visited_origins(session: BrowserSession) -> set[str]:
+        """
+        http(s) origins of the open targets, of the navigation history and frames of every tab
+        and of the cookies (they outlive closed tabs)
+        """
+        urls = []
+        targets = await session.cdp_client.send.Target.getTargets()
+        for target in targets.get('targetInfos', []):
+            urls.append(target.get('url', ''))
+            if target.get('type') != 'page':
+                continue
+            tab = await session.get_or_create_cdp_session(target['targetId'], focus=False)
+            history = await tab.cdp_client.send.Page.getNavigationHistory(session_id=tab.session_id)
+            urls += [entry.get('url', '') for entry in history.get('entries', [])]
+            frames = [(await tab.cdp_client.send.Page.getFrameTree(session_id=tab.session_id))['frameTree']]
+            while frames:
+                frame = frames.pop()
+                urls.append(frame['frame'].get('securityOrigin', ''))
+                frames += frame.get('childFrames', [])
+
+        cdp_session = await session.get_or_create_cdp_session()
+        cookies = await cdp_session.cdp_client.send.Storage.getCookies(session_id=cdp_session.session_id)
+        for cookie in cookies.get('cookies', []):
+            domain = cookie.get('domain', '').lstrip('.')
+            urls += [f'https://{domain}', f'http://{domain}']
+
+        origins = set()
+        for url in urls:
+            parts = urlsplit(url)
+            if parts.scheme in ('http', 'https') and parts.netloc:
+                origins.add(f'{parts.scheme}://{parts.netloc}')
+        return origins
+
+    async def _evict(self, session: BrowserSession):
+        self.evicted += 1
+        await self._kill(session)
+
+    async def _kill(self, session: BrowserSession):
+        try:
+            await session.kill()
+        except Exception as e:
+            logger.debug(f'Failed to kill evicted browser session: {type(e).__name__}: {e}')
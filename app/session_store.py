@@ -0,0 +1,61 @@
+# utility
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from pathlib import Path
+from typing import Optional
+import base64
+import hashlib
+import json
+import os
+
+
+SALT_BYTES = 16
+KDF_ITERATIONS = 390_000
+
+
+class SessionStateStore:
+    """
+    Encrypted on-disk store of authenticated browser state (cookies + local/session storage),
+    one file per (company_id, username).
+
+    Files are <salt><fernet token>, the key is derived from `secret` with PBKDF2, so a stolen
+    file is useless without the secret (the session_state_key setting or the SAP password).
+    """
+
+    def __init__(self, directory: str = ".sap_hub_state"):
+        self.directory = Path(directory)
+
+    def _path(self, company_id: str, username: str) -> Path:
+        digest = hashlib.sha256(f'{company_id}\0{username}'.encode()).hexdigest()
+        return self.directory / f'{digest}.bin'
+
+    @staticmethod
+    def _fernet(secret: str, salt: bytes) -> Fernet:
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+        return Fernet(base64.urlsafe_b64encode(kdf.derive(secret.encode())))
+
+    def save(self, company_id: str, username: str, secret: str, state: dict):
+        salt = os.urandom(SALT_BYTES)
+        token = self._fernet(secret, salt).encrypt(json.dumps(state).encode())
+        path = self._path(company_id, username)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_bytes(salt + token)
+        os.chmod(tmp_path, 0o600)
+        tmp_path.replace(path)
+
+    def load(self, company_id: str, username: str, secret: str) -> Optional[dict]:
+        path = self._path(company_id, username)
+        if not path.exists():
+            return None
+        data = path.read_bytes()
+        try:
+            plain = self._fernet(secret, data[:SALT_BYTES]).decrypt(data[SALT_BYTES:])
+        except InvalidToken:
+            # wrong secret (e.g. password changed) or corrupted file
+            return None
+        return json.loads(plain)
+
+    def delete(self, company_id: str, username: str):
+        self._path(company_id, username).unlink(missing_ok=True)
@@ -0,0 +1,167 @@
+# app
+from app.config import setup_logger
+from app.config import settings
+from app.metrics import metrics
+from app.session_pool import BrowserSessionPool
+from app.sap_config_hub import SapConfigHub, login_succeeded
+
+# langchain
+from langchain_core.callbacks import AsyncCallbackHandler
+
+# utility
+from pathlib import Path
+from typing import Any, NotRequired, Optional, TypedDict
+from uuid import UUID
+import asyncio
+import json
+import os
+import time
+import traceback
+
+
+logger = setup_logger("SAP_Config_Hub")
+
+
+class TenantRun(TypedDict):
+    company_id: str
+    username: str
+    password: str
+    task: str
+    base_url: NotRequired[str]
+
+
+class TenantResult(TypedDict):
+    company_id: str
+    username: str
+    ok: bool
+    elapsed: float
+    result: Optional[Any]
+    error: Optional[str]
+
+
+class LLMConcurrencyLimiter(AsyncCallbackHandler):
+    """
+    Caps the chat model requests in flight across every run it is passed to as a callback:
+    the slot is taken when a request starts and given back when it ends or fails.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._slots = asyncio.Semaphore(limit)
+        self._held: set[UUID] = set()
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        await self._slots.acquire()
+        self._held.add(run_id)
+        self.requests += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        self._release(run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._release(run_id)
+
+    def _release(self, run_id: UUID):
+        if run_id in self._held:
+            self._held.discard(run_id)
+            self.in_flight -= 1
+            self._slots.release()
+
+
+def load_tenant_runs(path: str) -> list[TenantRun]:
+    """
+    JSON list of {"company_id", "username", "password" | "password_env", "task", "base_url"?};
+    password_env names an environment variable so passwords need not sit in the file.
+    """
+    runs = []
+    for entry in json.loads(Path(path).read_text(encoding='utf-8')):
+        password = entry.get('password') or os.getenv(entry.get('password_env', ''), '')
+        run = TenantRun(company_id=entry['company_id'], username=entry['username'], password=password, task=entry['task'])
+        if entry.get('base_url'):
+            run['base_url'] = entry['base_url']
+        runs.append(run)
+    return runs
+
+
+async def run_tenant(run: TenantRun, pool: BrowserSessionPool, llm_limiter: LLMConcurrencyLimiter) -> TenantResult:
+    """One task for one tenant on its own SapConfigHub and a leased browser, never raises"""
+    start = time.monotonic()
+    hub = SapConfigHub(
+        company_id=run['company_id'], username=run['username'], password=run['password'], base_url=run.get('base_url')
+    )
+    try:
+        async with hub.leased_browser_session(pool):
+            login_status = await hub.login_script()
+            logger.info(f'🏢 {run["company_id"]}: {login_status}')
+            if not login_succeeded(login_status):
+                # the task would run against the login page, fail the tenant instead
+                logger.error(f'❌ {run["company_id"]} failed: login: {login_status}')
+                return TenantResult(
+                    company_id=run['company_id'], username=run['username'], ok=False,
+                    elapsed=time.monotonic() - start, result=None, error=f'Login failed: {login_status}',
+                )
+            result = await hub.run_deep_agent(run['task'], callbacks=[llm_limiter])
+            await hub.save_login()
+        # run_recorded reports an agent that stopped before it finished as completed False
+        ok = bool(result.get('completed'))
+        error = None if ok else f'Agent run did not complete ({len(result.get("done_steps") or [])} steps)'
+        if error:
+            logger.error(f'❌ {run["company_id"]} failed: {error}')
+        return TenantResult(
+            company_id=run['company_id'], username=run['username'], ok=ok,
+            elapsed=time.monotonic() - start, result=result, error=error,
+        )
+    except Exception as e:
+        logger.error(f'❌ {run["company_id"]} failed: {type(e).__name__}: {e}')
+        logger.debug(traceback.format_exc())
+        return TenantResult(
+            company_id=run['company_id'], username=run['username'], ok=False,
+            elapsed=time.monotonic() - start, result=None, error=f'{type(e).__name__}: {e}',
+        )
+
+
+async def run_tenants(
+    runs: list[TenantRun],
+    max_browsers: Optional[int] = None,
+    max_llm_requests: Optional[int] = None,
+) -> dict:
+    """
+    Run every tenant task concurrently on this event loop.
+    Browsers are capped by the session pool (max_browsers), LLM requests by a shared limiter
+    (max_llm_requests), so runs waiting on the LLM do not hold browsers idle and vice versa.
+    """
+    max_browsers = max_browsers or settings.browser_pool_size
+    llm_limiter = LLMConcurrencyLimiter(max_llm_requests or settings.max_concurrent_llm)
+    start = time.monotonic()
+
+    async with BrowserSessionPool(size=min(max_browsers, len(runs)) or 1) as pool:
+        results = await asyncio.gather(*(run_tenant(run, pool, llm_limiter) for run in runs))
+        pool_stats = pool.stats()
+
+    failed = [result for result in results if not result['ok']]
+    summary = {
+        "total": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "elapsed": time.monotonic() - start,
+        "llm_requests": llm_limiter.requests,
+        "llm_peak_concurrency": llm_limiter.peak,
+        "pool": pool_stats,
+        "metrics": metrics.to_json(),
+        "results": results,
+    }
+    logger.info(f'📊 Tenant runs done: {summary["succeeded"]}/{summary["total"]} succeeded in {summary["elapsed"]:.1f}s')
+    return summary
+
+
+if __name__ == "__main__":
+    import sys
+
+    tenant_runs = load_tenant_runs(sys.argv[1] if len(sys.argv) > 1 else "tenants.json")
+    summary = asyncio.run(run_tenants(tenant_runs))
+    print(json.dumps(summary, indent=2, default=str))
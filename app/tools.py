@@ -1,107 +1,184 @@
-from app.sap_config_hub import SapConfigHub
-from langchain_core.tools import tool
-from app.config import llm, settings
-from langfuse.langchain import CallbackHandler
+from app.config import settings
 from dotenv import load_dotenv
+from typing import Optional
+import asyncio
 load_dotenv()
 
-callback = CallbackHandler()
-config = SapConfigHub(company_id=settings.company_id, username=settings.username, password=settings.password)
+# nothing is built at import time, the hub, the Langfuse callback and the LangChain tools are created on first use
+_hub = None
+_callback = None
+
+
+def get_hub():
+    """The SapConfigHub singleton the tools act on"""
+    global _hub
+    if _hub is None:
+        from app.sap_config_hub import SapConfigHub
+
+        _hub = SapConfigHub(company_id=settings.company_id, username=settings.username, password=settings.password)
+    return _hub
+
+
+def get_callback():
+    global _callback
+    if _callback is None:
+        from langfuse.langchain import CallbackHandler
+
+        _callback = CallbackHandler()
+    return _callback
+
+
+def __getattr__(name: str):
+    # `config` and `callback` used to be module level objects
+    if name == "config":
+        return get_hub()
+    if name == "callback":
+        return get_callback()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-@tool
 async def go_to_url_tool(url: str, new_tab: bool):
      """
       Navigate to URL, set new_tab=True to open in new tab, False to navigate in current tab
      """
     # wrapper calls bound method on the singleton agent
-     return await config.go_to_url(url, new_tab)
+     return await get_hub().go_to_url(url, new_tab)
 
-@tool
-async def current_page_index():
+async def current_page_index(diff: bool = False, budget: Optional[int] = None):
      """
-        Use this fucntion to get the interactive element index
+        Use this fucntion to get the interactive element index.
+        Set diff=True after an action to get only the interactive elements that were added, removed or changed since the previous call.
+        Use diff=False when you need the whole page again.
+        budget limits the answer to about that many tokens (most task relevant elements first), budget=0 returns every element.
      """
-     return await config.current_page_index()
-@tool
+     return await get_hub().current_page_index(diff=diff, budget=budget)
 async def wait(seconds: int):
      """
      Wait for x seconds (default 3) (max 30 seconds). This can be used to wait until the page is fully loaded.
      """
-     return await config.wait(seconds=seconds)
+     return await get_hub().wait(seconds=seconds)
 
-@tool
 async def click_element_by_index(index: int, while_holding_ctrl: bool = False):
      """
         'Click element by index. Only indices from your browser_state are allowed. Never use an index that is not inside your current browser_state. Set while_holding_ctrl=True to open any resulting navigation in a new tab.'
      """
-     return await config.click_element_by_index(index=index,while_holding_ctrl=while_holding_ctrl)
+     return await get_hub().click_element_by_index(index=index,while_holding_ctrl=while_holding_ctrl)
 
-@tool
-async def input_text(index: int, text: str, clear_existing: bool, has_sensitive_data: bool = False, sensitive_data: dict[str, str | dict[str, str]] | None = None):
-     'Input text into an input interactive element. Only input text into indices that are inside your current browser_state. Never input text into indices that are not inside your current browser_state.'
+async def input_text(index: int, text: str, clear_existing: bool, has_sensitive_data: bool = False, sensitive_data: dict[str, str | dict[str, str]] | None = None, fast: Optional[bool] = None):
+     """
+        Input text into an input interactive element. Only input text into indices that are inside your current browser_state. Never input text into indices that are not inside your current browser_state.
+        fast=True sets the whole value at once (long descriptions, rule text, JSON), fast=False types it character by character, by default long values are set fast.
+     """
         
-     return await config.input_text(index=index,text=text, clear_existing=clear_existing,has_sensitive_data=has_sensitive_data,sensitive_data=sensitive_data)
+     return await get_hub().input_text(index=index,text=text, clear_existing=clear_existing,has_sensitive_data=has_sensitive_data,sensitive_data=sensitive_data,fast=fast)
+
+async def fill_form(fields: list[dict]):
+     """
+        Fill several inputs of the current page in one call. fields is a list of {"index": int, "text": str, "clear_existing": bool, "sensitive": bool, "name": str},
+        indices must come from your current browser_state. Returns one result per field, a failed field does not stop the others.
+     """
+     return await get_hub().fill_form(fields)
 
-@tool
-async def scroll(down: bool, num_pages: float, frame_element_index: int | None = None):
+async def scroll(down: bool, num_pages: float, frame_element_index: int | None = None, fast: bool = False, to_end: bool = False):
         """Scroll the page by specified number of pages (set down=True to scroll down, down=False to scroll up, num_pages=number of pages to scroll like 0.5 for half page, 10.0 for ten pages, etc.). 
         Default behavior is to scroll the entire page. This is enough for most cases.
         Optional if there are multiple scroll containers, use frame_element_index parameter with an element inside the container you want to scroll in. For that you must use indices that exist in your browser_state (works well for dropdowns and custom UI components). 
         Instead of scrolling step after step, use a high number of pages at once like 10 to get to the bottom of the page.
+        Set fast=True to scroll the whole distance in a single step, set to_end=True to jump straight to the bottom (or top when down=False) of the page or container, num_pages is ignored then.
         If you know where you want to scroll to, use scroll_to_text instead of this tool.
         
-        Note: For multiple pages (>=1.0), scrolls are performed one page at a time to ensure reliability. Page height is detected from viewport, fallback is 1000px per page.
+        Note: For multiple pages (>=1.0), scrolls are performed one page at a time to ensure reliability unless fast=True. Page height is detected from viewport, fallback is 1000px per page.
         """
-        return await config.scroll(down, num_pages, frame_element_index)
+        return await get_hub().scroll(down, num_pages, frame_element_index, fast=fast, to_end=to_end)
 
-@tool
 async def send_keys(self, keys: str):
       'Send strings of special keys to use e.g. Escape, Backspace, Insert, PageDown, Delete, Enter, or Shortcuts such as `Control+o`, `Control+Shift+T`'
-      return await config.send_keys(keys)
+      return await get_hub().send_keys(keys)
 
-@tool
 async def get_dropdown_options(self,index: int):
         """
         Get all options from a native dropdown or ARIA menu
         """
-        return await config.get_dropdown_options(index)
+        return await get_hub().get_dropdown_options(index)
+
+
+def browser_tools() -> list:
+    """The functions above as LangChain tools, for the deep agent"""
+    from langchain_core.tools import tool
+
+    return [
+        tool(function)
+        for function in (
+            go_to_url_tool, wait, current_page_index, click_element_by_index, input_text, fill_form, scroll, send_keys,
+            get_dropdown_options,
+        )
+    ]
 
 
 async def login():
     "This tool log in and redirect to home page"
-    return await config.login_script()
+    return await get_hub().login_script()
 
 
 async def deep_agent():
         from deepagents import create_deep_agent
+        from app.config import get_llm
 
         # tools = config.tools_list()
         agent = create_deep_agent(
-        tools=[go_to_url_tool, wait, current_page_index,click_element_by_index, input_text, scroll, send_keys, get_dropdown_options],
+        tools=browser_tools(),
         instructions="""You are the browser agent based on user query you will interact with the current browser with available tools each tool is designed to handle something on the browser page
         You have a list of tools:
         go_to_url_tool : navigate through the particular url
-        current_page_index: gives the indexed dom element of the current page
+        current_page_index: gives the indexed dom element of the current page, after a click or input call it with diff=True to see only what changed
         wait : utilize for waiting till page loads
         click_element_by_index : use the current page dom element to find the index and use the tool to click
         input_txt : use the current page dom element to find the appropriate place to input text with index
+        fill_form : fill several inputs of a form in one call, use it instead of many input_txt calls
         scroll: you can scroll the current page with this tool
         send_keys: Send strings of special keys to use e.g. Escape, Backspace, Insert, PageDown, Delete, Enter, or Shortcuts such as
         get_dropdown_option: Get all options from a native dropdown or ARIA menu
         """,
-        model=llm
+        model=get_llm()
     )
         return agent
-async def run_deep_agent():
+async def run_deep_agent(task: Optional[str] = None):
+        """
+        Runs task (default: log in and open Admin Centre) with the deep agent
+        """
         agent = await deep_agent()
-        browser_session = await config.get_browser_session()
+        hub = get_hub()
+        browser_session = await hub.get_browser_session()
         await browser_session.start()
-        async for stream_mode, chunk in agent.astream({"messages": [{"role": "user", "content": f'Go to https://salesdemo.successfactors.eu/ use {settings.company_id} then continue then type username {settings.username} then type password {settings.password} then double click the continue then landed on home page then open home drop down and click admin centre you have done your work'}]}, stream_mode=["updates", "messages", "custom"], config={"recursion_limit": 1000, "callbacks":[callback]}):
-              print(stream_mode,":")
-              print(chunk)
-        
+        # reuse a saved login when it is still valid, the agent then starts on the home page
+        logged_in = await hub.restore_login()
+        if task is not None:
+              # a custom task starts on the home page, log in with the script instead of the agent
+              if not logged_in:
+                    await hub.login_script()
+        elif logged_in:
+              task = 'You are already logged in on the home page, open home drop down and click admin centre you have done your work'
+        else:
+              task = f'Go to {settings.base_url} use {settings.company_id} then continue then type username {settings.username} then type password {settings.password} then double click the continue then landed on home page then open home drop down and click admin centre you have done your work'
+
+        async def run_agent(prompt: str) -> list:
+              messages = []
+              async for stream_mode, chunk in agent.astream({"messages": [{"role": "user", "content": prompt}]}, stream_mode=["updates", "messages", "custom", "values"], config={"recursion_limit": 1000, "callbacks":[get_callback()]}):
+                    if stream_mode == "values":
+                          messages = chunk.get('messages', messages)
+                          continue
+                    print(stream_mode,":")
+                    print(chunk)
+              return messages
+
+        # a recorded successful run is replayed without LLM calls, the agent takes over where it no longer matches
+        from app.sap_config_hub import agent_finished
+
+        await hub.run_recorded(task, run_agent, succeeded=agent_finished)
+
+        await hub.save_login()
         # await browser_session.kill()
         return None
-import asyncio 
 
-asyncio.run(run_deep_agent())
\ No newline at end of file
+
+if __name__ == "__main__":
+    asyncio.run(run_deep_agent())
\ No newline at end of file
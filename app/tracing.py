@@ -0,0 +1,163 @@
+# utility
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+import asyncio
+import itertools
+import json
+import threading
+import time
+
+
+@dataclass
+class Span:
+    span_id: int
+    name: str
+    category: str
+    tid: int
+    start_us: float
+    parent: Optional['Span'] = None
+    args: dict = field(default_factory=dict)
+
+
+_recorder: ContextVar[Optional['TraceRecorder']] = ContextVar('trace_recorder', default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar('trace_span', default=None)
+
+
+class TraceRecorder:
+    """
+    Collects spans in Chrome trace-event format (open the file in https://ui.perfetto.dev).
+
+    Every asyncio task gets its own track, so spans of tasks running at the same time never overlap
+    on one track; a span started in a child task is linked to its parent span with a flow arrow.
+    """
+
+    def __init__(self, process_name: str = 'sap_config_hub'):
+        self.process_name = process_name
+        self._origin = time.perf_counter()
+        self._events: list[dict] = []
+        self._ids = itertools.count(1)
+        self._tracks: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._open: dict[Any, tuple[Span, Optional[Span]]] = {}
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task is not None else threading.get_ident()
+        with self._lock:
+            tid = self._tracks.get(key)
+            if tid is None:
+                tid = self._tracks[key] = len(self._tracks) + 1
+                label = task.get_name() if task is not None else threading.current_thread().name
+                self._events.append({"ph": "M", "name": "thread_name", "pid": 1, "tid": tid, "args": {"name": label}})
+        return tid
+
+    def start(self, name: str, category: str, parent: Optional[Span] = None, **args) -> Span:
+        span = Span(next(self._ids), name, category, self._track(), self._now_us(), parent, args)
+        if parent is not None and parent.tid != span.tid:
+            # draw the parent -> child link across tracks
+            self._events.append({"ph": "s", "id": span.span_id, "name": "spawn", "cat": "flow", "pid": 1, "tid": parent.tid, "ts": span.start_us})
+            self._events.append({"ph": "f", "bp": "e", "id": span.span_id, "name": "spawn", "cat": "flow", "pid": 1, "tid": span.tid, "ts": span.start_us})
+        return span
+
+    def finish(self, span: Span, **args):
+        event_args = {**span.args, **args}
+        if span.parent is not None:
+            event_args['parent'] = span.parent.name
+        with self._lock:
+            self._events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round(span.start_us, 3),
+                "dur": round(self._now_us() - span.start_us, 3),
+                "pid": 1,
+                "tid": span.tid,
+                "args": {key: value if isinstance(value, (int, float, bool)) or value is None else str(value) for key, value in event_args.items()},
+            })
+
+    def begin(self, key: Any, name: str, category: str, **args) -> Span:
+        """Span opened and closed from different callbacks (LLM runs, graph nodes), closed by end(key)"""
+        parent = _current_span.get()
+        span = self.start(name, category, parent, **args)
+        self._open[key] = (span, parent)
+        return span
+
+    def end(self, key: Any, **args) -> Optional[Span]:
+        opened = self._open.pop(key, None)
+        if opened is None:
+            return None
+        self.finish(opened[0], **args)
+        return opened[0]
+
+    def to_json(self) -> dict:
+        with self._lock:
+            events = [{"ph": "M", "name": "process_name", "pid": 1, "args": {"name": self.process_name}}] + list(self._events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str):
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(json.dumps(self.to_json()), encoding='utf-8')
+
+
+@contextmanager
+def trace_span(name: str, category: str = 'app', **args) -> Iterator[Optional[Span]]:
+    """Span around a block, a no-op unless a recording is active"""
+    recorder = _recorder.get()
+    if recorder is None:
+        yield None
+        return
+    span = recorder.start(name, category, _current_span.get(), **args)
+    token = _current_span.set(span)
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        _current_span.reset(token)
+        recorder.finish(span, **({"error": error} if error else {}))
+
+
+@contextmanager
+def recording(path: Optional[str], name: str = 'run') -> Iterator[Optional[TraceRecorder]]:
+    """
+    Records every span of the block (and of tasks started in it) and writes the trace to path.
+    With path=None nothing is recorded.
+    """
+    if not path:
+        yield None
+        return
+    recorder = TraceRecorder()
+    recorder_token = _recorder.set(recorder)
+    try:
+        with trace_span(name, 'run'):
+            yield recorder
+    finally:
+        _recorder.reset(recorder_token)
+        recorder.write(path)
+
+
+def trace_file(directory: Optional[str], kind: str) -> Optional[str]:
+    if not directory:
+        return None
+    return str(Path(directory) / f'{kind}-{time.strftime("%Y%m%d-%H%M%S")}.json')
+
+
+def __getattr__(name: str):
+    # the LangChain callback lives in app.llm_callbacks, importing this module does not load langchain
+    if name == "TraceCallback":
+        from app.llm_callbacks import TraceCallback
+
+        return TraceCallback
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
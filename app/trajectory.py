@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+# browser_use (only for type hints, importing this module does not load browser_use)
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from browser_use.dom.views import EnhancedDOMTreeNode
+
+# utility
+from pathlib import Path
+from typing import Optional, TypedDict
+import hashlib
+import json
+import re
+import time
+
+
+# attributes that describe what an element is, independent of where it sits in the index
+FINGERPRINT_ATTRIBUTES = ('name', 'type', 'aria-label', 'placeholder', 'title', 'alt', 'role')
+
+# UI5 / generated ids: __button12, __xmlview0--input-inner, id1234567, ...
+GENERATED_ID = re.compile(r'(^__|\d{3,}|--|-\d+$)')
+
+# tool name -> argument that holds the element index
+INDEX_ARGUMENTS = {
+    'click_element_by_index': 'index',
+    'input_text': 'index',
+    'scroll': 'frame_element_index',
+}
+
+
+class TrajectoryStep(TypedDict):
+    tool: str
+    args: dict
+    element: Optional[dict]
+    url: Optional[str]
+
+
+def element_fingerprint(node: EnhancedDOMTreeNode) -> dict:
+    from browser_use.dom.utils import cap_text_length
+
+    attributes = node.attributes or {}
+    element_id = attributes.get('id')
+    return {
+        "tag": node.tag_name,
+        "role": node.ax_node.role if node.ax_node else None,
+        "label": node.ax_node.name if node.ax_node and node.ax_node.name else None,
+        "text": cap_text_length(node.get_all_children_text(max_depth=2).replace('\n', ' '), 80) or None,
+        "id": element_id if element_id and not GENERATED_ID.search(element_id) else None,
+        "attributes": {key: attributes[key] for key in FINGERPRINT_ATTRIBUTES if attributes.get(key)},
+    }
+
+
+def match_score(fingerprint: dict, node: EnhancedDOMTreeNode) -> float:
+    """Share of the fingerprint's features the node still has, 0 when the tag differs"""
+    candidate = element_fingerprint(node)
+    if candidate['tag'] != fingerprint['tag']:
+        return 0.0
+    expected = [(key, fingerprint[key]) for key in ('role', 'label', 'text', 'id') if fingerprint.get(key)]
+    expected += [(f'@{key}', value) for key, value in fingerprint['attributes'].items()]
+    if not expected:
+        return 0.5
+    found = {key: candidate[key] for key in ('role', 'label', 'text', 'id')}
+    found.update({f'@{key}': value for key, value in candidate['attributes'].items()})
+    return sum(1 for key, value in expected if found.get(key) == value) / len(expected)
+
+
+def find_element(fingerprint: dict, selector_map: dict[int, EnhancedDOMTreeNode], threshold: float = 0.75) -> Optional[int]:
+    """Index of the single best match above threshold, None when nothing matches or the match is ambiguous"""
+    scored = sorted(
+        ((match_score(fingerprint, node), index) for index, node in selector_map.items()),
+        reverse=True,
+    )
+    if not scored or scored[0][0] < threshold:
+        return None
+    if len(scored) > 1 and scored[1][0] == scored[0][0]:
+        return None
+    return scored[0][1]
+
+
+def trajectory_name(task: str) -> str:
+    return hashlib.sha256(' '.join(task.split()).lower().encode()).hexdigest()[:16]
+
+
+class TrajectoryRecorder:
+    """
+    Records tool calls with element fingerprints instead of raw indices.
+    Secret values (password, ...) are stored as {{name}} placeholders.
+    """
+
+    def __init__(self, secrets: dict[str, str], steps: Optional[list[TrajectoryStep]] = None):
+        self.secrets = {name: value for name, value in secrets.items() if value}
+        self.steps: list[TrajectoryStep] = list(steps or [])
+
+    def record(self, tool: str, args: dict, node: Optional[EnhancedDOMTreeNode] = None, url: Optional[str] = None):
+        args = {key: self._mask(value) for key, value in args.items()}
+        element = element_fingerprint(node) if node is not None else None
+        if element is not None and tool in INDEX_ARGUMENTS:
+            args.pop(INDEX_ARGUMENTS[tool], None)
+        self.steps.append(TrajectoryStep(tool=tool, args=args, element=element, url=url))
+
+    def _mask(self, value):
+        if isinstance(value, str):
+            for name, secret in self.secrets.items():
+                value = value.replace(secret, '{{%s}}' % name)
+        return value
+
+    @staticmethod
+    def unmask(args: dict, secrets: dict[str, str]) -> dict:
+        unmasked = {}
+        for key, value in args.items():
+            if isinstance(value, str):
+                for name, secret in secrets.items():
+                    if secret:
+                        value = value.replace('{{%s}}' % name, secret)
+            unmasked[key] = value
+        return unmasked
+
+
+class TrajectoryStore:
+    def __init__(self, directory: str = ".sap_hub_trajectories"):
+        self.directory = Path(directory)
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f'{name}.json'
+
+    def load(self, name: str) -> Optional[list[TrajectoryStep]]:
+        path = self._path(name)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding='utf-8'))['steps']
+
+    def save(self, name: str, steps: list[TrajectoryStep]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path(name).write_text(
+            json.dumps({"name": name, "recorded_at": time.time(), "steps": steps}, indent=2), encoding='utf-8'
+        )
+
+    def delete(self, name: str):
+        self._path(name).unlink(missing_ok=True)
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+# langchain
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+
+# app
+from app.history import ELIDED_PREFIX, message_tokens, trim_history
+
+
+def dom_turn(number: int, elements: int = 400) -> list:
+    """An AI call to current_page_index and its answer of ~4k tokens"""
+    call_id = f'call-{number}'
+    tree = '\n'.join(f'[{index}]<button>Save section {number}.{index}</button>' for index in range(elements))
+    return [
+        AIMessage(content='', tool_calls=[{"name": 'current_page_index', "args": {}, "id": call_id}], id=f'ai-{number}'),
+        ToolMessage(content=tree, tool_call_id=call_id, name='current_page_index', id=f'dom-{number}'),
+    ]
+
+
+def apply(messages: list, updates: list) -> list:
+    """add_messages: RemoveMessage drops the message with its id, other updates replace it"""
+    removed = {update.id for update in updates if isinstance(update, RemoveMessage)}
+    replaced = {update.id: update for update in updates if not isinstance(update, RemoveMessage)}
+    return [replaced.get(message.id, message) for message in messages if message.id not in removed]
+
+
+def test_kept_dom_dumps_are_summarized_above_the_ceiling_except_the_newest():
+    messages = [HumanMessage(content='Create a job role', id='task')]
+    for number in range(4):
+        messages += dom_turn(number)
+    assert sum(message_tokens(message) for message in messages) > 4 * 4000
+
+    trimmed = apply(messages, trim_history(messages, keep_turns=4, max_tokens=3000))
+
+    dom_outputs = [message for message in trimmed if isinstance(message, ToolMessage)]
+    assert [message.id for message in dom_outputs] == ['dom-0', 'dom-1', 'dom-2', 'dom-3']
+    assert all(message.content.startswith(ELIDED_PREFIX) for message in dom_outputs[:-1])
+    assert dom_outputs[-1].content == messages[-1].content
+    # best effort: only the newest dump stays above the ceiling
+    assert sum(message_tokens(message) for message in trimmed[:-1]) < 3000
+
+
+def test_kept_turns_are_untouched_under_the_ceiling():
+    messages = [HumanMessage(content='Create a job role', id='task')]
+    for number in range(4):
+        messages += dom_turn(number, elements=10)
+    assert trim_history(messages, keep_turns=4, max_tokens=3000) == []
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("browser_use")
+pytest.importorskip("pydantic")
+
+# app
+from app.dom_cache import PageSnapshot
+from app.sap_config_hub import SapConfigHub
+
+# utility
+from types import SimpleNamespace
+import asyncio
+
+
+def node(text: str):
+    return SimpleNamespace(
+        tag_name='button',
+        ax_node=SimpleNamespace(role='button', name=text),
+        attributes={},
+        get_all_children_text=lambda max_depth=2: text,
+    )
+
+
+def test_replay_step_resolves_the_index_from_a_fresh_snapshot():
+    hub = SapConfigHub(company_id='ACME', username='admin', password='secret')
+    clicked = []
+
+    async def wait_until_ready(**kwargs):
+        return {"ready": True}
+
+    async def stale_selector_map():
+        # what the browser session cached before the page changed
+        return {3: node('Cancel')}
+
+    async def take_snapshot():
+        return PageSnapshot(url='https://tenant/sf/admin', index_tree='', elements={}, selector_map={
+            3: node('Cancel'),
+            7: node('Save'),
+        })
+
+    async def click_element_by_index(index, while_holding_ctrl):
+        clicked.append(index)
+        return ('Clicked', {})
+
+    hub.wait_until_ready = wait_until_ready
+    hub.get_selector_map = stale_selector_map
+    hub._take_snapshot = take_snapshot
+    hub.click_element_by_index = click_element_by_index
+
+    step = {
+        "tool": 'click_element_by_index',
+        "args": {"index": 3, "while_holding_ctrl": False},
+        "element": {"tag": 'button', "role": 'button', "label": 'Save', "text": 'Save', "id": None, "attributes": {}},
+    }
+    assert asyncio.run(hub._replay_step(step)) is True
+    assert clicked == [7]
@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+# app
+from app.session_pool import BrowserSessionPool
+
+# utility
+from types import SimpleNamespace
+import asyncio
+
+
+class FakeBrowser:
+    """CDP methods _clear_storage sends, over one tab and a browser wide storage per origin"""
+
+    def __init__(self, history: list[str], frame_origins: list[str], cookie_domains: list[str]):
+        self.history = history
+        self.frame_origins = frame_origins
+        self.cookie_domains = cookie_domains
+        self.storage: dict[str, dict] = {}
+        self.send = SimpleNamespace(
+            Target=SimpleNamespace(getTargets=self.get_targets),
+            Page=SimpleNamespace(getNavigationHistory=self.get_navigation_history, getFrameTree=self.get_frame_tree),
+            Storage=SimpleNamespace(getCookies=self.get_cookies, clearDataForOrigin=self.clear_data_for_origin),
+        )
+
+    async def get_targets(self, **kwargs):
+        return {"targetInfos": [{"targetId": 'tab', "type": 'page', "url": self.history[-1]}]}
+
+    async def get_navigation_history(self, **kwargs):
+        return {"entries": [{"url": url} for url in self.history]}
+
+    async def get_frame_tree(self, **kwargs):
+        child_frames = [{"frame": {"securityOrigin": origin}} for origin in self.frame_origins]
+        return {"frameTree": {"frame": {"securityOrigin": 'null'}, "childFrames": child_frames}}
+
+    async def get_cookies(self, **kwargs):
+        return {"cookies": [{"domain": domain} for domain in self.cookie_domains]}
+
+    async def clear_data_for_origin(self, params, **kwargs):
+        if 'local_storage' in params['storageTypes'].split(','):
+            self.storage.pop(params['origin'], None)
+
+
+def fake_session(browser: FakeBrowser):
+    cdp_session = SimpleNamespace(cdp_client=browser, session_id='tab-session')
+
+    async def get_or_create_cdp_session(target_id=None, focus=True):
+        return cdp_session
+
+    return SimpleNamespace(cdp_client=browser, get_or_create_cdp_session=get_or_create_cdp_session)
+
+
+def test_storage_of_every_visited_origin_is_cleared():
+    browser = FakeBrowser(
+        history=['https://tenant-a.sapsf.com/login', 'https://idp.example.com/saml2/sso', 'about:blank'],
+        frame_origins=['https://widgets.example.net'],
+        cookie_domains=['.sso.example.org'],
+    )
+    for origin in ('https://tenant-a.sapsf.com', 'https://idp.example.com', 'https://widgets.example.net', 'https://sso.example.org'):
+        browser.storage[origin] = {"token": 'tenant-a'}
+
+    asyncio.run(BrowserSessionPool(size=1)._clear_storage(fake_session(browser)))
+    assert browser.storage == {}
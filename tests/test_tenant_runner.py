@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("pydantic")
+
+# app
+from app import tenant_runner
+from app.tenant_runner import LLMConcurrencyLimiter, TenantRun, run_tenant
+
+# utility
+from contextlib import asynccontextmanager
+import asyncio
+
+
+class FakeHub:
+    login_status = 'Login sequence executed — logged in, session state saved for later runs.'
+    result: dict = {}
+
+    def __init__(self, **kwargs):
+        pass
+
+    @asynccontextmanager
+    async def leased_browser_session(self, pool):
+        yield
+
+    async def login_script(self):
+        return self.login_status
+
+    async def run_deep_agent(self, task, callbacks=None):
+        return self.result
+
+    async def save_login(self):
+        return True
+
+
+def run(monkeypatch, login_status: str, result: dict):
+    monkeypatch.setattr(FakeHub, 'login_status', login_status)
+    monkeypatch.setattr(FakeHub, 'result', result)
+    monkeypatch.setattr(tenant_runner, 'SapConfigHub', FakeHub)
+    tenant = TenantRun(company_id='ACME', username='admin', password='secret', task='Create a job role')
+    return asyncio.run(run_tenant(tenant, None, LLMConcurrencyLimiter(1)))
+
+
+def test_completed_run_is_ok(monkeypatch):
+    result = run(monkeypatch, FakeHub.login_status, {"completed": True, "done_steps": [], "total": 0, "replayed": 0})
+    assert result['ok'] is True
+    assert result['error'] is None
+
+
+def test_run_that_does_not_complete_fails_the_tenant(monkeypatch):
+    steps = [{"tool": 'go_to_url', "args": {"url": 'https://tenant/sf/admin'}}]
+    result = run(monkeypatch, FakeHub.login_status, {"completed": False, "done_steps": steps, "total": 1, "replayed": 0})
+    assert result['ok'] is False
+    assert result['error'] == 'Agent run did not complete (1 steps)'
+    assert result['result']['done_steps'] == steps
+
+
+def test_failed_login_fails_the_tenant(monkeypatch):
+    result = run(monkeypatch, 'Log in button not found.', {"completed": True, "done_steps": []})
+    assert result['ok'] is False
+    assert result['error'] == 'Login failed: Log in button not found.'